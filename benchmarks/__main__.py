@@ -0,0 +1,162 @@
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import click
+from tabulate import tabulate
+
+from benchmarks.benchmark_cases import BENCHMARKS, BenchmarkData, SkippedBenchmark
+from benchmarks.benchmark_runner import (
+    BenchmarkReport,
+    BenchmarkResult,
+    regressions,
+    run_benchmark,
+)
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+
+@click.command()
+@click.option(
+    "--rows",
+    type=click.IntRange(min=1),
+    default=200_000,
+    show_default=True,
+    help="Rows in each generated report",
+)
+@click.option(
+    "--scan-files",
+    type=click.IntRange(min=1),
+    default=100_000,
+    show_default=True,
+    help="Files in the generated tree for the scanner",
+)
+@click.option(
+    "--data-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Keep generated data in this directory, and reuse it on the next run",
+)
+@click.option(
+    "--only",
+    type=click.Choice(list(BENCHMARKS)),
+    multiple=True,
+    help="Only run these benchmarks",
+)
+@click.option(
+    "--repeat",
+    type=click.IntRange(min=1),
+    default=3,
+    show_default=True,
+    help="Runs of each benchmark, the fastest is kept",
+)
+@click.option(
+    "--baseline",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=DEFAULT_BASELINE,
+    show_default=True,
+    help="Results to compare with",
+)
+@click.option(
+    "--save-baseline",
+    is_flag=True,
+    default=False,
+    help="Save the results as the baseline",
+)
+@click.option(
+    "--tolerance",
+    type=click.FloatRange(min=0),
+    default=0.15,
+    show_default=True,
+    help="Fraction by which throughput may drop, or peak RSS grow, before it is a regression",
+)
+def run_benchmarks(
+    rows: int,
+    scan_files: int,
+    data_dir: Optional[Path],
+    only: Tuple[str, ...],
+    repeat: int,
+    baseline: Path,
+    save_baseline: bool,
+    tolerance: float,
+) -> None:
+    """Measure loading, scanning, COPY encoding and gzip conversion on
+    generated YouTube reports, and compare with a saved baseline."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data = BenchmarkData(
+            data_dir=data_dir or Path(temp_dir),
+            row_count=rows,
+            scan_file_count=scan_files,
+        )
+        click.secho(f"Generating benchmark data in {data.data_dir}...", fg="blue")
+        data.prepare()
+
+        report = BenchmarkReport()
+        for name in only or BENCHMARKS:
+            click.secho(f"Running {name}...", fg="blue")
+            try:
+                report.results[name] = run_benchmark(name, data, repeat)
+            except SkippedBenchmark as e:
+                click.secho(f"Skipped {name}: {e}", fg="yellow")
+
+    baseline_report = BenchmarkReport.load(baseline)
+    rows_table = []
+    regressed: List[str] = []
+    for name, result in report.results.items():
+        baseline_result = baseline_report.results.get(name) if baseline_report else None
+        found = (
+            regressions(result, baseline_result, tolerance) if baseline_result else []
+        )
+        if found:
+            regressed.append(name)
+
+        rows_table.append(
+            [
+                name,
+                f"{result.seconds:.3f}",
+                f"{result.items_per_second:,.0f}",
+                f"{result.megabytes_per_second:,.1f}" if result.bytes else "",
+                f"{result.peak_rss_bytes / (1024 * 1024):,.0f}",
+                _comparison(result, baseline_result, found),
+            ]
+        )
+
+    click.echo(nl=True)
+    click.echo(
+        tabulate(
+            rows_table,
+            headers=[
+                "Benchmark",
+                "Seconds",
+                "Rows/s",
+                "MB/s",
+                "Peak RSS MB",
+                "Baseline",
+            ],
+            tablefmt="simple",
+            disable_numparse=True,
+        )
+    )
+
+    if save_baseline:
+        report.save(baseline)
+        click.secho(f"Saved baseline to {baseline}", fg="green")
+    elif regressed:
+        click.secho(f"Regressions in: {', '.join(regressed)}", fg="red", bold=True)
+        raise SystemExit(1)
+
+
+def _comparison(
+    result: BenchmarkResult, baseline: Optional[BenchmarkResult], found: List[str]
+) -> str:
+    if baseline is None:
+        return "no baseline"
+
+    change = result.items_per_second / baseline.items_per_second - 1
+    if found:
+        return f"REGRESSED {', '.join(found)} ({change:+.1%})"
+    return f"{change:+.1%}"
+
+
+if __name__ == "__main__":
+    run_benchmarks()
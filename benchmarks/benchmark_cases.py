@@ -0,0 +1,251 @@
+import importlib.util
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Tuple
+
+from pydantic import BaseModel
+
+from benchmarks.report_generator import (
+    ReportFormat,
+    report_file_name,
+    write_file_tree,
+    write_report,
+)
+from datawagon.database.postgres_database_manager import PostgresDatabaseManager
+from datawagon.objects.csv_loader import CSVEngine, CSVLoader
+from datawagon.objects.file_utils import FileUtils
+from datawagon.objects.managed_file_metadata import (
+    ManagedFileInput,
+    ManagedFileMetadata,
+)
+from datawagon.objects.managed_file_scanner import ManagedFileScanner
+from datawagon.objects.source_config import SourceConfig
+
+# the source config shipped with the repo, with every report datawagon loads
+SOURCE_CONFIG = Path(__file__).parent.parent / "datawagon-config.toml"
+
+SCANNED_REPORT_NAMES = [
+    "claim_raw",
+    "adj_claim_raw",
+    "asset_raw",
+    "video_raw",
+    "red_rawdata_video",
+    "red_rawdata_asset",
+]
+
+
+class SkippedBenchmark(Exception):
+    pass
+
+
+class Measurement(BaseModel):
+    seconds: float
+    # rows, or files for the scanner
+    items: int
+    # uncompressed bytes processed, 0 where throughput in bytes means nothing
+    bytes: int = 0
+
+
+class BenchmarkData(BaseModel):
+    """Generated reports and file tree shared by the benchmarks.
+
+    Generating 100k files takes a while, so a data_dir which already holds
+    data for the same row and file counts is reused."""
+
+    data_dir: Path
+    row_count: int
+    scan_file_count: int
+
+    @property
+    def reports_dir(self) -> Path:
+        return self.data_dir / "reports"
+
+    @property
+    def tree_dir(self) -> Path:
+        return self.data_dir / "tree"
+
+    def report_path(self, report_name: str, report_format: ReportFormat) -> Path:
+        return self.reports_dir / report_file_name(
+            report_name, "SomeBrand", "20230601", report_format
+        )
+
+    def prepare(self) -> None:
+        marker_path = self.data_dir / "generated.json"
+        marker = {"row_count": self.row_count, "scan_file_count": self.scan_file_count}
+        try:
+            if json.loads(marker_path.read_text()) == marker:
+                return
+        except (OSError, ValueError):
+            pass
+
+        shutil.rmtree(self.reports_dir, ignore_errors=True)
+        shutil.rmtree(self.tree_dir, ignore_errors=True)
+        self.reports_dir.mkdir(parents=True)
+        self.tree_dir.mkdir(parents=True)
+
+        formats: List[ReportFormat] = ["csv", "gz", "zip"]
+        for report_format in formats:
+            write_report(self.reports_dir, "claim_raw", self.row_count, report_format)
+        for report_format in formats:
+            write_report(
+                self.reports_dir, "red_rawdata_video", self.row_count, report_format
+            )
+
+        write_file_tree(self.tree_dir, self.scan_file_count, SCANNED_REPORT_NAMES)
+
+        marker_path.write_text(json.dumps(marker))
+
+    def csv_size(self, report_name: str) -> int:
+        # every format of a report holds the same csv
+        return self.report_path(report_name, "csv").stat().st_size
+
+
+def _timed(function: Callable[[], Tuple[int, int]]) -> Measurement:
+    start_time = time.perf_counter()
+    items, byte_count = function()
+    return Measurement(
+        seconds=time.perf_counter() - start_time, items=items, bytes=byte_count
+    )
+
+
+def _file_info(file_path: Path, report_name: str) -> ManagedFileMetadata:
+    return ManagedFileMetadata.build_data_item(
+        ManagedFileInput(
+            file_name=file_path.name,
+            file_path=file_path,
+            base_name=report_name,
+            table_name=report_name,
+            table_append_or_replace="append",
+            storage_folder_name=report_name,
+            content_owner="SomeBrand",
+            file_date_key="20230601",
+        )  # type: ignore
+    )
+
+
+def _load_data(
+    data: BenchmarkData,
+    report_name: str,
+    report_format: ReportFormat,
+    csv_engine: CSVEngine = "python",
+) -> Measurement:
+    if csv_engine == "pyarrow" and importlib.util.find_spec("pyarrow") is None:
+        raise SkippedBenchmark("pyarrow is not installed")
+
+    loader = CSVLoader(
+        _file_info(data.report_path(report_name, report_format), report_name),
+        csv_engine,
+    )
+    return _timed(lambda: (len(loader.load_data()), data.csv_size(report_name)))
+
+
+def _scan_file_tree(data: BenchmarkData, is_cached: bool) -> Measurement:
+    with tempfile.TemporaryDirectory() as cache_dir:
+
+        def scan() -> Tuple[int, int]:
+            matched_files = ManagedFileScanner(
+                SourceConfig.from_toml(SOURCE_CONFIG),
+                data.tree_dir,
+                Path(cache_dir) if is_cached else None,
+            ).matched_files()
+            return sum(len(files.files) for files in matched_files), 0
+
+        if is_cached:
+            # the first scan fills the cache
+            scan()
+
+        return _timed(scan)
+
+
+class _DiscardingCopyCursor(object):
+    """Cursor which reads a COPY stream as psycopg2 would, and discards it"""
+
+    def __init__(self) -> None:
+        self.byte_count = 0
+
+    def __enter__(self) -> "_DiscardingCopyCursor":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+    def copy_expert(self, sql: Any, file: Any, size: int) -> None:
+        while block := file.read(size):
+            self.byte_count += len(block)
+
+    def close(self) -> None:
+        pass
+
+
+def _copy_connection(cursor: _DiscardingCopyCursor) -> Any:
+    # the sqlalchemy connection passed to the copy methods, with its dbapi connection
+    return SimpleNamespace(connection=SimpleNamespace(cursor=lambda: cursor))
+
+
+def _encode_copy(data: BenchmarkData, is_binary_copy: bool) -> Measurement:
+    df = CSVLoader(
+        _file_info(data.report_path("claim_raw", "gz"), "claim_raw")
+    ).load_data()
+
+    # only the encoding is measured, it needs no connection to the database
+    database_manager = PostgresDatabaseManager.__new__(PostgresDatabaseManager)
+    database_manager.schema = "benchmark"
+
+    def encode() -> Tuple[int, int]:
+        cursor = _DiscardingCopyCursor()
+        if is_binary_copy:
+            database_manager._df_to_pg_binary_copy(
+                df, _copy_connection(cursor), "claim_raw"
+            )
+        else:
+            # pandas.to_sql passes the rows as tuples of python values
+            database_manager._df_to_pg_copy(
+                SimpleNamespace(schema="benchmark", name="claim_raw"),
+                _copy_connection(cursor),
+                list(df.columns),
+                df.itertuples(index=False, name=None),
+            )
+        return len(df), cursor.byte_count
+
+    return _timed(encode)
+
+
+def _convert_to_gzip(data: BenchmarkData, report_format: ReportFormat) -> Measurement:
+    file_utils = FileUtils()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # conversions write next to the source file
+        source_path = Path(
+            shutil.copy(data.report_path("claim_raw", report_format), temp_dir)
+        )
+
+        def convert() -> Tuple[int, int]:
+            if report_format == "zip":
+                file_utils.csv_zip_to_gzip(source_path)
+            else:
+                file_utils.csv_gzipped(source_path)
+            return data.row_count, data.csv_size("claim_raw")
+
+        return _timed(convert)
+
+
+BENCHMARKS: Dict[str, Callable[[BenchmarkData], Measurement]] = {
+    "load_claim_raw_csv": lambda data: _load_data(data, "claim_raw", "csv"),
+    "load_claim_raw_gz": lambda data: _load_data(data, "claim_raw", "gz"),
+    "load_claim_raw_zip": lambda data: _load_data(data, "claim_raw", "zip"),
+    "load_red_rawdata_video_gz": lambda data: _load_data(
+        data, "red_rawdata_video", "gz"
+    ),
+    "load_claim_raw_gz_pyarrow": lambda data: _load_data(
+        data, "claim_raw", "gz", "pyarrow"
+    ),
+    "scan_file_tree": lambda data: _scan_file_tree(data, is_cached=False),
+    "scan_file_tree_cached": lambda data: _scan_file_tree(data, is_cached=True),
+    "encode_copy_csv": lambda data: _encode_copy(data, is_binary_copy=False),
+    "encode_copy_binary": lambda data: _encode_copy(data, is_binary_copy=True),
+    "convert_csv_to_gzip": lambda data: _convert_to_gzip(data, "csv"),
+    "convert_zip_to_gzip": lambda data: _convert_to_gzip(data, "zip"),
+}
@@ -0,0 +1,88 @@
+import multiprocessing
+import resource
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from benchmarks.benchmark_cases import BENCHMARKS, BenchmarkData
+
+
+class BenchmarkResult(BaseModel):
+    name: str
+    seconds: float
+    items: int
+    bytes: int
+    peak_rss_bytes: int
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / max(self.seconds, 1e-9)
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes / (1024 * 1024) / max(self.seconds, 1e-9)
+
+
+class BenchmarkReport(BaseModel):
+    results: Dict[str, BenchmarkResult] = {}
+
+    @classmethod
+    def load(cls, report_path: Path) -> Optional["BenchmarkReport"]:
+        try:
+            return cls.model_validate_json(report_path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def save(self, report_path: Path) -> None:
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(self.model_dump_json(indent=2))
+
+
+def _peak_rss_bytes() -> int:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _run_in_process(name: str, data: BenchmarkData) -> BenchmarkResult:
+    measurement = BENCHMARKS[name](data)
+    return BenchmarkResult(
+        name=name,
+        seconds=measurement.seconds,
+        items=measurement.items,
+        bytes=measurement.bytes,
+        peak_rss_bytes=_peak_rss_bytes(),
+    )
+
+
+def run_benchmark(name: str, data: BenchmarkData, repeat: int) -> BenchmarkResult:
+    """Run a benchmark repeat times, each in a new process so peak RSS is
+    its own, and keep the fastest run with the highest peak RSS.
+
+    Raises SkippedBenchmark when the benchmark can't run here."""
+    results: List[BenchmarkResult] = []
+    for _ in range(repeat):
+        # spawn, so each run starts without the memory of the runner
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results.append(executor.submit(_run_in_process, name, data).result())
+
+    fastest = min(results, key=lambda result: result.seconds)
+    fastest.peak_rss_bytes = max(result.peak_rss_bytes for result in results)
+    return fastest
+
+
+def regressions(
+    result: BenchmarkResult, baseline: BenchmarkResult, tolerance: float
+) -> List[str]:
+    """Measures of result worse than the baseline by more than tolerance"""
+    found = []
+    if result.items_per_second < baseline.items_per_second * (1 - tolerance):
+        found.append("throughput")
+    if result.peak_rss_bytes > baseline.peak_rss_bytes * (1 + tolerance):
+        found.append("peak RSS")
+    return found
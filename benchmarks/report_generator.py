@@ -0,0 +1,184 @@
+import csv
+import gzip
+import io
+import random
+import string
+import zipfile
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Literal, Tuple
+
+ReportFormat = Literal["csv", "gz", "zip"]
+
+ValueGenerator = Callable[[random.Random], str]
+
+COUNTRIES = ["US", "GB", "DE", "FR", "JP", "BR", "IN", "MX", "CA", "AU", "KR", "ES"]
+
+CLAIM_TYPES = ["Audio", "Visual", "Audiovisual"]
+
+CONTENT_TYPES = ["Partner-provided", "UGC"]
+
+POLICIES = ["Monetize in all countries", "Track in all countries", "Custom"]
+
+ASSET_TYPES = ["Sound Recording", "Music Video", "Web", "Composition Share"]
+
+WORDS = ["live", "official", "remix", "acoustic", "session", "video", "lyrics"]
+
+
+def _youtube_id(length: int) -> ValueGenerator:
+    alphabet = string.ascii_letters + string.digits + "-_"
+    return lambda rng: "".join(rng.choices(alphabet, k=length))
+
+
+def _choice(values: List[str]) -> ValueGenerator:
+    return lambda rng: rng.choice(values)
+
+
+def _int(high: int) -> ValueGenerator:
+    return lambda rng: str(rng.randint(0, high))
+
+
+def _revenue(rng: random.Random) -> str:
+    # most rows earn nothing, the rest a few cents
+    return "0" if rng.random() < 0.4 else f"{rng.expovariate(50):.6f}"
+
+
+def _title(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(2, 6))).title()
+
+
+def _custom_id(rng: random.Random) -> str:
+    return "" if rng.random() < 0.3 else f"CID{rng.randint(0, 10**8):08d}"
+
+
+# columns of each report as YouTube writes them, types are guessed from the
+# snake_case names: day and views are int, revenue is float, date is datetime
+REPORT_COLUMNS: Dict[str, List[Tuple[str, ValueGenerator]]] = {
+    "claim_raw": [
+        ("Adjustment Type", _choice(["", "Adjustment"])),
+        ("Day", _int(31)),
+        ("Country", _choice(COUNTRIES)),
+        ("Video ID", _youtube_id(11)),
+        ("Channel ID", _youtube_id(24)),
+        ("Asset ID", _youtube_id(16)),
+        ("Asset Channel ID", _youtube_id(24)),
+        ("Asset Title", _title),
+        ("Asset Labels", _choice(["", "catalog", "frontline"])),
+        ("Asset Type", _choice(ASSET_TYPES)),
+        ("Custom ID", _custom_id),
+        ("Claim Type", _choice(CLAIM_TYPES)),
+        ("Content Type", _choice(CONTENT_TYPES)),
+        ("Claim ID", _youtube_id(11)),
+        ("Policy", _choice(POLICIES)),
+        ("Owned Views", _int(100_000)),
+        ("YouTube Revenue Split : Auction", _revenue),
+        ("YouTube Revenue Split : Reserved", _revenue),
+        ("YouTube Revenue Split", _revenue),
+        ("Partner Revenue : Auction", _revenue),
+        ("Partner Revenue : Reserved", _revenue),
+        ("Partner Revenue", _revenue),
+    ],
+    "red_rawdata_video": [
+        ("Country", _choice(COUNTRIES)),
+        ("Video ID", _youtube_id(11)),
+        ("Channel ID", _youtube_id(24)),
+        ("Asset ID", _youtube_id(16)),
+        ("Custom ID", _custom_id),
+        ("Video Title", _title),
+        ("Claim Type", _choice(CLAIM_TYPES)),
+        ("Content Type", _choice(CONTENT_TYPES)),
+        ("Owned Views", _int(100_000)),
+        ("Watch Time (hours)", lambda rng: f"{rng.expovariate(0.1):.4f}"),
+        ("Partner Revenue", _revenue),
+    ],
+}
+
+
+def report_file_name(
+    report_name: str,
+    content_owner: str,
+    file_date_key: str,
+    report_format: ReportFormat,
+) -> str:
+    extension = ".csv" if report_format == "csv" else f".csv.{report_format}"
+    return f"YouTube_{content_owner}_M_{file_date_key}_{report_name}_v1-1{extension}"
+
+
+def report_lines(report_name: str, row_count: int, seed: int = 0) -> Iterator[str]:
+    """Lines of a report, starting with the single column row YouTube
+    writes above the header"""
+    columns = REPORT_COLUMNS[report_name]
+    rng = random.Random(seed)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    yield f"YouTube {report_name} report\n"
+    writer.writerow([name for name, _ in columns])
+    for _ in range(row_count):
+        writer.writerow([generate(rng) for _, generate in columns])
+        if buffer.tell() > 1024 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def write_report(
+    output_dir: Path,
+    report_name: str,
+    row_count: int,
+    report_format: ReportFormat,
+    content_owner: str = "SomeBrand",
+    file_date_key: str = "20230601",
+    seed: int = 0,
+) -> Path:
+    """Write a report of row_count rows, and return its path"""
+    file_name = report_file_name(
+        report_name, content_owner, file_date_key, report_format
+    )
+    file_path = output_dir / file_name
+    lines = report_lines(report_name, row_count, seed)
+
+    if report_format == "gz":
+        with gzip.open(file_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            f.writelines(lines)
+    elif report_format == "zip":
+        with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            with zip_file.open(file_path.stem, "w") as f:
+                for line in lines:
+                    f.write(line.encode("utf-8"))
+    else:
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    return file_path
+
+
+def write_file_tree(
+    output_dir: Path, file_count: int, report_names: List[str]
+) -> List[Path]:
+    """Write file_count empty report files, in a directory per content owner
+    and month as they are downloaded, for scanning"""
+    file_paths: List[Path] = []
+
+    owner_index = 0
+    while len(file_paths) < file_count:
+        content_owner = f"Owner{owner_index:04d}"
+        for year in range(2010, 2024):
+            for month in range(1, 13):
+                month_dir = output_dir / content_owner / f"{year}{month:02d}"
+                month_dir.mkdir(parents=True, exist_ok=True)
+
+                for report_name in report_names:
+                    file_path = month_dir / report_file_name(
+                        report_name, content_owner, f"{year}{month:02d}01", "gz"
+                    )
+                    file_path.touch()
+                    file_paths.append(file_path)
+
+                    if len(file_paths) == file_count:
+                        return file_paths
+        owner_index += 1
+
+    return file_paths
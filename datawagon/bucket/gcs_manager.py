@@ -1,17 +1,80 @@
+import base64
+import fnmatch
 import os
-from typing import List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
-import pandas as pd
+import google_crc32c
+from google.api_core.exceptions import NotFound, PreconditionFailed
+from google.auth.credentials import AnonymousCredentials
 from google.cloud import storage
 
+from datawagon.bucket.listing_cache import FolderListing, FolderListingCache
+from datawagon.bucket.resumable_upload import (
+    ProgressCallback,
+    ResumableStreamUpload,
+    ResumableUpload,
+    SessionExpiredError,
+    UploadSessionStore,
+)
+from datawagon.bucket.storage_manifest import (
+    StorageManifest,
+    StorageManifestFile,
+    report_date_from_blob_name,
+)
+from datawagon.bucket.upload_result import DEFAULT_UPLOAD_CHUNK_SIZE, UploadResult
+from datawagon.objects.file_utils import FileUtils
+from datawagon.objects.profiler import profiler
 from datawagon.objects.source_config import SourceConfig
 
+UploadT = TypeVar("UploadT", bound=ResumableUpload)
+
 
 class GcsManager:
-    def __init__(self, gcs_project: str, source_bucket_name: str) -> None:
-        self.storage_client = storage.Client(project=gcs_project)
+    # storage folders listed at the same time, each one a sequence of page requests
+    LIST_BLOBS_WORKERS = 8
+
+    UPLOAD_FILE_EXTENSION = ".csv.gz"
+
+    # a manifest changed by another upload is read and updated again
+    MANIFEST_UPDATE_ATTEMPTS = 5
+
+    def __init__(
+        self,
+        gcs_project: str,
+        source_bucket_name: str,
+        cache_dir: Optional[Path] = None,
+    ) -> None:
+        if os.environ.get("STORAGE_EMULATOR_HOST"):
+            # the client sends requests to the emulator, which has no authentication
+            self.storage_client = storage.Client(
+                project=gcs_project, credentials=AnonymousCredentials()
+            )
+        else:
+            self.storage_client = storage.Client(project=gcs_project)
         self.source_bucket_name = source_bucket_name
 
+        self.upload_sessions = (
+            UploadSessionStore(cache_dir / "upload_sessions") if cache_dir else None
+        )
+        self.folder_listings = (
+            FolderListingCache(cache_dir / "bucket_listings", source_bucket_name)
+            if cache_dir
+            else None
+        )
+
     def list_buckets(self) -> List[str]:
         buckets = self.storage_client.list_buckets()
         return [bucket.name for bucket in buckets]
@@ -23,45 +86,446 @@ class GcsManager:
             self.source_bucket_name,
             prefix=storage_folder_name + "/",
             match_glob="**" + file_name_base + "**" + file_extension,
+            # only names are used, skip the rest of each object's metadata
+            fields="items(name),nextPageToken",
+        )
+
+        # pages are requested as the blobs are read
+        with profiler.stage("gcs.list_blobs"):
+            return [blob.name for blob in blobs]
+
+    def files_in_blobs(
+        self, source_confg: SourceConfig, verify_manifest: bool = False
+    ) -> Tuple[Dict[str, List[str]], List[str]]:
+        """File names in the bucket for each enabled source, by base name, and
+        the storage folders without a manifest, which were listed instead.
+
+        The storage folders of the sources are read at the same time. With
+        verify_manifest, every folder is listed and its manifest rebuilt,
+        incrementally until a full listing is due."""
+        file_sources = [
+            file_source
+            for file_source in source_confg.file.values()
+            if file_source.is_enabled
+        ]
+        storage_folder_names = list(
+            dict.fromkeys(
+                file_source.storage_folder_name or file_source.select_file_name_base
+                for file_source in file_sources
+            )
         )
 
-        return [blob.name for blob in blobs]
+        with ThreadPoolExecutor(max_workers=self.LIST_BLOBS_WORKERS) as executor:
+            manifests = dict(
+                zip(
+                    storage_folder_names,
+                    executor.map(
+                        lambda storage_folder_name: self._folder_manifest(
+                            storage_folder_name, verify_manifest
+                        ),
+                        storage_folder_names,
+                    ),
+                )
+            )
+
+        files_by_base_name: Dict[str, List[str]] = {}
+        for file_source in file_sources:
+            manifest, _ = manifests[
+                file_source.storage_folder_name or file_source.select_file_name_base
+            ]
+            file_pattern = (
+                f"*{file_source.select_file_name_base}*{self.UPLOAD_FILE_EXTENSION}"
+            )
+
+            # remove the storage folder from the blob name, to compare
+            # with the names of the local files
+            file_names = [
+                os.path.basename(blob_name)
+                for blob_name in manifest.files
+                if fnmatch.fnmatchcase(blob_name, file_pattern)
+            ]
+            if file_names:
+                files_by_base_name.setdefault(
+                    file_source.select_file_name_base, []
+                ).extend(file_names)
+
+        folders_without_manifest = [
+            storage_folder_name
+            for storage_folder_name, (_, is_listed) in manifests.items()
+            if is_listed and not verify_manifest
+        ]
+
+        return files_by_base_name, folders_without_manifest
+
+    def _folder_manifest(
+        self, storage_folder_name: str, verify_manifest: bool
+    ) -> Tuple[StorageManifest, bool]:
+        """Manifest of a storage folder, and whether it was built by listing
+        the folder. A missing manifest is not written here, only by uploads
+        and verification."""
+        if verify_manifest:
+            return self.rebuild_manifest(storage_folder_name, True), True
+
+        manifest, _ = self.read_manifest(storage_folder_name)
+        if manifest is None:
+            return self.list_manifest_files(storage_folder_name, True), True
+
+        return manifest, False
+
+    def read_manifest(
+        self, storage_folder_name: str
+    ) -> Tuple[Optional[StorageManifest], int]:
+        """Manifest of a storage folder and its generation,
+        the generation is 0 when there is no manifest."""
+        blob = self.get_blob(StorageManifest.blob_name(storage_folder_name))
+        try:
+            with profiler.stage("gcs.read_manifest") as stage:
+                manifest_json = blob.download_as_bytes()
+                stage.bytes += len(manifest_json)
+        except NotFound:
+            return None, 0
+
+        return StorageManifest.model_validate_json(manifest_json), blob.generation
+
+    def list_manifest_files(
+        self, storage_folder_name: str, is_incremental: bool = False
+    ) -> StorageManifest:
+        """Manifest built from a listing of the files in a storage folder.
+
+        An incremental listing only lists the partitions from the newest
+        report_date of the previous listing on, and adds the older files
+        found by it. Without a previous listing the whole folder is listed.
+        Objects which sort before the newest partition but are not in a
+        report_date partition, e.g. at the root of the folder, are only
+        found by a full listing."""
+        listing = None
+        if is_incremental and self.folder_listings:
+            listing = self.folder_listings.load(storage_folder_name)
+
+        if listing is None:
+            listing = FolderListing(full_listing_at=time.time())
+            start_offset = None
+        else:
+            # partition names sort by date, list from the newest one seen
+            start_offset = f"{storage_folder_name}/report_date={listing.watermark}/"
+
+        blobs = self.storage_client.list_blobs(
+            self.source_bucket_name,
+            prefix=storage_folder_name + "/",
+            start_offset=start_offset,
+            match_glob="**" + self.UPLOAD_FILE_EXTENSION,
+            fields="items(name,size,crc32c,md5Hash),nextPageToken",
+        )
+
+        with profiler.stage("gcs.list_blobs"):
+            for blob in blobs:
+                listing.files[blob.name] = StorageManifestFile(
+                    size=blob.size,
+                    crc32c=blob.crc32c,
+                    md5_hash=blob.md5_hash,
+                    report_date=report_date_from_blob_name(blob.name),
+                )
+
+        if self.folder_listings:
+            listing.update_watermark()
+            self.folder_listings.save(storage_folder_name, listing)
+
+        return StorageManifest(files=listing.files)
+
+    def rebuild_manifest(
+        self, storage_folder_name: str, is_incremental: bool = False
+    ) -> StorageManifest:
+        """Replace the manifest of a storage folder with a listing of the folder"""
+        for _ in range(self.MANIFEST_UPDATE_ATTEMPTS):
+            _, generation = self.read_manifest(storage_folder_name)
+            manifest = self.list_manifest_files(storage_folder_name, is_incremental)
+
+            if self._write_manifest(storage_folder_name, manifest, generation):
+                return manifest
+
+        raise RuntimeError(f"Unable to rebuild manifest of {storage_folder_name}")
+
+    def update_manifest(
+        self, storage_folder_name: str, files: Dict[str, StorageManifestFile]
+    ) -> None:
+        """Add uploaded files to the manifest of a storage folder. A folder
+        without a manifest gets one built from a listing, which includes
+        the files uploaded before manifests were kept."""
+        for _ in range(self.MANIFEST_UPDATE_ATTEMPTS):
+            manifest, generation = self.read_manifest(storage_folder_name)
+            if manifest is None:
+                manifest = self.list_manifest_files(storage_folder_name, True)
+
+            manifest.files.update(files)
+
+            if self._write_manifest(storage_folder_name, manifest, generation):
+                if self.folder_listings:
+                    self.folder_listings.add_files(storage_folder_name, files)
+                return
+
+        raise RuntimeError(f"Unable to update manifest of {storage_folder_name}")
 
-    def files_in_blobs_df(self, source_confg: SourceConfig) -> pd.DataFrame:
-        combined_df = pd.DataFrame(columns=["_file_name", "base_name"])
+    def _write_manifest(
+        self, storage_folder_name: str, manifest: StorageManifest, generation: int
+    ) -> bool:
+        """Write the manifest if it is still at the generation it was read at,
+        False if another upload changed it in the meantime"""
+        blob = self.get_blob(StorageManifest.blob_name(storage_folder_name))
+        try:
+            with profiler.stage("gcs.write_manifest"):
+                blob.upload_from_string(
+                    manifest.model_dump_json(),
+                    content_type="application/json",
+                    # 0 only matches when the manifest does not exist yet
+                    if_generation_match=generation,
+                )
+        except PreconditionFailed:
+            return False
+
+        return True
+
+    def upload_blob(
+        self,
+        source_file_name: str,
+        destination_blob_name: str,
+        chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> UploadResult:
+        """Upload a file unless the bucket already has it.
+
+        An existing object with the same CRC32C is skipped, an existing
+        object with different content is a conflict and is not overwritten.
+        New objects are created with a precondition that they do not exist,
+        so an object created by another upload in the meantime is not
+        overwritten either."""
+        try:
+            file_size = os.path.getsize(source_file_name)
+            with profiler.stage("gcs.crc32c") as stage:
+                file_crc32c = FileUtils().file_crc32c(Path(source_file_name))
+                stage.bytes += file_size
+
+            bucket = self.storage_client.bucket(self.source_bucket_name)
+            with profiler.stage("gcs.get_blob"):
+                existing_blob = bucket.get_blob(destination_blob_name)
+            if existing_blob is not None:
+                return self._existing_blob_result(existing_blob, file_crc32c)
+
+            blob = bucket.blob(destination_blob_name)
+            with profiler.stage("gcs.upload") as stage:
+                stage.bytes += file_size
+                if file_size <= chunk_size:
+                    # a single request, there is nothing to resume
+                    blob.upload_from_filename(source_file_name, if_generation_match=0)
+                    if on_progress:
+                        on_progress(file_size)
 
-        for file_id in source_confg.file:
-            file_source = source_confg.file[file_id]
-            if file_source.is_enabled:
-                blob_list = self.list_blobs(
-                    file_source.storage_folder_name
-                    or file_source.select_file_name_base,
-                    file_source.select_file_name_base,
-                    ".csv.gz",
+                    generation = blob.generation
+                    manifest_file = StorageManifestFile(
+                        size=file_size,
+                        crc32c=blob.crc32c,
+                        md5_hash=blob.md5_hash,
+                        report_date=report_date_from_blob_name(destination_blob_name),
+                    )
+                else:
+                    uploaded_object = self._resumable_upload(
+                        blob, source_file_name, chunk_size, on_progress
+                    )
+                    generation = uploaded_object.get("generation")
+                    manifest_file = StorageManifestFile.from_object_resource(
+                        destination_blob_name, uploaded_object
+                    )
+
+            if manifest_file.crc32c != file_crc32c:
+                self._delete_uploaded_blob(bucket, destination_blob_name, generation)
+                raise ValueError(
+                    f"CRC32C of gs://{self.source_bucket_name}/{destination_blob_name} "
+                    + "does not match the uploaded file"
                 )
 
-                file_list = []
-                for blob in blob_list:
-                    # remove the base_prefix and file_extension from the blob name
-                    # to prevent duplicate files
-                    file_list.append(os.path.basename(blob))
+            return UploadResult(status="uploaded", manifest_file=manifest_file)
+        except PreconditionFailed:
+            # created by another upload since it was checked
+            existing_blob = bucket.get_blob(destination_blob_name)
+            if existing_blob is None:
+                return UploadResult(status="failed")
+            return self._existing_blob_result(existing_blob, file_crc32c)
+        except Exception as e:
+            print("Error: unable to upload file to bucket", e)
+            return UploadResult(status="failed")
+
+    def _delete_uploaded_blob(
+        self, bucket: storage.Bucket, blob_name: str, generation: Optional[Any]
+    ) -> None:
+        """Delete an object which does not match the file it was uploaded
+        from, so the next upload is not a conflict with it. An object
+        replaced since it was uploaded is left as it is."""
+        if generation is None:
+            return
+        try:
+            bucket.blob(blob_name).delete(if_generation_match=int(generation))
+        except (NotFound, PreconditionFailed):
+            pass
+
+    def _existing_blob_result(
+        self, existing_blob: storage.Blob, file_crc32c: str
+    ) -> UploadResult:
+        manifest_file = StorageManifestFile(
+            size=existing_blob.size,
+            crc32c=existing_blob.crc32c,
+            md5_hash=existing_blob.md5_hash,
+            report_date=report_date_from_blob_name(existing_blob.name),
+        )
+
+        if existing_blob.crc32c == file_crc32c:
+            return UploadResult(status="skipped", manifest_file=manifest_file)
 
-                df = pd.DataFrame(file_list, columns=["_file_name"])
-                df["base_name"] = file_source.select_file_name_base
+        return UploadResult(status="conflict", manifest_file=manifest_file)
 
-                combined_df = pd.concat([combined_df, df])
+    def upload_zip_as_gzip(
+        self,
+        source_zip_name: str,
+        destination_blob_name: str,
+        chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+        on_progress: Optional[ProgressCallback] = None,
+        compression_level: int = FileUtils.DEFAULT_COMPRESSION_LEVEL,
+        threads: Optional[int] = None,
+    ) -> UploadResult:
+        """Upload the CSV file in a ZIP file as gzip, compressed while it is
+        uploaded instead of converted to a gzip file first.
 
-        return combined_df
+        Existing objects are handled as in upload_blob. The gzip bytes are
+        only known once the file is compressed, so an existing object is
+        compared by compressing the file without uploading it."""
+
+        def generate_blocks() -> Iterator[bytes]:
+            return FileUtils().zip_csv_gzip_blocks(
+                Path(source_zip_name), compression_level, threads
+            )
 
-    def upload_blob(self, source_file_name: str, destination_blob_name: str) -> bool:
         try:
             bucket = self.storage_client.bucket(self.source_bucket_name)
+            with profiler.stage("gcs.get_blob"):
+                existing_blob = bucket.get_blob(destination_blob_name)
+            if existing_blob is not None:
+                return self._existing_blob_result(
+                    existing_blob, _blocks_crc32c(generate_blocks())
+                )
+
             blob = bucket.blob(destination_blob_name)
-            blob.upload_from_filename(source_file_name)
-            return True
+            # compressing the file is part of the upload
+            with profiler.stage("gcs.upload_zip_as_gzip") as stage:
+                uploaded_object, upload = self._upload_to_session(
+                    blob,
+                    source_zip_name,
+                    # the same zip file compressed at another level is another stream
+                    f"gs://{self.source_bucket_name}/{blob.name}"
+                    + f"#gzip-{compression_level}",
+                    lambda session_url: ResumableStreamUpload(
+                        session_url, generate_blocks, chunk_size
+                    ),
+                    None,
+                    on_progress,
+                )
+                stage.bytes += int(uploaded_object.get("size", 0))
+            manifest_file = StorageManifestFile.from_object_resource(
+                destination_blob_name, uploaded_object
+            )
+
+            # the stream is not read when a resumed session was already complete
+            stream_crc32c = upload.stream_crc32c or _blocks_crc32c(generate_blocks())
+            if manifest_file.crc32c != stream_crc32c:
+                self._delete_uploaded_blob(
+                    bucket, destination_blob_name, uploaded_object.get("generation")
+                )
+                raise ValueError(
+                    f"CRC32C of gs://{self.source_bucket_name}/{destination_blob_name} "
+                    + "does not match the compressed file"
+                )
+
+            return UploadResult(status="uploaded", manifest_file=manifest_file)
+        except PreconditionFailed:
+            # created by another upload since it was checked
+            existing_blob = bucket.get_blob(destination_blob_name)
+            if existing_blob is None:
+                return UploadResult(status="failed")
+            return self._existing_blob_result(
+                existing_blob, _blocks_crc32c(generate_blocks())
+            )
         except Exception as e:
             print("Error: unable to upload file to bucket", e)
-            return False
+            return UploadResult(status="failed")
+
+    def _resumable_upload(
+        self,
+        blob: storage.Blob,
+        source_file_name: str,
+        chunk_size: int,
+        on_progress: Optional[ProgressCallback],
+    ) -> Dict[str, Any]:
+        uploaded_object, _ = self._upload_to_session(
+            blob,
+            source_file_name,
+            f"gs://{self.source_bucket_name}/{blob.name}",
+            lambda session_url: ResumableUpload(
+                session_url, source_file_name, chunk_size
+            ),
+            os.path.getsize(source_file_name),
+            on_progress,
+        )
+        return uploaded_object
+
+    def _upload_to_session(
+        self,
+        blob: storage.Blob,
+        source_file_name: str,
+        destination_url: str,
+        create_upload: Callable[[str], UploadT],
+        size: Optional[int],
+        on_progress: Optional[ProgressCallback],
+    ) -> Tuple[Dict[str, Any], UploadT]:
+        """Upload to the session of an earlier, interrupted upload of the file
+        if there is one, otherwise to a new session."""
+        session_url = None
+        if self.upload_sessions:
+            session_url = self.upload_sessions.load(source_file_name, destination_url)
+
+        if session_url:
+            try:
+                upload = create_upload(session_url)
+                uploaded_object = upload.upload(on_progress)
+                self._remove_upload_session(source_file_name, destination_url)
+                return uploaded_object, upload
+            except SessionExpiredError:
+                # sessions expire after a week, start over
+                self._remove_upload_session(source_file_name, destination_url)
+            except PreconditionFailed:
+                # the object was created by another upload, the session can't complete
+                self._remove_upload_session(source_file_name, destination_url)
+                raise
+
+        new_session_url: str = blob.create_resumable_upload_session(
+            size=size, if_generation_match=0
+        )
+        if self.upload_sessions:
+            self.upload_sessions.save(
+                source_file_name, destination_url, new_session_url
+            )
+
+        upload = create_upload(new_session_url)
+        try:
+            uploaded_object = upload.upload(on_progress)
+        except PreconditionFailed:
+            self._remove_upload_session(source_file_name, destination_url)
+            raise
+        self._remove_upload_session(source_file_name, destination_url)
+
+        return uploaded_object, upload
+
+    def _remove_upload_session(
+        self, source_file_name: str, destination_url: str
+    ) -> None:
+        if self.upload_sessions:
+            self.upload_sessions.remove(source_file_name, destination_url)
 
     # 10/2/23 - all four of these functions are currently unused
     def delete_blob(self, blob_name: str) -> None:
@@ -69,7 +533,7 @@ class GcsManager:
         blob = bucket.blob(blob_name)
         blob.delete()
 
-    def get_blob_metadata(self, blob_name: str) -> dict | None:
+    def get_blob_metadata(self, blob_name: str) -> Optional[dict]:
         blob = self.get_blob(blob_name)
         return blob.metadata
 
@@ -81,3 +545,12 @@ class GcsManager:
     def download_blob(self, blob_name: str, destination_file_name: str) -> None:
         blob = self.get_blob(blob_name)
         blob.download_to_filename(destination_file_name)
+
+
+def _blocks_crc32c(blocks: Iterable[bytes]) -> str:
+    """CRC32C of a stream of blocks, base64 encoded as cloud storage reports it"""
+    checksum = google_crc32c.Checksum()
+    for block in blocks:
+        checksum.update(block)
+
+    return base64.b64encode(checksum.digest()).decode("utf-8")
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+from datawagon.bucket.storage_manifest import StorageManifestFile
+
+
+class FolderListing(BaseModel):
+    """Files found by earlier listings of a storage folder, and the newest
+    report_date partition among them"""
+
+    files: Dict[str, StorageManifestFile] = {}
+    watermark: Optional[str] = None
+    full_listing_at: float = 0
+
+    def update_watermark(self) -> None:
+        report_dates = [
+            file.report_date for file in self.files.values() if file.report_date
+        ]
+        self.watermark = max(report_dates) if report_dates else None
+
+
+class FolderListingCache(object):
+    """Listings of storage folders kept between runs.
+
+    A folder only gains new report_date partitions, so once it has been
+    listed, the next listing can start at the newest partition seen and
+    merge with the files found before. Files uploaded by datawagon are
+    added as they are uploaded. Files added to older partitions by other
+    tools, files outside the report_date partitions, and removed files are
+    found by a full listing once it is due."""
+
+    # a listing older than this lists the whole folder again
+    FULL_LISTING_INTERVAL_SECONDS = 7 * 24 * 60 * 60
+
+    def __init__(self, cache_dir: Path, bucket_name: str) -> None:
+        self.cache_dir = cache_dir
+        self.bucket_name = bucket_name
+
+    def _listing_path(self, storage_folder_name: str) -> Path:
+        key = f"{self.bucket_name}/{storage_folder_name}"
+        return self.cache_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+    def load(self, storage_folder_name: str) -> Optional[FolderListing]:
+        """Listing to continue from, or None when a full listing is due"""
+        listing = self._read(storage_folder_name)
+
+        if (
+            listing is None
+            or listing.watermark is None
+            or time.time() - listing.full_listing_at
+            > self.FULL_LISTING_INTERVAL_SECONDS
+        ):
+            return None
+
+        return listing
+
+    def add_files(
+        self, storage_folder_name: str, files: Dict[str, StorageManifestFile]
+    ) -> None:
+        """Add uploaded files to the listing of a folder, so a listing from the
+        newest partition still has those uploaded to older partitions. The
+        watermark is left as it is, it is the newest partition listed."""
+        listing = self._read(storage_folder_name)
+        if listing is None:
+            return
+
+        listing.files.update(files)
+        self.save(storage_folder_name, listing)
+
+    def _read(self, storage_folder_name: str) -> Optional[FolderListing]:
+        try:
+            return FolderListing.model_validate_json(
+                self._listing_path(storage_folder_name).read_text()
+            )
+        except (OSError, ValueError):
+            return None
+
+    def save(self, storage_folder_name: str, listing: FolderListing) -> None:
+        listing_path = self._listing_path(storage_folder_name)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+            temp_path = listing_path.with_suffix(".tmp")
+            temp_path.write_text(listing.model_dump_json())
+            os.replace(temp_path, listing_path)
+        except OSError as e:
+            # the next listing is a full listing
+            print(f"Unable to save bucket listing: {e}")
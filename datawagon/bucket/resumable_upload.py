@@ -0,0 +1,317 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import google_crc32c
+import requests  # type: ignore[import-untyped]
+from google.api_core.exceptions import PreconditionFailed
+
+ProgressCallback = Callable[[int], None]
+
+
+class UploadSessionStore(object):
+    """Session urls of resumable uploads which have not completed.
+
+    A session is kept for a source file and destination until the upload
+    completes, so a later run continues the upload instead of starting over.
+    The file's size and mtime are part of the key, a changed file starts a
+    new session."""
+
+    def __init__(self, session_dir: Path) -> None:
+        self.session_dir = session_dir
+
+    def _session_path(self, source_file_name: str, destination_url: str) -> Path:
+        stat = os.stat(source_file_name)
+        key = "\n".join(
+            [
+                os.path.abspath(source_file_name),
+                str(stat.st_size),
+                str(stat.st_mtime_ns),
+                destination_url,
+            ]
+        )
+        return self.session_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+    def load(self, source_file_name: str, destination_url: str) -> Optional[str]:
+        try:
+            session = json.loads(
+                self._session_path(source_file_name, destination_url).read_text()
+            )
+        except (OSError, ValueError):
+            return None
+
+        return session.get("session_url")
+
+    def save(
+        self, source_file_name: str, destination_url: str, session_url: str
+    ) -> None:
+        try:
+            self.session_dir.mkdir(parents=True, exist_ok=True)
+            self._session_path(source_file_name, destination_url).write_text(
+                json.dumps({"session_url": session_url})
+            )
+        except OSError as e:
+            # without the session the upload still completes, it just can't resume
+            print(f"Unable to save upload session: {e}")
+
+    def remove(self, source_file_name: str, destination_url: str) -> None:
+        try:
+            self._session_path(source_file_name, destination_url).unlink()
+        except OSError:
+            pass
+
+
+class SessionExpiredError(Exception):
+    pass
+
+
+class _RetryableError(Exception):
+    pass
+
+
+_RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, _RetryableError)
+
+
+class ResumableUpload(object):
+    """Upload a file in chunks to a resumable upload session.
+
+    The session url authorizes the upload by itself, so chunks are sent
+    without credentials. After a failed request the upload asks the
+    server how many bytes it has received, and continues from there."""
+
+    # chunks, other than the last one, must be a multiple of 256 KiB
+    CHUNK_SIZE_MULTIPLE = 256 * 1024
+
+    MAX_RETRIES = 5
+
+    # seconds to connect, and to wait for a response, before the request is retried
+    TIMEOUT = (10, 120)
+
+    def __init__(
+        self,
+        session_url: str,
+        source_file_name: str,
+        chunk_size: int,
+        http: Optional[requests.Session] = None,
+    ) -> None:
+        if chunk_size % self.CHUNK_SIZE_MULTIPLE != 0:
+            raise ValueError(
+                f"Chunk size must be a multiple of {self.CHUNK_SIZE_MULTIPLE} bytes"
+            )
+
+        self.session_url = session_url
+        self.source_file_name = source_file_name
+        self.chunk_size = chunk_size
+        self.total_bytes: Optional[int] = os.path.getsize(source_file_name)
+        self.http = http or requests.Session()
+
+        # resource of the storage object, returned with the final response
+        self.uploaded_object: Dict[str, Any] = {}
+
+    def upload(self, on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Send the bytes the session has not received yet, and return the
+        resource of the uploaded object.
+        Raises SessionExpiredError if the session no longer exists."""
+        bytes_uploaded = self.bytes_uploaded()
+        if on_progress and bytes_uploaded:
+            on_progress(bytes_uploaded)
+
+        retries = 0
+        with open(self.source_file_name, "rb") as source_file:
+            while bytes_uploaded is not None:
+                source_file.seek(bytes_uploaded)
+                chunk = source_file.read(self.chunk_size)
+
+                try:
+                    next_offset = self._send_chunk(bytes_uploaded, chunk)
+                    retries = 0
+                except _RETRYABLE_ERRORS:
+                    if retries == self.MAX_RETRIES:
+                        raise
+                    # the server may have kept part of the chunk
+                    next_offset, retries = self._bytes_uploaded_after_failure(retries)
+
+                if on_progress:
+                    on_progress((next_offset or self.total_bytes or 0) - bytes_uploaded)
+                bytes_uploaded = next_offset
+
+        return self.uploaded_object
+
+    def bytes_uploaded(self) -> Optional[int]:
+        """Bytes received by the session, or None when the upload is complete"""
+        response = self.http.put(
+            self.session_url,
+            headers={"Content-Range": f"bytes */{self._total_bytes_range()}"},
+            timeout=self.TIMEOUT,
+        )
+        return self._next_offset(response)
+
+    def _bytes_uploaded_after_failure(self, retries: int) -> Tuple[Optional[int], int]:
+        """Back off, then ask the session how many bytes it received before a
+        failed request. The query is retried while it fails too, counting
+        against the same retries. Returns the offset and the retries used."""
+        while True:
+            retries += 1
+            time.sleep(2**retries)
+            try:
+                return self.bytes_uploaded(), retries
+            except _RETRYABLE_ERRORS:
+                if retries == self.MAX_RETRIES:
+                    raise
+
+    def _send_chunk(self, start: int, chunk: bytes) -> Optional[int]:
+        total_bytes = self._total_bytes_range()
+        if chunk:
+            content_range = f"bytes {start}-{start + len(chunk) - 1}/{total_bytes}"
+        else:
+            content_range = f"bytes */{total_bytes}"
+
+        response = self.http.put(
+            self.session_url,
+            data=chunk,
+            headers={"Content-Range": content_range},
+            timeout=self.TIMEOUT,
+        )
+        return self._next_offset(response)
+
+    def _total_bytes_range(self) -> str:
+        # "*" until the size is known
+        return "*" if self.total_bytes is None else str(self.total_bytes)
+
+    def _next_offset(self, response: requests.Response) -> Optional[int]:
+        if response.status_code in (200, 201):
+            self.uploaded_object = response.json()
+            return None
+
+        if response.status_code == 308:
+            # the range received so far, as "bytes=0-<last byte>"
+            received = response.headers.get("Range")
+            return int(received.split("-")[1]) + 1 if received else 0
+
+        if response.status_code in (404, 410):
+            raise SessionExpiredError(f"Upload session expired: {self.session_url}")
+
+        # the object was created by another upload since the session started,
+        # raised as the client library raises it for a single request upload
+        if response.status_code == 412:
+            raise PreconditionFailed(f"Upload precondition failed: {self.session_url}")
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise _RetryableError(f"Upload failed with status {response.status_code}")
+
+        response.raise_for_status()
+        raise requests.HTTPError(f"Unexpected upload response {response.status_code}")
+
+
+class ResumableStreamUpload(ResumableUpload):
+    """Upload a stream of unknown size in chunks to a resumable upload session.
+
+    The size is sent with the last chunk, so nothing has to be written to
+    disk first. Bytes the server has not acknowledged are kept until it
+    has, and an interrupted upload is resumed by generating the stream
+    again and skipping the bytes the session already received, so
+    generate_blocks must return the same bytes on every call."""
+
+    def __init__(
+        self,
+        session_url: str,
+        generate_blocks: Callable[[], Iterable[bytes]],
+        chunk_size: int,
+        http: Optional[requests.Session] = None,
+    ) -> None:
+        if chunk_size % self.CHUNK_SIZE_MULTIPLE != 0:
+            raise ValueError(
+                f"Chunk size must be a multiple of {self.CHUNK_SIZE_MULTIPLE} bytes"
+            )
+
+        self.session_url = session_url
+        self.generate_blocks = generate_blocks
+        self.chunk_size = chunk_size
+        self.total_bytes = None
+        self.http = http or requests.Session()
+
+        self.uploaded_object = {}
+
+        # CRC32C of the whole stream, once it has been read to the end
+        self.stream_crc32c: Optional[str] = None
+
+    def upload(self, on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Send the bytes the session has not received yet, and return the
+        resource of the uploaded object.
+        Raises SessionExpiredError if the session no longer exists."""
+        bytes_uploaded = self.bytes_uploaded()
+        if bytes_uploaded is None:
+            return self.uploaded_object
+        if on_progress and bytes_uploaded:
+            on_progress(bytes_uploaded)
+
+        stream = _BlockReader(iter(self.generate_blocks()))
+        stream.read(bytes_uploaded)
+
+        # bytes from bytes_uploaded on, which the server has not acknowledged
+        buffer = b""
+        retries = 0
+        while bytes_uploaded is not None:
+            # one byte more than a chunk tells whether this is the last chunk
+            buffer += stream.read(self.chunk_size + 1 - len(buffer))
+            chunk = buffer[: self.chunk_size]
+            if len(buffer) <= self.chunk_size:
+                self.total_bytes = bytes_uploaded + len(chunk)
+                self.stream_crc32c = stream.crc32c()
+
+            try:
+                next_offset = self._send_chunk(bytes_uploaded, chunk)
+                retries = 0
+            except _RETRYABLE_ERRORS:
+                if retries == self.MAX_RETRIES:
+                    raise
+                # the server may have kept part of the chunk
+                next_offset, retries = self._bytes_uploaded_after_failure(retries)
+
+            if next_offset is None:
+                if on_progress:
+                    on_progress(len(buffer))
+                break
+
+            acknowledged = next_offset - bytes_uploaded
+            if on_progress:
+                on_progress(acknowledged)
+            buffer = buffer[acknowledged:]
+            bytes_uploaded = next_offset
+
+        return self.uploaded_object
+
+
+class _BlockReader(object):
+    """Read a stream of blocks in pieces of any size, and keep the
+    CRC32C of everything read"""
+
+    def __init__(self, blocks: Iterator[bytes]) -> None:
+        self.blocks = blocks
+        self.block = b""
+        self.checksum = google_crc32c.Checksum()
+
+    def read(self, size: int) -> bytes:
+        pieces = []
+        while size > 0:
+            if not self.block:
+                block = next(self.blocks, None)
+                if block is None:
+                    break
+                self.block = block
+
+            pieces.append(self.block[:size])
+            self.block = self.block[size:]
+            size -= len(pieces[-1])
+
+        data = b"".join(pieces)
+        self.checksum.update(data)
+        return data
+
+    def crc32c(self) -> str:
+        """CRC32C of the bytes read so far, base64 encoded as cloud storage reports it"""
+        return base64.b64encode(self.checksum.digest()).decode("utf-8")
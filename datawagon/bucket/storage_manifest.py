@@ -0,0 +1,48 @@
+import re
+from typing import Any, ClassVar, Dict, Optional
+
+from pydantic import BaseModel
+
+REPORT_DATE_PATTERN = re.compile(r"/report_date=([^/]+)/")
+
+
+class StorageManifestFile(BaseModel):
+    size: int
+    crc32c: Optional[str] = None
+    md5_hash: Optional[str] = None
+    report_date: Optional[str] = None
+
+    @classmethod
+    def from_object_resource(
+        cls, blob_name: str, resource: Dict[str, Any]
+    ) -> "StorageManifestFile":
+        """Build from the JSON api resource of a storage object"""
+        return cls(
+            size=int(resource["size"]),
+            crc32c=resource.get("crc32c"),
+            md5_hash=resource.get("md5Hash"),
+            report_date=report_date_from_blob_name(blob_name),
+        )
+
+
+class StorageManifest(BaseModel):
+    """Files in a storage folder, kept as a single object in the folder so
+    the folder is read with one request instead of paging through a listing.
+
+    Files are keyed by blob name."""
+
+    BLOB_NAME: ClassVar[str] = "_manifest.json"
+
+    VERSION: ClassVar[int] = 1
+
+    version: int = VERSION
+    files: Dict[str, StorageManifestFile] = {}
+
+    @classmethod
+    def blob_name(cls, storage_folder_name: str) -> str:
+        return f"{storage_folder_name}/{cls.BLOB_NAME}"
+
+
+def report_date_from_blob_name(blob_name: str) -> Optional[str]:
+    match = REPORT_DATE_PATTERN.search(blob_name)
+    return match.group(1) if match else None
@@ -0,0 +1,16 @@
+from typing import Literal, Optional
+
+from pydantic import BaseModel
+
+from datawagon.bucket.storage_manifest import StorageManifestFile
+
+# files larger than one chunk are uploaded in chunks of this size
+DEFAULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+UploadStatus = Literal["uploaded", "skipped", "conflict", "failed"]
+
+
+class UploadResult(BaseModel):
+    status: UploadStatus
+    # the object in the bucket, unless the upload failed
+    manifest_file: Optional[StorageManifestFile] = None
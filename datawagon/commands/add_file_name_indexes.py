@@ -0,0 +1,43 @@
+import click
+
+from datawagon.objects.connections import get_db_manager
+
+
+@click.command(name="add-file-name-indexes")
+@click.pass_context
+def add_file_name_indexes(ctx: click.Context) -> None:
+    """Add a _file_name index to existing tables which do not have one."""
+
+    db_manager = get_db_manager(ctx)
+
+    if not db_manager.is_valid_connection:
+        ctx.abort()
+
+    created_count = 0
+    skipped_tables = []
+    for table in db_manager.table_names():
+        if db_manager.has_file_name_index(table):
+            continue
+
+        click.echo(f"Adding _file_name index to table: {table} ... ", nl=False)
+        try:
+            db_manager.ensure_file_name_index(table)
+        except Exception as e:
+            # e.g. a table without a _file_name column, the others are still indexed
+            click.secho(f"skipped: {e}", fg="yellow")
+            skipped_tables.append(table)
+            continue
+
+        click.secho("done", fg="green")
+        created_count += 1
+
+    if skipped_tables:
+        click.secho(
+            f"{len(skipped_tables)} tables could not be indexed: "
+            + ", ".join(skipped_tables),
+            fg="yellow",
+        )
+    elif created_count == 0:
+        click.secho("All tables have a _file_name index.", fg="green")
+
+    click.echo(nl=True)
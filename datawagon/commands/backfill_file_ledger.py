@@ -0,0 +1,35 @@
+import click
+
+from datawagon.objects.connections import get_db_manager
+
+
+@click.command(name="backfill-file-ledger")
+@click.pass_context
+def backfill_file_ledger(ctx: click.Context) -> None:
+    """Add files loaded before the file ledger existed to the ledger."""
+
+    db_manager = get_db_manager(ctx)
+
+    if not db_manager.is_valid_connection:
+        ctx.abort()
+
+    ledger_files = db_manager.files_in_file_ledger()
+    untracked_tables = [
+        table for table in db_manager.table_names() if table not in ledger_files
+    ]
+
+    if len(untracked_tables) == 0:
+        click.secho("All tables are in the file ledger.", fg="green")
+        return
+
+    click.secho(
+        f"Scanning {len(untracked_tables)} tables, this may take a while for large tables",
+        fg="blue",
+    )
+
+    for table in untracked_tables:
+        click.echo(f"Backfilling file ledger for table: {table} ... ", nl=False)
+        file_count = db_manager.backfill_file_ledger(table)
+        click.secho(f"added {file_count:,} files", fg="green")
+
+    click.echo(nl=True)
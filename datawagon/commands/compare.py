@@ -1,7 +1,6 @@
-from typing import List
+from typing import TYPE_CHECKING, Callable, List
 
 import click
-import pandas as pd
 from tabulate import tabulate
 
 from datawagon.commands.files_in_database import files_in_database
@@ -12,6 +11,9 @@ from datawagon.objects.file_utils import FileUtils
 from datawagon.objects.managed_file_metadata import ManagedFileMetadata
 from datawagon.objects.managed_file_scanner import ManagedFilesToDatabase
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 @click.command()
 @click.pass_context
@@ -73,13 +75,24 @@ def compare_local_files_to_postgres(ctx: click.Context) -> List[ManagedFilesToDa
 
 
 @click.command()
+@click.option(
+    "--include-zip",
+    is_flag=True,
+    default=False,
+    help="Also compare .csv.zip files, by the name of the .csv.gz file they convert to",
+)
 @click.pass_context
-def compare_local_files_to_bucket(ctx: click.Context) -> List[ManagedFilesToDatabase]:
+def compare_local_files_to_bucket(
+    ctx: click.Context, include_zip: bool
+) -> List[ManagedFilesToDatabase]:
     """Compare files in source directory to files in storage bucket."""
 
-    matched_files: List[ManagedFilesToDatabase] = ctx.invoke(
-        files_in_local_fs, file_extension="gz"
-    )
+    if include_zip:
+        matched_files: List[ManagedFilesToDatabase] = _gzip_or_zip_files(
+            ctx.invoke(files_in_local_fs)
+        )
+    else:
+        matched_files = ctx.invoke(files_in_local_fs, file_extension="gz")
     current_bucket_files: List[CurrentDestinationData] = ctx.invoke(files_in_storage)
 
     csv_file_infos: List[ManagedFileMetadata] = [
@@ -105,7 +118,11 @@ def compare_local_files_to_bucket(ctx: click.Context) -> List[ManagedFilesToData
         click.secho("No tables found.", fg="red")
         ctx.abort()
 
-    new_files = _net_new_files(matched_files, current_bucket_files)
+    new_files = _net_new_files(
+        matched_files,
+        current_bucket_files,
+        lambda file: FileUtils().gzip_file_name(file.file_name),
+    )
 
     new_csv_file_infos: List[ManagedFileMetadata] = [
         file_info for src in new_files for file_info in src.files
@@ -139,8 +156,9 @@ def compare_local_files_to_bucket(ctx: click.Context) -> List[ManagedFilesToData
 def _file_diff(
     csv_file_infos: List[ManagedFileMetadata],
     current_database_files: List[CurrentDestinationData],
-) -> pd.DataFrame:
+) -> "pd.DataFrame":
     """Create a DataFrame which compares files in source directory to files in database."""
+    import pandas as pd
 
     file_utils = FileUtils()
     grouped_files = file_utils.group_by_base_name(csv_file_infos)
@@ -171,9 +189,37 @@ def _file_diff(
     return display_table_data.sort_values(by=["Base Name"])
 
 
+def _gzip_or_zip_files(
+    all_source_files_by_table: List[ManagedFilesToDatabase],
+) -> List[ManagedFilesToDatabase]:
+    """Keep the .gz and .zip files, and only the .gz file of a zip file
+    which has already been converted"""
+    file_utils = FileUtils()
+    for files_by_table in all_source_files_by_table:
+        gzip_file_names = {
+            file.file_name
+            for file in files_by_table.files
+            if file.file_name.endswith(".gz")
+        }
+        files_by_table.files = [
+            file
+            for file in files_by_table.files
+            if file.file_name.endswith(".gz")
+            or (
+                file.file_name.endswith(".zip")
+                and file_utils.gzip_file_name(file.file_name) not in gzip_file_names
+            )
+        ]
+
+    return all_source_files_by_table
+
+
 def _net_new_files(
     all_source_files_by_table: List[ManagedFilesToDatabase],
     current_database_files: List[CurrentDestinationData],
+    destination_file_name: Callable[[ManagedFileMetadata], str] = lambda file: (
+        file.file_name
+    ),
 ) -> List[ManagedFilesToDatabase]:
     existing_files: set[str] = set(
         [
@@ -188,7 +234,7 @@ def _net_new_files(
             [
                 file
                 for file in all_source_files_by_table[range_index].files
-                if (file.file_name not in existing_files)
+                if (destination_file_name(file) not in existing_files)
             ],
             key=lambda x: x.base_name,
         )
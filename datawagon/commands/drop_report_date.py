@@ -0,0 +1,56 @@
+import click
+
+from datawagon.objects.connections import get_db_manager
+
+
+@click.command(name="drop-report-date")
+@click.option(
+    "--table-name",
+    type=click.STRING,
+    required=True,
+    help="Table partitioned by report date",
+)
+@click.option(
+    "--report-date-key",
+    type=click.INT,
+    required=True,
+    help="Report date to drop, as in _report_date_key, e.g. 20230630",
+)
+@click.pass_context
+def drop_report_date(ctx: click.Context, table_name: str, report_date_key: int) -> None:
+    """Drop the partition of a report date, so its files are loaded again by the next import."""
+
+    db_manager = get_db_manager(ctx)
+    if not db_manager.is_valid_connection:
+        ctx.abort()
+
+    if not db_manager.is_partitioned_table(table_name):
+        click.secho(
+            f"Table '{table_name}' is not partitioned by report date.", fg="red"
+        )
+        ctx.abort()
+
+    click.secho(
+        f"This command will DELETE ALL DATA for report date {report_date_key} "
+        + f"\nin table: '{db_manager.schema}.{table_name}'",
+        bg="yellow",
+        bold=True,
+    )
+    click.echo(nl=True)
+
+    if not click.confirm("Are you sure you want to continue?"):
+        return
+
+    file_count = db_manager.drop_report_date_partition(table_name, report_date_key)
+    if file_count is None:
+        click.secho(
+            f"Table '{table_name}' has no partition for report date {report_date_key}.",
+            fg="yellow",
+        )
+        return
+
+    click.secho(
+        f"Dropped report date {report_date_key} from table '{table_name}', "
+        + f"{file_count:,} files will be loaded again by the next import",
+        fg="green",
+    )
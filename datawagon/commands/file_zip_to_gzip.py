@@ -1,4 +1,9 @@
-from typing import List
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Tuple
 
 import click
 
@@ -9,8 +14,22 @@ from datawagon.objects.managed_file_scanner import ManagedFilesToDatabase
 
 
 @click.command()
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of files converted at the same time, each in its own process",
+)
+@click.option(
+    "--compression-level",
+    type=click.IntRange(min=1, max=9),
+    default=FileUtils.DEFAULT_COMPRESSION_LEVEL,
+    show_default=True,
+    help="gzip compression level, lower levels are faster but compress less",
+)
 @click.pass_context
-def file_zip_to_gzip(ctx: click.Context) -> None:
+def file_zip_to_gzip(ctx: click.Context, jobs: int, compression_level: int) -> None:
     # get list of all zip files
     all_matched_files: List[ManagedFilesToDatabase] = ctx.invoke(
         files_in_local_fs, file_extension="zip"
@@ -28,13 +47,63 @@ def file_zip_to_gzip(ctx: click.Context) -> None:
         abort=True,
     )
 
+    if jobs == 1:
+        for zip_file in zip_files:
+            click.secho(f"Converting {zip_file.file_path} to gzip...", fg="blue")
+            try:
+                result = _convert_zip_file(zip_file.file_path, compression_level, None)
+            except Exception as e:
+                click.secho(f"ERROR: {e}", fg="red")
+                continue
+            _echo_conversion_result(*result)
+        return
+
+    # the cores are shared by the processes, each compresses on its own threads
+    threads = max(1, (os.cpu_count() or 1) // jobs)
+
+    # spawn, as in import-all-to-postgres, so workers start from a clean process
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = {
+            executor.submit(
+                _convert_zip_file, zip_file.file_path, compression_level, threads
+            ): zip_file
+            for zip_file in zip_files
+        }
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                click.secho(f"ERROR: {futures[future].file_path}: {e}", fg="red")
+                continue
+            _echo_conversion_result(*result)
+
+
+def _convert_zip_file(
+    zip_path: Path, compression_level: int, threads: Optional[int]
+) -> Tuple[Path, int, float]:
+    """Convert a zip file and remove it, and return the gzip file,
+    the number of csv bytes converted and the seconds it took."""
+    start_time = time.perf_counter()
+
     file_utils = FileUtils()
-    for zip_file in zip_files:
-        click.secho(f"Converting {zip_file.file_path} to gzip...", fg="blue")
-        file_output = file_utils.csv_zip_to_gzip(
-            zip_file.file_path, remove_original_zip=True
-        )
-        if file_output:
-            click.secho(f"Success: {file_output} ", fg="green")
-        else:
-            click.secho("ERROR", fg="red")
+    csv_size = file_utils.zip_csv_size(zip_path)
+    file_output = file_utils.csv_zip_to_gzip(
+        zip_path,
+        remove_original_zip=True,
+        compression_level=compression_level,
+        threads=threads,
+    )
+
+    return file_output, csv_size, time.perf_counter() - start_time
+
+
+def _echo_conversion_result(file_output: Path, csv_size: int, seconds: float) -> None:
+    megabytes = csv_size / (1024 * 1024)
+    click.secho(
+        f"Success: {file_output} "
+        + f"({megabytes:,.1f} MB in {seconds:.1f}s, {megabytes / max(seconds, 1e-6):,.1f} MB/s)",
+        fg="green",
+    )
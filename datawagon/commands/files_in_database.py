@@ -1,17 +1,20 @@
-from typing import List
+from typing import TYPE_CHECKING, List
 
 import click
 
-from datawagon.database.postgres_database_manager import PostgresDatabaseManager
+from datawagon.objects.connections import get_db_manager
 from datawagon.objects.current_table_data import CurrentDestinationData
 
+if TYPE_CHECKING:
+    from datawagon.database.postgres_database_manager import PostgresDatabaseManager
+
 
 @click.command()
 @click.pass_context
 def files_in_database(ctx: click.Context) -> List[CurrentDestinationData]:
     """Display existing tables and number of rows."""
 
-    db_manager = ctx.obj["DB_CONNECTION"]
+    db_manager = get_db_manager(ctx)
 
     if not db_manager.is_valid_connection:
         ctx.abort()
@@ -33,26 +36,15 @@ def files_in_database(ctx: click.Context) -> List[CurrentDestinationData]:
 
 
 def _current_tables(
-    db_manager: PostgresDatabaseManager,
+    db_manager: "PostgresDatabaseManager",
 ) -> List[CurrentDestinationData]:
-    tables = db_manager.table_names()
-    all_table_data = []
-    with click.progressbar(
-        length=len(tables),
-        label=click.style("Retrieving existing file data from database ", fg="blue"),
-        show_eta=False,
-    ) as table_progress:
-        for table in tables:
-            table_exists = db_manager.check_table(table)
-            if table_exists:
-                table_df = db_manager.files_in_table_df(table)
-                file_list = table_df["_file_name"].tolist()
-                table_data = CurrentDestinationData(
-                    base_name=table,
-                    file_count=len(file_list),
-                    source_files=file_list,
-                )
-                all_table_data.append(table_data)
-                table_progress.update(1)
+    all_table_data, untracked_tables = db_manager.current_destination_data()
+
+    if untracked_tables:
+        click.secho(
+            f"{len(untracked_tables)} tables are not in the file ledger, "
+            + "run backfill-file-ledger once to skip scanning them",
+            fg="yellow",
+        )
 
     return all_table_data
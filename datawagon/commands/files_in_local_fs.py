@@ -36,7 +36,9 @@ def files_in_local_fs(
     click.secho(f"Scanning for .csv files in {source_path}...", fg="blue")
 
     matched_files = ManagedFileScanner(
-        app_config.csv_source_config, app_config.csv_source_dir
+        ctx.obj["FILE_CONFIG"],
+        app_config.csv_source_dir,
+        app_config.cache_dir if app_config.is_scan_cache_enabled else None,
     ).matched_files(file_extension)
 
     if len(matched_files) == 0:
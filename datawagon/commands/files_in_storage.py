@@ -2,42 +2,48 @@ from typing import List
 
 import click
 
-from datawagon.bucket.gcs_manager import GcsManager
-from datawagon.objects.app_config import AppConfig
+from datawagon.objects.connections import get_gcs_manager
 from datawagon.objects.current_table_data import CurrentDestinationData
 from datawagon.objects.source_config import SourceConfig
 
 
 @click.command()
+@click.option(
+    "--verify-manifest",
+    is_flag=True,
+    default=False,
+    help="List every storage folder and rebuild its manifest from the listing",
+)
 @click.pass_context
-def files_in_storage(ctx: click.Context) -> List[CurrentDestinationData]:
+def files_in_storage(
+    ctx: click.Context, verify_manifest: bool
+) -> List[CurrentDestinationData]:
     """Display existing tables and number of rows."""
 
-    app_config: AppConfig = ctx.obj["CONFIG"]
-    gcs_manager = GcsManager(app_config.gcs_project_id, app_config.gcs_bucket)
-
-    if not gcs_manager:
-        ctx.abort()
-    else:
-        ctx.obj["GCS_MANAGER"] = gcs_manager
-
+    gcs_manager = get_gcs_manager(ctx)
     valid_config: SourceConfig = ctx.obj["FILE_CONFIG"]
 
-    blob_df = gcs_manager.files_in_blobs_df(valid_config)
+    files_by_base_name, folders_without_manifest = gcs_manager.files_in_blobs(
+        valid_config, verify_manifest
+    )
 
-    all_table_data = []
-    for base_name in blob_df["base_name"].unique():
-        table_files = blob_df.loc[blob_df["base_name"] == base_name]._file_name.tolist()
+    if folders_without_manifest:
+        click.secho(
+            f"{len(folders_without_manifest)} storage folders have no manifest, "
+            + "run files-in-storage --verify-manifest once to skip listing them",
+            fg="yellow",
+        )
 
-        all_table_data.append(
-            CurrentDestinationData(
-                base_name=base_name,
-                file_count=len(table_files),
-                source_files=table_files,
-            )
+    all_table_data = [
+        CurrentDestinationData(
+            base_name=base_name,
+            file_count=len(table_files),
+            source_files=table_files,
         )
+        for base_name, table_files in files_by_base_name.items()
+    ]
 
-    file_count = len(blob_df)
+    file_count = sum(len(table_files) for table_files in files_by_base_name.values())
 
     click.echo(nl=True)
     click.secho(f"{file_count} files in bucket storage")
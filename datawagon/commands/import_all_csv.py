@@ -1,22 +1,90 @@
-from typing import List
+import importlib.util
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Literal, Optional, Tuple
 
 import click
+from pydantic import BaseModel
 
 from datawagon.commands.compare import compare_local_files_to_postgres
-from datawagon.database.postgres_database_manager import PostgresDatabaseManager
-from datawagon.objects.csv_loader import CSVLoader
+from datawagon.objects.app_config import AppConfig
+from datawagon.objects.connections import get_db_manager
+from datawagon.objects.csv_loader import CSVEngine, CSVLoader
 from datawagon.objects.managed_file_metadata import ManagedFileMetadata
 from datawagon.objects.managed_file_scanner import ManagedFilesToDatabase
+from datawagon.objects.profiler import ProfileOptions, ProfileRecords, profiler
+
+if TYPE_CHECKING:
+    from datawagon.database.postgres_database_manager import PostgresDatabaseManager
+
+
+class FileImportOptions(BaseModel):
+    chunk_size: int = CSVLoader.DEFAULT_CHUNK_SIZE
+    is_direct_copy: bool = False
+    is_binary_copy: bool = False
+    csv_engine: CSVEngine = CSVLoader.DEFAULT_CSV_ENGINE
+
+
+def validate_csv_engine(ctx: click.Context, param: Any, value: str) -> str:
+    if value == "pyarrow" and importlib.util.find_spec("pyarrow") is None:
+        raise click.BadParameter(
+            "the pyarrow csv engine requires pyarrow, install it with: "
+            'pip install "datawagon[arrow]"'
+        )
+    return value
 
 
 @click.command(name="import-all-to-postgres")
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=CSVLoader.DEFAULT_CHUNK_SIZE,
+    show_default=True,
+    help="Number of rows read into memory at a time while loading a file",
+)
+@click.option(
+    "--direct-copy",
+    is_flag=True,
+    default=False,
+    help="Append files to existing tables by copying them directly from disk, "
+    + "type conversion is done by the database",
+)
+@click.option(
+    "--binary-copy",
+    is_flag=True,
+    default=False,
+    help="Copy typed rows into the database in the binary format instead of csv text",
+)
+@click.option(
+    "--csv-engine",
+    type=click.Choice(CSVLoader.CSV_ENGINES),
+    default=CSVLoader.DEFAULT_CSV_ENGINE,
+    show_default=True,
+    callback=validate_csv_engine,
+    help="Parser used to read files, pyarrow parses with multiple threads",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of files loaded at the same time, "
+    + "each in its own process with its own database connection",
+)
 @click.pass_context
-def import_all_csv(ctx: click.Context) -> None:
+def import_all_csv(
+    ctx: click.Context,
+    chunk_size: int,
+    direct_copy: bool,
+    binary_copy: bool,
+    csv_engine: CSVEngine,
+    jobs: int,
+) -> None:
     """Scan a directory for .csv files and import them into a PostgreSQL database."""
 
-    config = ctx.obj["CONFIG"]
+    config: AppConfig = ctx.obj["CONFIG"]
 
-    db_manager: PostgresDatabaseManager = ctx.obj["DB_CONNECTION"]
+    db_manager = get_db_manager(ctx)
 
     if not db_manager.is_valid_connection:
         ctx.abort()
@@ -39,27 +107,33 @@ def import_all_csv(ctx: click.Context) -> None:
 
         click.echo(nl=True)
 
-        has_errors = False
-        for csv_info in csv_file_infos:
-            click.echo(
-                f"Importing {csv_info.file_name} into table: {csv_info.table_name} ... ",
-                nl=False,
-            )
-
-            loader = CSVLoader(csv_info)
+        import_options = FileImportOptions(
+            chunk_size=chunk_size,
+            is_direct_copy=direct_copy,
+            is_binary_copy=binary_copy,
+            csv_engine=csv_engine,
+        )
 
-            df = loader.load_data()
+        _ensure_file_name_indexes(
+            db_manager, [csv_info.table_name for csv_info in csv_file_infos]
+        )
 
-            success_count = db_manager.load_dataframe_into_database(
-                df, csv_info.table_name
+        if jobs > 1:
+            has_errors = _import_files_in_parallel(
+                config, db_manager, csv_file_infos, import_options, jobs
             )
+        else:
+            has_errors = False
+            for csv_info in csv_file_infos:
+                click.echo(
+                    f"Importing {csv_info.file_name} into table: {csv_info.table_name} ... ",
+                    nl=False,
+                )
 
-            if success_count == -1:
-                has_errors = True
-                click.echo(nl=True)
-                click.secho(f"Import failed for {csv_info.file_name}", fg="red")
-            else:
-                click.secho(f"inserted {success_count:,} rows", fg="green")
+                success_count = _load_file(db_manager, csv_info, import_options)
+
+                if not _echo_import_result(csv_info, success_count):
+                    has_errors = True
 
         click.echo(nl=True)
 
@@ -74,3 +148,162 @@ def import_all_csv(ctx: click.Context) -> None:
             )
 
         # TODO: check_database again and display new row difference (?)
+
+
+def _ensure_file_name_indexes(
+    db_manager: "PostgresDatabaseManager", table_names: Iterable[str]
+) -> None:
+    """Index existing tables before files are appended to them,
+    new tables are indexed by the load which creates them."""
+    for table_name in sorted(set(table_names)):
+        if db_manager.check_table(table_name) and not db_manager.has_file_name_index(
+            table_name
+        ):
+            click.echo(f"Adding _file_name index to table: {table_name} ... ", nl=False)
+            db_manager.ensure_file_name_index(table_name)
+            click.secho("done", fg="green")
+
+
+def _import_files_in_parallel(
+    app_config: AppConfig,
+    db_manager: "PostgresDatabaseManager",
+    csv_file_infos: List[ManagedFileMetadata],
+    import_options: FileImportOptions,
+    jobs: int,
+) -> bool:
+    """Import files in a pool of worker processes and return True if any failed.
+
+    Tables which do not exist yet are created by the first file loaded into
+    them, the remaining files for such a table wait until it has been created."""
+    files_by_table: Dict[str, List[ManagedFileMetadata]] = {}
+    for csv_info in csv_file_infos:
+        files_by_table.setdefault(csv_info.table_name, []).append(csv_info)
+
+    has_errors = False
+
+    # spawn, so workers never inherit the open connections of this process
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        running: Dict[Future, ManagedFileMetadata] = {}
+
+        def submit(csv_info: ManagedFileMetadata) -> None:
+            future = executor.submit(
+                _load_file_in_worker,
+                app_config,
+                csv_info,
+                import_options,
+                profiler.options,
+            )
+            running[future] = csv_info
+
+        def submit_next_files(table_name: str) -> None:
+            table_files = files_by_table[table_name]
+            if db_manager.check_table(table_name):
+                files_to_submit = table_files[:]
+            else:
+                files_to_submit = table_files[:1]
+
+            for csv_info in files_to_submit:
+                table_files.remove(csv_info)
+                submit(csv_info)
+
+        for table_name in files_by_table:
+            submit_next_files(table_name)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                csv_info = running.pop(future)
+
+                click.echo(
+                    f"Imported {csv_info.file_name} into table: {csv_info.table_name} ... ",
+                    nl=False,
+                )
+
+                try:
+                    success_count, profile_records = future.result()
+                    profiler.merge(profile_records)
+                except Exception as e:
+                    click.echo(nl=True)
+                    click.secho(f"Error: {e}", fg="red")
+                    success_count = -1
+
+                if not _echo_import_result(csv_info, success_count):
+                    has_errors = True
+
+                submit_next_files(csv_info.table_name)
+
+    return has_errors
+
+
+def _echo_import_result(csv_info: ManagedFileMetadata, success_count: int) -> bool:
+    if success_count == -1:
+        click.echo(nl=True)
+        click.secho(f"Import failed for {csv_info.file_name}", fg="red")
+        return False
+
+    click.secho(f"inserted {success_count:,} rows", fg="green")
+    return True
+
+
+def _load_file_in_worker(
+    app_config: AppConfig,
+    csv_info: ManagedFileMetadata,
+    import_options: FileImportOptions,
+    profile_options: ProfileOptions,
+) -> Tuple[int, Optional[ProfileRecords]]:
+    """Load a file, and return the profile records of the load to be merged
+    into the report of the command when profiling"""
+    if profile_options.is_enabled and not profiler.is_enabled:
+        profiler.start(profile_options)
+
+    from datawagon.database.postgres_database_manager import PostgresDatabaseManager
+
+    db_manager = PostgresDatabaseManager(app_config)
+    if not db_manager.is_valid_connection:
+        return -1, None
+
+    try:
+        success_count = _load_file(db_manager, csv_info, import_options)
+    finally:
+        db_manager.close()
+
+    return success_count, profiler.take_records() if profiler.is_enabled else None
+
+
+def _load_file(
+    db_manager: "PostgresDatabaseManager",
+    csv_info: ManagedFileMetadata,
+    import_options: FileImportOptions,
+    append_or_replace: Literal["append", "replace"] = "append",
+) -> int:
+    # stages of the load are also recorded for the file
+    with profiler.file(csv_info.file_name):
+        loader = CSVLoader(csv_info, import_options.csv_engine)
+
+        # the direct copy can only append to a table created by an earlier load
+        if (
+            import_options.is_direct_copy
+            and append_or_replace == "append"
+            and db_manager.check_table(csv_info.table_name)
+        ):
+            with loader.open_copy_stream() as (columns, csv_stream):
+                return db_manager.copy_csv_stream_into_database(
+                    csv_stream,
+                    columns,
+                    csv_info.table_name,
+                    csv_info.file_name,
+                    csv_info.file_size_in_bytes,
+                    csv_info.report_date_key,
+                )
+
+        return db_manager.load_dataframe_into_database(
+            loader.load_data_chunks(import_options.chunk_size),
+            csv_info.table_name,
+            append_or_replace,
+            import_options.is_binary_copy,
+            csv_info.file_name,
+            csv_info.file_size_in_bytes,
+            csv_info.report_date_key,
+        )
@@ -2,9 +2,15 @@ from pathlib import Path
 
 import click
 
-from datawagon.database.postgres_database_manager import PostgresDatabaseManager
+from datawagon.commands.import_all_csv import (
+    FileImportOptions,
+    _ensure_file_name_indexes,
+    _load_file,
+    validate_csv_engine,
+)
 from datawagon.objects.app_config import AppConfig
-from datawagon.objects.csv_loader import CSVLoader
+from datawagon.objects.connections import get_db_manager
+from datawagon.objects.csv_loader import CSVEngine, CSVLoader
 from datawagon.objects.managed_file_scanner import ManagedFileScanner
 
 
@@ -16,6 +22,34 @@ from datawagon.objects.managed_file_scanner import ManagedFileScanner
     show_default=True,
     help="Replace all table data with file instead of default append",
 )
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=CSVLoader.DEFAULT_CHUNK_SIZE,
+    show_default=True,
+    help="Number of rows read into memory at a time while loading the file",
+)
+@click.option(
+    "--direct-copy",
+    is_flag=True,
+    default=False,
+    help="Append the file to an existing table by copying it directly from disk, "
+    + "type conversion is done by the database",
+)
+@click.option(
+    "--binary-copy",
+    is_flag=True,
+    default=False,
+    help="Copy typed rows into the database in the binary format instead of csv text",
+)
+@click.option(
+    "--csv-engine",
+    type=click.Choice(CSVLoader.CSV_ENGINES),
+    default=CSVLoader.DEFAULT_CSV_ENGINE,
+    show_default=True,
+    callback=validate_csv_engine,
+    help="Parser used to read the file, pyarrow parses with multiple threads",
+)
 @click.argument(
     "file_path",
     type=click.Path(
@@ -29,7 +63,14 @@ from datawagon.objects.managed_file_scanner import ManagedFileScanner
 @click.argument("file_base_name", type=str, required=True)
 @click.pass_context
 def import_selected_csv(
-    ctx: click.Context, replace: bool, file_path: str, file_base_name: str
+    ctx: click.Context,
+    replace: bool,
+    chunk_size: int,
+    direct_copy: bool,
+    binary_copy: bool,
+    csv_engine: CSVEngine,
+    file_path: str,
+    file_base_name: str,
 ) -> None:
     """Import a single .csv file into the database."""
 
@@ -42,7 +83,7 @@ def import_selected_csv(
     app_config: AppConfig = ctx.obj["CONFIG"]
 
     source_file_mapper = ManagedFileScanner(
-        app_config.csv_source_config, app_config.csv_source_dir
+        ctx.obj["FILE_CONFIG"], app_config.csv_source_dir
     ).matched_file(csv_file_path, file_base_name, replace)
 
     if not source_file_mapper or not source_file_mapper.files:
@@ -52,7 +93,7 @@ def import_selected_csv(
 
     csv_info = source_file_mapper.files[0]
 
-    db_manager: PostgresDatabaseManager = ctx.obj["DB_CONNECTION"]
+    db_manager = get_db_manager(ctx)
 
     if not db_manager.is_valid_connection:
         ctx.abort()
@@ -64,12 +105,18 @@ def import_selected_csv(
         click.echo(nl=True)
         ctx.abort()
 
-    loader = CSVLoader(csv_info)
+    import_options = FileImportOptions(
+        chunk_size=chunk_size,
+        is_direct_copy=direct_copy,
+        is_binary_copy=binary_copy,
+        csv_engine=csv_engine,
+    )
 
-    df = loader.load_data()
+    if csv_info.table_append_or_replace == "append":
+        _ensure_file_name_indexes(db_manager, [csv_info.table_name])
 
-    if db_manager.load_dataframe_into_database(
-        df, csv_info.table_name, csv_info.table_append_or_replace
+    if _load_file(
+        db_manager, csv_info, import_options, csv_info.table_append_or_replace
     ):
         click.secho("Successfully imported data into database", fg="green")
     else:
@@ -1,6 +1,6 @@
 import click
 
-from datawagon.database.postgres_database_manager import PostgresDatabaseManager
+from datawagon.objects.connections import get_db_manager
 
 
 @click.command()
@@ -8,7 +8,7 @@ from datawagon.database.postgres_database_manager import PostgresDatabaseManager
 def reset_database(ctx: click.Context) -> None:
     """Reset the database by dropping all tables and views in the selected schema."""
 
-    db_manager: PostgresDatabaseManager = ctx.obj["DB_CONNECTION"]
+    db_manager = get_db_manager(ctx)
     if not db_manager.is_valid_connection:
         ctx.abort()
 
@@ -1,23 +1,66 @@
 # from pathlib import Path
-from typing import List
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, List, get_args
 
 import click
 
-from datawagon.bucket.gcs_manager import GcsManager
+from datawagon.bucket.storage_manifest import StorageManifestFile
+from datawagon.bucket.upload_result import (
+    DEFAULT_UPLOAD_CHUNK_SIZE,
+    UploadResult,
+    UploadStatus,
+)
 from datawagon.commands.compare import compare_local_files_to_bucket
+from datawagon.objects.connections import get_gcs_manager
+from datawagon.objects.file_utils import FileUtils
 from datawagon.objects.managed_file_metadata import ManagedFileMetadata
 from datawagon.objects.managed_file_scanner import ManagedFilesToDatabase
+from datawagon.objects.profiler import profiler
+
+if TYPE_CHECKING:
+    from click._termui_impl import ProgressBar
+
+    from datawagon.bucket.gcs_manager import GcsManager
+
+# uploaded files added to the manifest of a storage folder at a time
+MANIFEST_BATCH_SIZE = 50
 
 
 @click.command(name="upload-to-gcs")
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of files uploaded at the same time",
+)
+@click.option(
+    "--chunk-size-mb",
+    type=click.IntRange(min=1),
+    default=DEFAULT_UPLOAD_CHUNK_SIZE // (1024 * 1024),
+    show_default=True,
+    help="Size of each request of a resumable upload, "
+    + "an interrupted upload resumes from the last chunk received",
+)
+@click.option(
+    "--from-zip",
+    is_flag=True,
+    default=False,
+    help="Also upload .csv.zip files, compressed to .csv.gz while they are uploaded "
+    + "without writing a .csv.gz file",
+)
 @click.pass_context
-def upload_all_gzip_csv(ctx: click.Context) -> None:
+def upload_all_gzip_csv(
+    ctx: click.Context, jobs: int, chunk_size_mb: int, from_zip: bool
+) -> None:
     """Upload all new files to storage bucket."""
 
     matched_new_files: List[ManagedFilesToDatabase] = ctx.invoke(
-        compare_local_files_to_bucket
+        compare_local_files_to_bucket, include_zip=from_zip
     )
-    gcs_manager: GcsManager = ctx.obj["GCS_MANAGER"]
+    gcs_manager = get_gcs_manager(ctx)
 
     csv_file_infos: List[ManagedFileMetadata] = [
         file_info for src in matched_new_files for file_info in src.files
@@ -33,43 +76,155 @@ def upload_all_gzip_csv(ctx: click.Context) -> None:
 
         click.echo(nl=True)
 
-        has_errors = False
-        for csv_info in csv_file_infos:
-            click.echo(
-                f"Uploading {csv_info.file_name} into {csv_info.storage_folder_name}... ",
-                nl=False,
-            )
+        files_by_status = _upload_files(
+            gcs_manager, csv_file_infos, jobs, chunk_size_mb * 1024 * 1024
+        )
 
-            str_path = str(csv_info.file_path)
+        click.echo(nl=True)
 
-            if csv_info.report_date_str:
-                destination_name = (
-                    f"{csv_info.storage_folder_name or csv_info.base_name}/"
-                    + f"report_date={csv_info.report_date_str}/{csv_info.file_name}"
-                )
-            else:
-                destination_name = (
-                    (csv_info.storage_folder_name or csv_info.base_name)
-                    + "/"
-                    + csv_info.file_name
-                )
+        click.secho(f"{len(files_by_status['uploaded'])} files uploaded")
+        if files_by_status["skipped"]:
+            click.secho(
+                f"{len(files_by_status['skipped'])} files skipped, "
+                + "identical files are already in the bucket"
+            )
 
-            is_success = gcs_manager.upload_blob(
-                str_path,
-                destination_name,
+        for csv_info in files_by_status["conflict"]:
+            click.secho(
+                f"Conflict: {_destination_name(csv_info)} is in the bucket "
+                + f"with different content than {csv_info.file_name}, not overwritten",
+                fg="yellow",
             )
 
-            if not is_success:
-                has_errors = True
-                click.echo(nl=True)
-                click.secho(f"Upload failed for {csv_info.file_name}", fg="red")
-            else:
-                click.secho("Success", fg="green")
+        for csv_info in files_by_status["failed"]:
+            click.secho(f"Upload failed for {csv_info.file_name}", fg="red")
 
-        if has_errors:
+        if files_by_status["failed"] or files_by_status["conflict"]:
             click.secho("Import errors, check output", fg="red", bold=True)
         else:
             click.secho(
                 "Successfully uploaded files into storage bucket",
                 fg="green",
             )
+
+
+def _upload_files(
+    gcs_manager: "GcsManager",
+    csv_file_infos: List[ManagedFileMetadata],
+    jobs: int,
+    chunk_size: int,
+) -> Dict[UploadStatus, List[ManagedFileMetadata]]:
+    """Upload files with at most jobs uploads in flight, and return the files
+    by the status of their upload. Progress is shown for all bytes across
+    the uploads.
+
+    A zip file is compressed as it is uploaded, so its progress counts
+    gzip bytes against the size of the zip, which is about the same.
+
+    Uploaded files are added to the manifests of their storage folders
+    in batches, so an interrupted run loses at most one batch."""
+    files_by_status: Dict[UploadStatus, List[ManagedFileMetadata]] = {
+        status: [] for status in get_args(UploadStatus)
+    }
+    uploaded_files: Dict[str, Dict[str, StorageManifestFile]] = {}
+
+    total_bytes = sum(csv_info.file_size_in_bytes for csv_info in csv_file_infos)
+
+    upload_progress: "ProgressBar[int]"
+    with click.progressbar(
+        length=total_bytes,
+        label=click.style(f"Uploading {len(csv_file_infos)} files ", fg="blue"),
+    ) as upload_progress:
+        # uploads report progress from their own threads
+        progress_lock = threading.Lock()
+
+        def on_progress(byte_count: int) -> None:
+            with progress_lock:
+                upload_progress.update(byte_count)
+
+        # the cores are shared by the uploads compressing zip files
+        threads = max(1, (os.cpu_count() or 1) // jobs)
+
+        def upload_file(csv_info: ManagedFileMetadata) -> UploadResult:
+            with profiler.file(csv_info.file_name):
+                if csv_info.file_name.endswith(".zip"):
+                    return gcs_manager.upload_zip_as_gzip(
+                        str(csv_info.file_path),
+                        _destination_name(csv_info),
+                        chunk_size,
+                        on_progress,
+                        threads=threads,
+                    )
+
+                return gcs_manager.upload_blob(
+                    str(csv_info.file_path),
+                    _destination_name(csv_info),
+                    chunk_size,
+                    on_progress,
+                )
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(upload_file, csv_info): csv_info
+                for csv_info in csv_file_infos
+            }
+
+            for future in as_completed(futures):
+                csv_info = futures[future]
+                upload_result = future.result()
+                files_by_status[upload_result.status].append(csv_info)
+
+                if upload_result.status in ("skipped", "conflict"):
+                    on_progress(csv_info.file_size_in_bytes)
+
+                if upload_result.manifest_file is None:
+                    continue
+
+                # the manifest has every object in the bucket, including
+                # the ones which were not uploaded
+                folder_files = uploaded_files.setdefault(
+                    _storage_folder_name(csv_info), {}
+                )
+                folder_files[_destination_name(csv_info)] = upload_result.manifest_file
+                if len(folder_files) >= MANIFEST_BATCH_SIZE:
+                    _update_manifests(gcs_manager, uploaded_files)
+
+    _update_manifests(gcs_manager, uploaded_files)
+
+    return files_by_status
+
+
+def _update_manifests(
+    gcs_manager: "GcsManager", uploaded_files: Dict[str, Dict[str, StorageManifestFile]]
+) -> None:
+    for storage_folder_name, folder_files in uploaded_files.items():
+        if not folder_files:
+            continue
+
+        try:
+            gcs_manager.update_manifest(storage_folder_name, folder_files)
+        except Exception as e:
+            # the files are uploaded, a listing will still find them
+            click.secho(
+                f"Unable to update manifest of {storage_folder_name}: {e}, "
+                + "run files-in-storage --verify-manifest to rebuild it",
+                fg="yellow",
+            )
+
+        folder_files.clear()
+
+
+def _storage_folder_name(csv_info: ManagedFileMetadata) -> str:
+    return csv_info.storage_folder_name or csv_info.base_name
+
+
+def _destination_name(csv_info: ManagedFileMetadata) -> str:
+    # zip files are uploaded as the gzip file they convert to
+    file_name = FileUtils().gzip_file_name(csv_info.file_name)
+    if csv_info.report_date_str:
+        return (
+            f"{_storage_folder_name(csv_info)}/"
+            + f"report_date={csv_info.report_date_str}/{file_name}"
+        )
+
+    return _storage_folder_name(csv_info) + "/" + file_name
@@ -0,0 +1,38 @@
+from typing import Any, Iterable, List
+
+
+class CopyBlockStream(object):
+    """Read only file-like object which feeds blocks of str or bytes from an
+    iterable to COPY ... FROM STDIN.
+
+    Blocks are only pulled from the iterable as the cursor reads, so COPY starts
+    sending as soon as the first block is encoded and no more than one block
+    is held in memory at a time."""
+
+    def __init__(self, blocks: Iterable[Any]) -> None:
+        self._blocks = iter(blocks)
+        self._block: Any = ""
+        self._offset = 0
+
+    def read(self, size: int = -1) -> Any:
+        parts: List[Any] = []
+        remaining = size
+
+        while size < 0 or remaining > 0:
+            if self._offset >= len(self._block):
+                block = next(self._blocks, None)
+                if block is None:
+                    break
+                self._block, self._offset = block, 0
+                continue
+
+            start = self._offset
+            end = len(self._block) if size < 0 else start + remaining
+            part = self._block[start:end]
+
+            self._offset += len(part)
+            remaining -= len(part)
+            parts.append(part)
+
+        # join with an empty value of the same type as the blocks
+        return self._block[:0].join(parts)
@@ -0,0 +1,219 @@
+import struct
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import chain, repeat
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class PgBinaryCopyEncoder(object):
+    """
+    Encode a typed DataFrame in the PostgreSQL binary COPY format (PGCOPY).
+
+    Values are written from the numpy arrays behind each column, so they are
+    never formatted as text and parsed again by the database. Each column is
+    encoded as the type pandas.to_sql creates for its dtype:
+    - int64 and uint32 as bigint, int32 and uint16 as integer,
+      smaller ints as smallint
+    - float64 as numeric(19, 7), see PostgresDatabaseManager
+    - datetime64 as timestamp
+    - bool as boolean
+    - object columns of strings as text
+
+    Numeric values are rounded half away from zero at the shortest decimal
+    representation of each float, the same way the database rounds the text
+    written by csv.writer.
+    """
+
+    SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+    HEADER = SIGNATURE + struct.pack(">ii", 0, 0)
+    TRAILER = struct.pack(">h", -1)
+    NULL_FIELD = struct.pack(">i", -1)
+
+    ROWS_PER_BLOCK = 10_000
+
+    # binary format of the integer type pandas creates for each dtype
+    INT_FORMATS = {
+        "int8": ">i2",
+        "uint8": ">i2",
+        "int16": ">i2",
+        "uint16": ">i4",
+        "int32": ">i4",
+        "uint32": ">i8",
+        "int64": ">i8",
+    }
+
+    NUMERIC_PRECISION = 19
+    NUMERIC_SCALE = 7
+    # numeric(19, 7) fits in 3 integer and 2 fractional base 10000 digits
+    NUMERIC_DIGITS = 5
+    NUMERIC_WEIGHT = 2
+    NUMERIC_POS = 0x0000
+    NUMERIC_NEG = 0x4000
+
+    # microseconds between the unix and postgres (2000-01-01) epochs
+    PG_EPOCH_OFFSET_MICROS = 946_684_800_000_000
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.df = df
+
+    def encode(self) -> bytes:
+        return b"".join(self.encode_blocks())
+
+    def encode_blocks(self, rows_per_block: int = ROWS_PER_BLOCK) -> Iterator[bytes]:
+        yield self.HEADER
+
+        row_header = struct.pack(">h", len(self.df.columns))
+        for start in range(0, len(self.df), rows_per_block):
+            end = start + rows_per_block
+            block = self.df.iloc[start:end]
+
+            column_fields = [
+                self._encode_column(block[column]) for column in block.columns
+            ]
+
+            yield b"".join(
+                chain.from_iterable(zip(repeat(row_header, len(block)), *column_fields))
+            )
+
+        yield self.TRAILER
+
+    def _encode_column(self, series: pd.Series) -> List[bytes]:
+        dtype = series.dtype
+
+        if dtype == np.bool_:
+            return self._fixed_size_fields(series.to_numpy(), ">i1")
+        elif str(dtype) in self.INT_FORMATS:
+            return self._fixed_size_fields(
+                series.to_numpy(), self.INT_FORMATS[str(dtype)]
+            )
+        elif dtype == np.float64:
+            return self._encode_numeric(series.to_numpy())
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            return self._encode_timestamp(series)
+        elif dtype == object:
+            return self._encode_text(series)
+
+        raise ValueError(
+            f"Unsupported type for binary copy: {dtype}, column: {series.name}"
+        )
+
+    def _fixed_size_fields(
+        self,
+        values: np.ndarray,
+        value_format: str,
+        is_null: Optional[np.ndarray] = None,
+    ) -> List[bytes]:
+        fields = np.empty(len(values), dtype=[("size", ">i4"), ("value", value_format)])
+        fields["size"] = np.dtype(value_format).itemsize
+        fields["value"] = values
+
+        return self._split_fields(fields, is_null)
+
+    def _split_fields(
+        self, fields: np.ndarray, is_null: Optional[np.ndarray] = None
+    ) -> List[bytes]:
+        buffer = fields.tobytes()
+        size = fields.dtype.itemsize
+        encoded = [
+            buffer[start:end]
+            for start, end in zip(
+                range(0, len(buffer), size), range(size, len(buffer) + size, size)
+            )
+        ]
+
+        if is_null is not None:
+            for i in np.flatnonzero(is_null):
+                encoded[i] = self.NULL_FIELD
+
+        return encoded
+
+    def _encode_timestamp(self, series: pd.Series) -> List[bytes]:
+        if getattr(series.dt, "tz", None) is not None:
+            series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+
+        values = series.to_numpy(dtype="datetime64[us]").view(np.int64)
+        is_null = series.isna().to_numpy()
+
+        return self._fixed_size_fields(
+            values - self.PG_EPOCH_OFFSET_MICROS, ">i8", is_null
+        )
+
+    def _encode_text(self, series: pd.Series) -> List[bytes]:
+        encoded = []
+        for value in series.to_numpy():
+            # empty strings are loaded as null by the csv copy as well
+            if value is None or value == "" or value != value:
+                encoded.append(self.NULL_FIELD)
+            else:
+                text = str(value).encode("utf-8")
+                encoded.append(struct.pack(">i", len(text)) + text)
+
+        return encoded
+
+    def _encode_numeric(self, values: np.ndarray) -> List[bytes]:
+        is_null = np.isnan(values)
+        values = np.where(is_null, 0.0, values)
+        if np.isinf(values).any():
+            raise ValueError("Infinite values can not be loaded into numeric columns")
+
+        abs_units = self._numeric_units(np.abs(values))
+
+        int_part = abs_units // np.uint64(10**self.NUMERIC_SCALE)
+        # scale the fractional part to the 8 digits of two base 10000 digits
+        frac_part = (
+            abs_units
+            % np.uint64(10**self.NUMERIC_SCALE)
+            * np.uint64(10 ** (2 * 4 - self.NUMERIC_SCALE))
+        )
+
+        fields = np.empty(
+            len(values),
+            dtype=[("size", ">i4"), ("ndigits", ">i2"), ("weight", ">i2")]
+            + [("sign", ">u2"), ("dscale", ">i2")]
+            + [(f"digit{i}", ">i2") for i in range(self.NUMERIC_DIGITS)],
+        )
+        fields["size"] = 8 + 2 * self.NUMERIC_DIGITS
+        fields["ndigits"] = self.NUMERIC_DIGITS
+        fields["weight"] = self.NUMERIC_WEIGHT
+        fields["sign"] = np.where(
+            (values < 0) & (abs_units > 0), self.NUMERIC_NEG, self.NUMERIC_POS
+        )
+        fields["dscale"] = self.NUMERIC_SCALE
+        fields["digit0"] = int_part // np.uint64(10**8)
+        fields["digit1"] = int_part // np.uint64(10**4) % np.uint64(10**4)
+        fields["digit2"] = int_part % np.uint64(10**4)
+        fields["digit3"] = frac_part // np.uint64(10**4)
+        fields["digit4"] = frac_part % np.uint64(10**4)
+
+        return self._split_fields(fields, is_null)
+
+    def _numeric_units(self, abs_values: np.ndarray) -> np.ndarray:
+        """Round absolute values to integer units of the numeric scale."""
+        scaled = abs_values * 10**self.NUMERIC_SCALE
+        fraction = scaled - np.floor(scaled)
+
+        # Multiplying by the scale can move a value across a rounding boundary.
+        # Values close enough to one for that to matter are rounded by Decimal,
+        # which includes every value too large to be represented exactly.
+        tolerance = 8 * np.finfo(np.float64).eps * np.maximum(scaled, 1.0)
+        is_inexact = np.abs(fraction - 0.5) <= tolerance
+
+        abs_units = np.floor(np.where(is_inexact, 0.0, scaled) + 0.5).astype(np.uint64)
+
+        max_units = 10**self.NUMERIC_PRECISION
+        unit = Decimal(1).scaleb(-self.NUMERIC_SCALE)
+        for i in np.flatnonzero(is_inexact):
+            exact = Decimal(repr(float(abs_values[i]))).quantize(
+                unit, rounding=ROUND_HALF_UP
+            )
+            units = int(exact.scaleb(self.NUMERIC_SCALE))
+            if units >= max_units:
+                raise ValueError(
+                    f"Value {abs_values[i]} is too large for "
+                    + f"numeric({self.NUMERIC_PRECISION}, {self.NUMERIC_SCALE})"
+                )
+            abs_units[i] = units
+
+        return abs_units
@@ -1,13 +1,30 @@
 import csv
+from contextlib import contextmanager
 from io import StringIO
-from typing import Any, Iterable, List, Literal, Union
+from itertools import islice
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import pandas as pd
 import psycopg2
 from psycopg2.sql import SQL, Identifier
 from sqlalchemy import Numeric, create_engine
+from sqlalchemy.exc import SQLAlchemyError
 
+from datawagon.database.copy_block_stream import CopyBlockStream
+from datawagon.database.pg_binary_copy import PgBinaryCopyEncoder
 from datawagon.objects.app_config import AppConfig
+from datawagon.objects.current_table_data import CurrentDestinationData
+from datawagon.objects.profiler import profiler
 
 
 class PostgresDatabaseManager:
@@ -29,50 +46,97 @@ class PostgresDatabaseManager:
 
     CNAME_FILE_NAME = "_file_name"
 
+    CNAME_REPORT_DATE_KEY = "_report_date_key"
+
     INDEX_COLUMN_NAME = CNAME_FILE_NAME
 
+    # Rows of a file are appended together, so each block range holds very few
+    # file names. A small BRIN index fits that, and unlike a btree it adds
+    # almost nothing to the cost of a load. autosummarize covers new ranges.
+    FILE_NAME_INDEX_PAGES_PER_RANGE = 32
+
     LOG_TABLE_NAME = "log"
 
+    # one row per file loaded into a table, written in the same transaction as the load
+    FILE_LEDGER_TABLE_NAME = "file_ledger"
+    # tables with every file in the ledger, created since it was added or backfilled
+    FILE_LEDGER_TABLES_TABLE_NAME = "file_ledger_tables"
+
+    COPY_BLOCK_SIZE = 1024 * 1024
+
+    COPY_ROWS_PER_BLOCK = 10_000
+
     def __init__(self, app_config: AppConfig) -> None:
         self.connection_error = ""
         self.schema = app_config.db_schema
         self.hostname = ""
         self.db_name = app_config.db_url.split("/")[-1]
+        self.is_partitioned_by_report_date = app_config.is_partitioned_by_report_date
+        # whether each table loaded in this run is partitioned, so appending
+        # a file does not query for it again
+        self._partitioned_tables: Dict[str, bool] = {}
 
         try:
-            self.connection = psycopg2.connect(app_config.db_url)
-            self.connection.set_session(autocommit=True)
-            self.hostname = self.connection.info.host
-        except psycopg2.OperationalError as e:
-            self.connection_error = str(e)
-
-        try:
-            self.engine = create_engine(app_config.db_url, isolation_level="AUTOCOMMIT")
+            # All queries and loads check out connections from a single pool,
+            # so connections are reused by every command in a chained invocation.
+            # pre_ping replaces connections dropped by the server before use.
+            self.engine = create_engine(
+                app_config.db_url,
+                isolation_level="AUTOCOMMIT",
+                pool_size=app_config.db_pool_size,
+                pool_pre_ping=True,
+            )
+            with self._cursor() as cursor:
+                self.hostname = cursor.connection.info.host
+                cursor.close()
         except Exception as e:
             self.connection_error = str(e)
 
         self.is_valid_connection = self.test_connection()
 
+    @contextmanager
+    def _cursor(self) -> Iterator[Any]:
+        """Check out a connection from the pool and return it when the cursor is done"""
+        connection = self.engine.raw_connection()
+        cursor = connection.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Any]:
+        """Connection with a transaction, committed when the block completes"""
+        with self.engine.connect() as conn:
+            # the engine is in autocommit mode, use a transaction for the load
+            conn.execution_options(isolation_level="READ COMMITTED")
+            with conn.begin() as transaction:
+                yield conn
+                # committed here instead of when the block exits, to time it
+                with profiler.stage("postgres.commit"):
+                    transaction.commit()
+
     def close(self) -> None:
         if not self.connection_error:
-            self.connection.close()
+            self.engine.dispose()
 
     def test_connection(self) -> bool:
         if self.connection_error:
             print(f"Connection error: {self.connection_error}")
             return False
         try:
-            with self.connection.cursor() as cursor:
+            with self._cursor() as cursor:
                 cursor.execute("select 1")
                 cursor.close()
             return True
-        except psycopg2.Error:
+        except (psycopg2.Error, SQLAlchemyError):
             return False
 
     def check_schema(self) -> bool:
         query = SQL("select exists(select 1 from pg_namespace where nspname = %s);")
 
-        with self.connection.cursor() as cursor:
+        with self._cursor() as cursor:
             cursor.execute(query, (self.schema,))
             results = cursor.fetchone()
             exists = results[0] if results is not None else False
@@ -97,7 +161,7 @@ class PostgresDatabaseManager:
             """
         )
 
-        with self.connection.cursor() as cursor:
+        with profiler.stage("postgres.check_table"), self._cursor() as cursor:
             cursor.execute(query, (self.schema, table_name))
             results = cursor.fetchone()
             exists = results[0] if results is not None else False
@@ -105,39 +169,112 @@ class PostgresDatabaseManager:
             return exists
 
     def ensure_schema_exists(self) -> None:
-        with self.connection.cursor() as cursor:
+        with self._cursor() as cursor:
             cursor.execute(SQL("create schema if not exists {}".format(self.schema)))
             cursor.close()
 
     def load_dataframe_into_database(
         self,
-        df: pd.DataFrame,
+        df: Union[pd.DataFrame, Iterable[pd.DataFrame]],
         table_name: str,
         append_or_replace: Literal["append", "replace"] = "append",
+        is_binary_copy: bool = False,
+        file_name: Optional[str] = None,
+        file_size_in_bytes: Optional[int] = None,
+        report_date_key: Optional[int] = None,
     ) -> int:
-        # float will cause floating point precision issues in reporting, cast to numeric
-        dtype_dict = {}
-        for col in df.columns:
-            if df[col].dtype == "float64":
-                dtype_dict[col] = Numeric(precision=19, scale=7)
+        """Load a DataFrame, or an iterable of DataFrame chunks from the same file,
+        into a table. All chunks are copied within a single transaction,
+        so a failure part way through a file leaves the table untouched.
+        The file is added to the file ledger in the same transaction.
+
+        With is_binary_copy the rows are copied in the binary format, pandas is
+        only used to create or replace the table.
+
+        The rows of a file share its report_date_key. A new table is partitioned
+        by it when is_partitioned_by_report_date is set, and the partition for
+        the file is created before it is loaded into a partitioned table."""
+        chunks = [df] if isinstance(df, pd.DataFrame) else df
+
+        row_count = 0
 
         try:
-            df.to_sql(
-                name=table_name,
-                schema=self.schema,
-                con=self.engine,
-                if_exists=append_or_replace,
-                index=False,
-                method=self._df_to_pg_copy,
-                dtype=dtype_dict,
+            # only tables created or replaced by a load start out in the ledger
+            is_new_table = append_or_replace == "replace" or not self.check_table(
+                table_name
+            )
+            if not is_new_table:
+                self.ensure_report_date_partition(table_name, report_date_key)
+
+            # kept until the first chunk has created the partitioned table
+            new_table_report_date_key = (
+                report_date_key
+                if is_new_table and self.is_partitioned_by_report_date
+                else None
             )
 
+            with self._transaction() as conn:
+                if_exists = append_or_replace
+                for chunk in chunks:
+                    if new_table_report_date_key is not None:
+                        with profiler.stage("postgres.create_partitioned_table"):
+                            self._create_partitioned_table(
+                                conn,
+                                chunk,
+                                table_name,
+                                if_exists,
+                                new_table_report_date_key,
+                            )
+                        if_exists = "append"
+                        new_table_report_date_key = None
+
+                    # in binary mode only the empty frame is used by pandas
+                    sql_df = chunk.head(0) if is_binary_copy else chunk
+                    # includes reflecting or creating the table, and the copy
+                    with profiler.stage("postgres.to_sql"):
+                        sql_df.to_sql(
+                            name=table_name,
+                            schema=self.schema,
+                            con=conn,
+                            if_exists=if_exists,
+                            index=False,
+                            method=self._df_to_pg_copy,
+                            dtype=self._numeric_dtypes(chunk),
+                        )
+                    if is_binary_copy:
+                        self._df_to_pg_binary_copy(chunk, conn, table_name)
+                    # only the first chunk may replace the table
+                    if_exists = "append"
+
+                    row_count += len(chunk)
+                    if file_name is None and len(chunk) > 0:
+                        file_name = chunk.iloc[0][self.CNAME_FILE_NAME]
+
+                if is_new_table:
+                    with profiler.stage("postgres.create_index"):
+                        self._create_file_name_index(conn, table_name)
+
+                with profiler.stage("postgres.file_ledger"):
+                    self._add_to_file_ledger(
+                        conn,
+                        table_name,
+                        file_name,
+                        row_count,
+                        file_size_in_bytes,
+                        is_new_table,
+                    )
+
+            if is_new_table:
+                self._partitioned_tables[table_name] = (
+                    self.is_partitioned_by_report_date and report_date_key is not None
+                )
+
             self.log_operation(
-                f"Loaded {len(df)} rows into {self.schema}.{table_name}",
-                df.iloc[0][self.CNAME_FILE_NAME],
+                f"Loaded {row_count} rows into {self.schema}.{table_name}",
+                file_name,
             )
 
-            return len(df)
+            return row_count
 
         except (Exception, psycopg2.DatabaseError) as error:
             self.log_operation(
@@ -146,6 +283,351 @@ class PostgresDatabaseManager:
             print(f"Table Update Failed: {error}")
             return -1
 
+    def copy_csv_stream_into_database(
+        self,
+        csv_stream: Any,
+        columns: List[str],
+        table_name: str,
+        file_name: str,
+        file_size_in_bytes: Optional[int] = None,
+        report_date_key: Optional[int] = None,
+    ) -> int:
+        """Append csv records directly to an existing table with COPY, leaving
+        all type conversion to the database. The stream is read in blocks as
+        it is sent, so no part of the file is held in memory."""
+        try:
+            self.ensure_report_date_partition(table_name, report_date_key)
+
+            with self._transaction() as conn:
+                with conn.connection.cursor() as cursor:
+                    sql = SQL("copy {} ({}) from stdin with csv").format(
+                        Identifier(self.schema, table_name),
+                        SQL(", ").join([Identifier(column) for column in columns]),
+                    )
+
+                    with profiler.stage("postgres.copy") as stage:
+                        cursor.copy_expert(
+                            sql=sql,
+                            file=profiler.count_bytes(csv_stream, stage),
+                            size=self.COPY_BLOCK_SIZE,
+                        )
+                    row_count = cursor.rowcount
+                    cursor.close()
+
+                with profiler.stage("postgres.file_ledger"):
+                    self._add_to_file_ledger(
+                        conn, table_name, file_name, row_count, file_size_in_bytes
+                    )
+
+            self.log_operation(
+                f"Loaded {row_count} rows into {self.schema}.{table_name}",
+                file_name,
+            )
+
+            return row_count
+
+        except (Exception, psycopg2.DatabaseError) as error:
+            self.log_operation(f"Failed to copy file into {table_name}", str(error))
+            print(f"Table Update Failed: {error}")
+            return -1
+
+    def has_file_name_index(self, table_name: str) -> bool:
+        """Check for any index which starts with the file name column"""
+        query = SQL(
+            """
+            select exists(
+                select 1
+                from pg_index as i
+                join pg_class as t
+                    on t.oid = i.indrelid
+                join pg_namespace as n
+                    on n.oid = t.relnamespace
+                join pg_attribute as a
+                    on a.attrelid = t.oid
+                    and a.attnum = i.indkey[0]
+                where
+                    n.nspname = %s
+                    and t.relname = %s
+                    and a.attname = %s
+            );
+            """
+        )
+
+        with self._cursor() as cursor:
+            cursor.execute(query, (self.schema, table_name, self.INDEX_COLUMN_NAME))
+            results = cursor.fetchone()
+            exists = results[0] if results is not None else False
+            cursor.close()
+            return exists
+
+    def ensure_file_name_index(self, table_name: str) -> bool:
+        """Create the file name index of a table if it has none,
+        and return True if it was created.
+
+        The index must exist before files are appended in parallel, creating it
+        while other loads hold locks on the table would wait for them."""
+        if self.has_file_name_index(table_name):
+            return False
+
+        with self._transaction() as conn:
+            self._create_file_name_index(conn, table_name)
+
+        self.log_operation(f"Created file name index on {self.schema}.{table_name}")
+
+        return True
+
+    def _create_file_name_index(self, conn: Any, table_name: str) -> None:
+        query = SQL(
+            """
+            create index if not exists {} on {} using brin ({})
+            with (pages_per_range = %s, autosummarize = on)
+            """
+        ).format(
+            Identifier(f"{table_name}_file_name_idx"),
+            Identifier(self.schema, table_name),
+            Identifier(self.INDEX_COLUMN_NAME),
+        )
+
+        # the commit is left to the transaction of the caller
+        with conn.connection.cursor() as cursor:
+            cursor.execute(query, (self.FILE_NAME_INDEX_PAGES_PER_RANGE,))
+            cursor.close()
+
+    def is_partitioned_table(self, table_name: str) -> bool:
+        query = SQL(
+            """
+            select exists(
+                select 1
+                from pg_partitioned_table as p
+                join pg_class as t
+                    on t.oid = p.partrelid
+                join pg_namespace as n
+                    on n.oid = t.relnamespace
+                where
+                    n.nspname = %s
+                    and t.relname = %s
+            );
+            """
+        )
+
+        with self._cursor() as cursor:
+            cursor.execute(query, (self.schema, table_name))
+            results = cursor.fetchone()
+            exists = results[0] if results is not None else False
+            cursor.close()
+            return exists
+
+    def report_date_partition_name(self, table_name: str, report_date_key: int) -> str:
+        return f"{table_name}_{report_date_key}"
+
+    def ensure_report_date_partition(
+        self, table_name: str, report_date_key: Optional[int]
+    ) -> None:
+        """Create the partition for a report date before a file is appended to
+        a partitioned table. Tables which are not partitioned are left as they are.
+
+        The partition is created in a transaction of its own, so other loads
+        into the table wait for it only while it is attached."""
+        if report_date_key is None:
+            return
+
+        if table_name not in self._partitioned_tables:
+            self._partitioned_tables[table_name] = self.is_partitioned_table(table_name)
+        if not self._partitioned_tables[table_name]:
+            return
+
+        with profiler.stage("postgres.create_partition"), self._transaction() as conn:
+            self._attach_report_date_partition(conn, table_name, report_date_key)
+
+    def drop_report_date_partition(
+        self, table_name: str, report_date_key: int
+    ) -> Optional[int]:
+        """Drop the partition of a report date, and remove its files from the
+        file ledger so the next import loads them again. Returns the number of
+        files, or None if the table has no partition for the report date."""
+        partition_name = self.report_date_partition_name(table_name, report_date_key)
+
+        with self._transaction() as conn:
+            with conn.connection.cursor() as cursor:
+                if not self._is_partition(cursor, partition_name):
+                    return None
+
+                cursor.execute(
+                    SQL(
+                        """
+                        delete from {}
+                        where
+                            table_name = %s
+                            and file_name in (select distinct {} from {})
+                        """
+                    ).format(
+                        Identifier(self.schema, self.FILE_LEDGER_TABLE_NAME),
+                        Identifier(self.CNAME_FILE_NAME),
+                        Identifier(self.schema, partition_name),
+                    ),
+                    (table_name,),
+                )
+                file_count = cursor.rowcount
+                cursor.execute(
+                    SQL("drop table {}").format(Identifier(self.schema, partition_name))
+                )
+                cursor.close()
+
+        self.log_operation(
+            f"Dropped partition {self.schema}.{partition_name}", f"{file_count} files"
+        )
+
+        return file_count
+
+    def _create_partitioned_table(
+        self,
+        conn: Any,
+        df: pd.DataFrame,
+        table_name: str,
+        if_exists: Literal["append", "replace"],
+        report_date_key: int,
+    ) -> None:
+        # pandas creates the table with the columns and types it loads,
+        # then a partitioned table with the same columns takes its place
+        df.head(0).to_sql(
+            name=table_name,
+            schema=self.schema,
+            con=conn,
+            if_exists=if_exists,
+            index=False,
+            dtype=self._numeric_dtypes(df),
+        )
+
+        partitioned_table_name = f"{table_name}_partitioned"
+
+        # the commit is left to the transaction of the caller
+        with conn.connection.cursor() as cursor:
+            cursor.execute(
+                SQL("create table {} (like {}) partition by list ({})").format(
+                    Identifier(self.schema, partitioned_table_name),
+                    Identifier(self.schema, table_name),
+                    Identifier(self.CNAME_REPORT_DATE_KEY),
+                )
+            )
+            cursor.execute(
+                SQL("drop table {}").format(Identifier(self.schema, table_name))
+            )
+            cursor.execute(
+                SQL("alter table {} rename to {}").format(
+                    Identifier(self.schema, partitioned_table_name),
+                    Identifier(table_name),
+                )
+            )
+            cursor.close()
+
+        self._attach_report_date_partition(conn, table_name, report_date_key)
+
+    def _attach_report_date_partition(
+        self, conn: Any, table_name: str, report_date_key: int
+    ) -> None:
+        partition_name = self.report_date_partition_name(table_name, report_date_key)
+
+        # the commit is left to the transaction of the caller
+        with conn.connection.cursor() as cursor:
+            # parallel loads of the same report date wait for the first one
+            # to create the partition, then find it
+            cursor.execute(
+                "select pg_advisory_xact_lock(hashtext(%s))",
+                (f"{self.schema}.{table_name}",),
+            )
+
+            if not self._is_partition(cursor, partition_name):
+                # Created on its own, then attached. Attaching locks the table
+                # in a mode which does not block loads into its other
+                # partitions, unlike creating the table as a partition.
+                cursor.execute(
+                    SQL("create table {} (like {})").format(
+                        Identifier(self.schema, partition_name),
+                        Identifier(self.schema, table_name),
+                    )
+                )
+                cursor.execute(
+                    SQL("alter table {} attach partition {} for values in (%s)").format(
+                        Identifier(self.schema, table_name),
+                        Identifier(self.schema, partition_name),
+                    ),
+                    (report_date_key,),
+                )
+            cursor.close()
+
+    def _is_partition(self, cursor: Any, partition_name: str) -> bool:
+        query = SQL(
+            """
+            select exists(
+                select 1
+                from pg_class as t
+                join pg_namespace as n
+                    on n.oid = t.relnamespace
+                where
+                    n.nspname = %s
+                    and t.relname = %s
+                    and t.relispartition
+            );
+            """
+        )
+
+        cursor.execute(query, (self.schema, partition_name))
+        results = cursor.fetchone()
+        return results[0] if results is not None else False
+
+    def _add_to_file_ledger(
+        self,
+        conn: Any,
+        table_name: str,
+        file_name: Optional[str],
+        row_count: int,
+        file_size_in_bytes: Optional[int],
+        is_new_table: bool = False,
+    ) -> None:
+        file_ledger = Identifier(self.schema, self.FILE_LEDGER_TABLE_NAME)
+
+        # the commit is left to the transaction of the load
+        with conn.connection.cursor() as cursor:
+            if is_new_table:
+                # files of a replaced table are gone with it
+                cursor.execute(
+                    SQL("delete from {} where table_name = %s").format(file_ledger),
+                    (table_name,),
+                )
+                cursor.execute(
+                    SQL(
+                        "insert into {} (table_name) values (%s) on conflict do nothing"
+                    ).format(
+                        Identifier(self.schema, self.FILE_LEDGER_TABLES_TABLE_NAME)
+                    ),
+                    (table_name,),
+                )
+
+            if file_name is not None:
+                cursor.execute(
+                    SQL(
+                        """
+                        insert into {} as ledger
+                            (table_name, file_name, row_count, file_size_in_bytes)
+                        values (%s, %s, %s, %s)
+                        on conflict (table_name, file_name) do update set
+                            row_count = ledger.row_count + excluded.row_count,
+                            file_size_in_bytes = excluded.file_size_in_bytes,
+                            loaded_at = excluded.loaded_at
+                        """
+                    ).format(file_ledger),
+                    (table_name, file_name, row_count, file_size_in_bytes),
+                )
+            cursor.close()
+
+    def _numeric_dtypes(self, df: pd.DataFrame) -> dict[str, Numeric]:
+        # float will cause floating point precision issues in reporting, cast to numeric
+        dtype_dict = {}
+        for col in df.columns:
+            if df[col].dtype == "float64":
+                dtype_dict[col] = Numeric(precision=19, scale=7)
+        return dtype_dict
+
     def _df_to_pg_copy(
         self,
         table: Any,
@@ -153,33 +635,71 @@ class PostgresDatabaseManager:
         keys: list[str],
         data_iter: Iterable[tuple[Any, ...]],
     ) -> None:
-        # Convert the DataFrame iterable (back) into CSV format
-        buffer = StringIO()
-        writer = csv.writer(buffer)
-        writer.writerows(data_iter)
-        buffer.seek(0)
+        # Convert the DataFrame iterable (back) into CSV format as COPY reads it
+        stream = CopyBlockStream(self._csv_blocks(data_iter))
 
+        # the commit is left to the transaction in load_dataframe_into_database
         raw_connection = conn.connection
         with raw_connection.cursor() as cursor:
             sql = SQL(
                 "copy {} from stdin with csv".format(f"{table.schema}.{table.name}")
             )
 
-            cursor.copy_expert(sql=sql, file=buffer)
-            cursor.connection.commit()
+            with profiler.stage("postgres.csv_copy") as stage:
+                cursor.copy_expert(
+                    sql=sql,
+                    file=profiler.count_bytes(stream, stage),
+                    size=self.COPY_BLOCK_SIZE,
+                )
+            cursor.close()
+
+    def _csv_blocks(self, data_iter: Iterable[tuple[Any, ...]]) -> Iterator[str]:
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+
+        rows = iter(data_iter)
+        while batch := list(islice(rows, self.COPY_ROWS_PER_BLOCK)):
+            writer.writerows(batch)
+            yield buffer.getvalue()
+
+            buffer.seek(0)
+            buffer.truncate()
+
+    def _df_to_pg_binary_copy(
+        self, df: pd.DataFrame, conn: Any, table_name: str
+    ) -> None:
+        stream = CopyBlockStream(
+            PgBinaryCopyEncoder(df).encode_blocks(self.COPY_ROWS_PER_BLOCK)
+        )
+
+        # the commit is left to the transaction in load_dataframe_into_database
+        raw_connection = conn.connection
+        with raw_connection.cursor() as cursor:
+            sql = SQL("copy {} ({}) from stdin with (format binary)").format(
+                Identifier(self.schema, table_name),
+                SQL(", ").join([Identifier(column) for column in df.columns]),
+            )
+
+            with profiler.stage("postgres.binary_copy") as stage:
+                cursor.copy_expert(
+                    sql=sql,
+                    file=profiler.count_bytes(stream, stage),
+                    size=self.COPY_BLOCK_SIZE,
+                )
             cursor.close()
 
     def drop_schema(self) -> None:
-        with self.connection.cursor() as cursor:
+        with self._cursor() as cursor:
             sql = SQL("drop schema if exists {} cascade;").format(
                 Identifier(self.schema)
             )
             cursor.execute(sql)
             cursor.close()
+        self._partitioned_tables.clear()
 
     def drop_all_tables_and_views(self) -> None:
         # 7/20/23 - unused, replaced by drop_schema
-        with self.connection.cursor() as cursor:
+        with self._cursor() as cursor:
             sql = f"""
                 do $$ declare
                     r record;
@@ -201,12 +721,18 @@ class PostgresDatabaseManager:
 
     def check_if_file_imported(self, file_name: str, table_name: str) -> bool:
         if self.check_table(table_name):
-            with self.connection.cursor() as cursor:
-                table = (self.schema, table_name)
-                query = SQL(
-                    "select exists(select 1 from {} where _file_name=%s)"
-                ).format(Identifier(*table))
-                cursor.execute(query, (file_name,))
+            with self._cursor() as cursor:
+                if self.is_table_in_file_ledger(table_name):
+                    query = SQL(
+                        "select exists(select 1 from {} where table_name=%s and file_name=%s)"
+                    ).format(Identifier(self.schema, self.FILE_LEDGER_TABLE_NAME))
+                    cursor.execute(query, (table_name, file_name))
+                else:
+                    table = (self.schema, table_name)
+                    query = SQL(
+                        "select exists(select 1 from {} where _file_name=%s)"
+                    ).format(Identifier(*table))
+                    cursor.execute(query, (file_name,))
                 result = cursor.fetchone()
                 cursor.close()
                 return result[0] if result else False
@@ -225,20 +751,215 @@ class PostgresDatabaseManager:
 
         return pd.read_sql(query, self.engine)
 
+    def files_in_file_ledger(self) -> Dict[str, List[str]]:
+        """Files of each table with all of its files in the file ledger"""
+        query = SQL(
+            """
+            select
+                tables.table_name,
+                ledger.file_name
+            from {} as tables
+            left join {} as ledger
+                on ledger.table_name = tables.table_name
+            """
+        ).format(
+            Identifier(self.schema, self.FILE_LEDGER_TABLES_TABLE_NAME),
+            Identifier(self.schema, self.FILE_LEDGER_TABLE_NAME),
+        )
+
+        files_by_table: Dict[str, List[str]] = {}
+        with self._cursor() as cursor:
+            cursor.execute(query)
+            for table_name, file_name in cursor.fetchall():
+                table_files = files_by_table.setdefault(table_name, [])
+                if file_name is not None:
+                    table_files.append(file_name)
+            cursor.close()
+
+        return files_by_table
+
+    def current_destination_data(
+        self,
+    ) -> Tuple[List[CurrentDestinationData], List[str]]:
+        """Files of every table, and the names of the tables which are not in
+        the file ledger. Tables in the ledger are read with the table list in
+        one query, the other tables are scanned together in a second query."""
+        query = SQL(
+            """
+            select
+                tables.table_name,
+                tracked.table_name is not null as is_tracked,
+                ledger.file_name
+            from information_schema.tables as tables
+            left join {} as tracked
+                on tracked.table_name = tables.table_name
+            left join {} as ledger
+                on ledger.table_name = tracked.table_name
+            where
+                tables.table_schema = %s
+                -- views have no files, partitioned tables are base tables
+                and tables.table_type = 'BASE TABLE'
+                and not tables.table_name = any(%s)
+                and {}
+            order by
+                tables.table_name,
+                ledger.file_name
+            """
+        ).format(
+            Identifier(self.schema, self.FILE_LEDGER_TABLES_TABLE_NAME),
+            Identifier(self.schema, self.FILE_LEDGER_TABLE_NAME),
+            self._is_not_partition_condition(),
+        )
+
+        files_by_table: Dict[str, List[str]] = {}
+        untracked_tables: List[str] = []
+        with self._cursor() as cursor:
+            cursor.execute(query, (self.schema, self._internal_table_names()))
+            for table_name, is_tracked, file_name in cursor.fetchall():
+                table_files = files_by_table.setdefault(table_name, [])
+                if not is_tracked:
+                    untracked_tables.append(table_name)
+                elif file_name is not None:
+                    table_files.append(file_name)
+
+            if untracked_tables:
+                cursor.execute(
+                    self._files_in_tables_query(untracked_tables), untracked_tables
+                )
+                for table_name, file_name in cursor.fetchall():
+                    files_by_table[table_name].append(file_name)
+            cursor.close()
+
+        destination_data = [
+            CurrentDestinationData(
+                base_name=table_name,
+                file_count=len(file_names),
+                source_files=file_names,
+            )
+            for table_name, file_names in files_by_table.items()
+        ]
+
+        return destination_data, untracked_tables
+
+    def _files_in_tables_query(self, table_names: List[str]) -> Any:
+        # one union query instead of a round trip per table, the table
+        # names are passed as parameters in the same order
+        return SQL(" union all ").join(
+            SQL("(select %s as table_name, {} from {} group by {} order by {})").format(
+                Identifier(self.CNAME_FILE_NAME),
+                Identifier(self.schema, table_name),
+                Identifier(self.CNAME_FILE_NAME),
+                Identifier(self.CNAME_FILE_NAME),
+            )
+            for table_name in table_names
+        )
+
+    def is_table_in_file_ledger(self, table_name: str) -> bool:
+        query = SQL("select exists(select 1 from {} where table_name = %s)").format(
+            Identifier(self.schema, self.FILE_LEDGER_TABLES_TABLE_NAME)
+        )
+
+        with self._cursor() as cursor:
+            cursor.execute(query, (table_name,))
+            results = cursor.fetchone()
+            exists = results[0] if results is not None else False
+            cursor.close()
+            return exists
+
+    def backfill_file_ledger(self, table_name: str) -> int:
+        """Add the files already loaded into a table to the file ledger,
+        and return the number of files"""
+        query = SQL(
+            """
+            insert into {} as ledger (table_name, file_name, row_count, loaded_at)
+            select
+                %s,
+                {},
+                count(*),
+                max(_file_load_date)
+            from {}
+            group by
+                {}
+            on conflict (table_name, file_name) do update set
+                row_count = excluded.row_count,
+                loaded_at = excluded.loaded_at
+            """
+        ).format(
+            Identifier(self.schema, self.FILE_LEDGER_TABLE_NAME),
+            Identifier(self.CNAME_FILE_NAME),
+            Identifier(self.schema, table_name),
+            Identifier(self.CNAME_FILE_NAME),
+        )
+
+        with self._transaction() as conn:
+            with conn.connection.cursor() as cursor:
+                cursor.execute(query, (table_name,))
+                file_count = cursor.rowcount
+                cursor.execute(
+                    SQL(
+                        "insert into {} (table_name) values (%s) on conflict do nothing"
+                    ).format(
+                        Identifier(self.schema, self.FILE_LEDGER_TABLES_TABLE_NAME)
+                    ),
+                    (table_name,),
+                )
+                cursor.close()
+
+        self.log_operation(
+            f"Backfilled file ledger for {self.schema}.{table_name}",
+            f"{file_count} files",
+        )
+
+        return file_count
+
     def table_names(self) -> List[str]:
-        query = """
-                select
-                    table_name
-                from information_schema.tables
+        query = SQL(
+            """
+            select
+                tables.table_name
+            from information_schema.tables as tables
+            where
+                tables.table_schema = %s
+                -- views have no files, partitioned tables are base tables
+                and tables.table_type = 'BASE TABLE'
+                and not tables.table_name = any(%s)
+                and {}
+            order by
+                tables.table_name
+            """
+        ).format(self._is_not_partition_condition())
+
+        with self._cursor() as cursor:
+            cursor.execute(query, (self.schema, self._internal_table_names()))
+            table_names = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+
+        return table_names
+
+    def _is_not_partition_condition(self) -> Any:
+        # partitions are listed as tables by information_schema, their rows
+        # and files belong to the partitioned table
+        return SQL(
+            """
+            not exists(
+                select 1
+                from pg_class as partition
+                join pg_namespace as n
+                    on n.oid = partition.relnamespace
                 where
-                    table_schema = %(schema)s
-                    and not table_name = %(log_table_name)s
-                order by
-                    table_name
+                    n.nspname = tables.table_schema
+                    and partition.relname = tables.table_name
+                    and partition.relispartition
+            )
             """
-        params = {"schema": self.schema, "log_table_name": self.LOG_TABLE_NAME}
-        df = pd.read_sql_query(query, self.engine, params=params)
-        return df["table_name"].tolist()
+        )
+
+    def _internal_table_names(self) -> List[str]:
+        return [
+            self.LOG_TABLE_NAME,
+            self.FILE_LEDGER_TABLE_NAME,
+            self.FILE_LEDGER_TABLES_TABLE_NAME,
+        ]
 
     def create_log_table(self) -> None:
         if not self.check_table(self.LOG_TABLE_NAME):
@@ -251,12 +972,49 @@ class PostgresDatabaseManager:
                 );
                 """
             )
-            with self.connection.cursor() as cursor:
+            with self._cursor() as cursor:
                 cursor.execute(
                     query.format(Identifier(self.schema, self.LOG_TABLE_NAME))
                 )
                 cursor.close()
 
+    def create_file_ledger(self) -> None:
+        if not self.check_table(self.FILE_LEDGER_TABLE_NAME):
+            query = SQL(
+                """
+                create table if not exists {} (
+                    table_name text not null,
+                    file_name text not null,
+                    row_count bigint not null,
+                    file_size_in_bytes bigint,
+                    loaded_at timestamp default current_timestamp,
+                    primary key (table_name, file_name)
+                );
+                """
+            )
+            with self._cursor() as cursor:
+                cursor.execute(
+                    query.format(Identifier(self.schema, self.FILE_LEDGER_TABLE_NAME))
+                )
+                cursor.close()
+
+        if not self.check_table(self.FILE_LEDGER_TABLES_TABLE_NAME):
+            query = SQL(
+                """
+                create table if not exists {} (
+                    table_name text primary key,
+                    tracked_since timestamp default current_timestamp
+                );
+                """
+            )
+            with self._cursor() as cursor:
+                cursor.execute(
+                    query.format(
+                        Identifier(self.schema, self.FILE_LEDGER_TABLES_TABLE_NAME)
+                    )
+                )
+                cursor.close()
+
     def log_operation(self, operation: str, details: Union[str, None] = None) -> None:
         query = SQL(
             """
@@ -264,7 +1022,7 @@ class PostgresDatabaseManager:
             values (%s, %s);
             """
         )
-        with self.connection.cursor() as cursor:
+        with profiler.stage("postgres.log_operation"), self._cursor() as cursor:
             cursor.execute(
                 query.format(Identifier(self.schema, self.LOG_TABLE_NAME)),
                 (operation, details),
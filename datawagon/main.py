@@ -2,17 +2,20 @@ import importlib.metadata
 import signal
 import subprocess
 import sys
+from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
 import click
-import toml
 from dotenv import find_dotenv, load_dotenv
-from hologram import ValidationError
 
+from datawagon.commands.add_file_name_indexes import add_file_name_indexes
+from datawagon.commands.backfill_file_ledger import backfill_file_ledger
 from datawagon.commands.compare import (
     compare_local_files_to_bucket,
     compare_local_files_to_postgres,
 )
+from datawagon.commands.drop_report_date import drop_report_date
 from datawagon.commands.file_zip_to_gzip import file_zip_to_gzip
 from datawagon.commands.files_in_database import files_in_database
 from datawagon.commands.files_in_local_fs import files_in_local_fs
@@ -21,15 +24,23 @@ from datawagon.commands.import_all_csv import import_all_csv
 from datawagon.commands.import_single_csv import import_selected_csv
 from datawagon.commands.reset_database import reset_database
 from datawagon.commands.upload_to_storage import upload_all_gzip_csv
-from datawagon.database.postgres_database_manager import PostgresDatabaseManager
 from datawagon.objects.app_config import AppConfig
 from datawagon.objects.parameter_validator import ParameterValidator
+from datawagon.objects.profiler import ProfileOptions, profiler
 from datawagon.objects.source_config import SourceConfig
 
 
 @click.group(chain=True)
 @click.option("--db-url", type=str, help="Database URL", envvar="DW_POSTGRES_DB_URL")
 @click.option("--db-schema", type=str, help="Schema name to use", envvar="DW_DB_SCHEMA")
+@click.option(
+    "--db-pool-size",
+    type=click.IntRange(min=1),
+    default=5,
+    show_default=True,
+    help="Number of database connections kept open for reuse",
+    envvar="DW_DB_POOL_SIZE",
+)
 @click.option(
     "--csv-source-dir",
     type=click.Path(exists=True, file_okay=False, dir_okay=True, readable=True),
@@ -42,6 +53,29 @@ from datawagon.objects.source_config import SourceConfig
     help="Location of source_config.toml",
     envvar="DW_CSV_SOURCE_TOML",
 )
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, dir_okay=True),
+    default=str(Path("~", ".cache", "datawagon")),
+    show_default=True,
+    help="Directory for data kept between runs",
+    envvar="DW_CACHE_DIR",
+)
+@click.option(
+    "--scan-cache/--no-scan-cache",
+    default=True,
+    show_default=True,
+    help="Reuse the previous scan of the source directory for unchanged files",
+    envvar="DW_SCAN_CACHE",
+)
+@click.option(
+    "--partition-by-report-date/--no-partition-by-report-date",
+    default=False,
+    show_default=True,
+    help="Create new tables partitioned by _report_date_key, with a partition for "
+    + "each report date created as files are loaded",
+    envvar="DW_PARTITION_BY_REPORT_DATE",
+)
 @click.option(
     "--gcs-project-id",
     type=str,
@@ -54,72 +88,98 @@ from datawagon.objects.source_config import SourceConfig
     help="Bucket used for Google Cloud Storage",
     envvar="DW_GCS_BUCKET",
 )
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Time the stages of every command, and write a JSON report of the "
+    + "time, bytes and memory of each stage and file at exit",
+    envvar="DW_PROFILE",
+)
+@click.option(
+    "--profile-report",
+    type=click.Path(file_okay=True, dir_okay=False),
+    default=None,
+    help="File for the profile report  [default: profiles in the cache dir]",
+)
+@click.option(
+    "--profile-cprofile",
+    is_flag=True,
+    default=False,
+    help="Also profile every function with cProfile, saved next to the report",
+)
+@click.option(
+    "--profile-memory",
+    is_flag=True,
+    default=False,
+    help="Also trace allocations with tracemalloc, for the peak memory of each "
+    + "stage and the largest allocations. Slows down every command",
+)
 @click.pass_context
 def cli(
     ctx: click.Context,
     db_url: str,
     db_schema: str,
+    db_pool_size: int,
     csv_source_dir: Path,
     csv_source_config: Path,
+    cache_dir: str,
+    scan_cache: bool,
+    partition_by_report_date: bool,
     gcs_project_id: str,
     gcs_bucket: str,
+    profile: bool,
+    profile_report: Optional[str],
+    profile_cprofile: bool,
+    profile_memory: bool,
 ) -> None:
+    if profile or profile_report or profile_cprofile or profile_memory:
+        profiler.start(
+            ProfileOptions(is_enabled=True, is_memory_traced=profile_memory),
+            is_cprofile_enabled=profile_cprofile,
+        )
+
     if not ParameterValidator(
         db_url, db_schema, csv_source_dir, csv_source_config
     ).are_valid_parameters:
         ctx.abort()
 
-    # TODO: fix error handling, this is not working
-    # load config from toml file
-    try:
-        source_config_file = toml.load(csv_source_config)
-        valid_config = SourceConfig(**source_config_file)
-
-    except ValidationError as e:
-        raise ValueError(f"Validation Failed for source_config.toml\n{e}")
-
-    if not valid_config:
-        ctx.abort()
-
-    ctx.obj["FILE_CONFIG"] = valid_config
+    # parsed once, for every command and scanner of the run
+    ctx.obj["FILE_CONFIG"] = SourceConfig.from_toml(csv_source_config)
 
     app_config = AppConfig(
         db_schema=db_schema,
         csv_source_dir=csv_source_dir,
         csv_source_config=csv_source_config,
         db_url=db_url,
+        db_pool_size=db_pool_size,
+        cache_dir=Path(cache_dir).expanduser(),
+        is_scan_cache_enabled=scan_cache,
+        is_partitioned_by_report_date=partition_by_report_date,
         gcs_project_id=gcs_project_id,
         gcs_bucket=gcs_bucket,
         # bucket_storage_url=bucket_storage_url
     )
 
-    db_manager = PostgresDatabaseManager(app_config)
-
     # if on mac, prevent computer from sleeping (display, system, disk)
+    proc: Optional[subprocess.Popen] = None
     if "darwin" in sys.platform:
         proc = subprocess.Popen(["caffeinate", "-dim"])
 
-    ctx.obj["DB_CONNECTION"] = db_manager
-
-    is_valid_db = check_db_connection(db_manager=db_manager)
-    is_valid_schema = (
-        check_schema(db_manager=db_manager, schema_name=db_schema)
-        if is_valid_db
-        else False
-    )
-
-    if not is_valid_schema:
-        ctx.abort()
-
-    if is_valid_db and is_valid_schema:
-        db_manager.create_log_table()
-
+    # the database and bucket are connected by the commands which use them,
+    # see datawagon.objects.connections
     ctx.obj["CONFIG"] = app_config
     ctx.obj["GLOBAL"] = {}
 
     def on_exit() -> None:
-        if is_valid_db:
-            db_manager.close()
+        if profiler.is_enabled:
+            _write_profile_report(
+                Path(profile_report)
+                if profile_report
+                else Path(cache_dir).expanduser()
+                / "profiles"
+                / f"profile-{datetime.now():%Y%m%d-%H%M%S}.json"
+            )
         if proc:
             proc.send_signal(signal.SIGTERM)
 
@@ -137,6 +197,9 @@ cli.add_command(import_all_csv)
 cli.add_command(import_selected_csv)
 cli.add_command(reset_database)
 cli.add_command(files_in_storage)
+cli.add_command(backfill_file_ledger)
+cli.add_command(add_file_name_indexes)
+cli.add_command(drop_report_date)
 
 
 def start_cli() -> click.Group:
@@ -152,49 +215,14 @@ def start_cli() -> click.Group:
     return cli(obj={})  # type: ignore
 
 
-def check_db_connection(db_manager: PostgresDatabaseManager) -> bool:
-    """Test the connection to the database."""
-
-    if db_manager.is_valid_connection:
-        click.secho("Successfully connected to the database.", fg="green")
-        click.echo(nl=True)
-        return True
-    else:
-        click.secho("Failed to connect to the database.", fg="red")
-        click.echo(nl=True)
-        return False
-
-
-def check_schema(db_manager: PostgresDatabaseManager, schema_name: str) -> bool:
-    """Check if the schema exists and prompt to create if it does not."""
-
-    # This will try to create schema if it does not exist
-    if not ensure_schema_exists(db_manager, schema_name):
-        click.secho(f"Schema '{schema_name}' must exist. Exiting.", fg="red")
-        click.echo(nl=True)
-        return False
+def _write_profile_report(report_path: Path) -> None:
+    try:
+        profiler.report(report_path)
+    except OSError as e:
+        click.secho(f"Unable to write profile report: {e}", fg="red")
+        return
 
-    click.echo(nl=True)
-    click.secho(f"'{schema_name}' is valid schema.", fg="green")
-    click.echo(nl=True)
-    return True
-
-
-def ensure_schema_exists(db_manager: PostgresDatabaseManager, schema_name: str) -> bool:
-    if not db_manager.check_schema():
-        click.secho(f"Schema '{schema_name}' does not exist in the database.", fg="red")
-        if click.confirm("Create the schema?"):
-            db_manager.ensure_schema_exists()
-            if db_manager.check_schema():
-                click.secho(f"Schema '{schema_name}' created.", fg="green")
-                return True
-            else:
-                click.secho("Schema creation failed.", fg="red")
-                return False
-        else:
-            return False
-    else:
-        return True
+    click.secho(f"Profile report written to: {report_path}", fg="blue")
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Optional
 
 from pydantic import BaseModel
 
@@ -10,3 +11,8 @@ class AppConfig(BaseModel):
     csv_source_config: Path
     gcs_project_id: str
     gcs_bucket: str
+    db_pool_size: int = 5
+    cache_dir: Optional[Path] = None
+    is_scan_cache_enabled: bool = True
+    # new tables are partitioned by _report_date_key, with a partition per report date
+    is_partitioned_by_report_date: bool = False
@@ -0,0 +1,103 @@
+from typing import TYPE_CHECKING
+
+import click
+
+from datawagon.objects.app_config import AppConfig
+
+if TYPE_CHECKING:
+    from datawagon.bucket.gcs_manager import GcsManager
+    from datawagon.database.postgres_database_manager import PostgresDatabaseManager
+
+
+def get_db_manager(ctx: click.Context) -> "PostgresDatabaseManager":
+    """The database of the run, connected the first time a command needs it.
+
+    The schema is checked, and the log and ledger tables created, before it
+    is returned. Aborts when the database or the schema is not valid."""
+    if "DB_CONNECTION" in ctx.obj:
+        return ctx.obj["DB_CONNECTION"]
+
+    # imported here, sqlalchemy and pandas are slow to import
+    from datawagon.database.postgres_database_manager import PostgresDatabaseManager
+
+    app_config: AppConfig = ctx.obj["CONFIG"]
+    db_manager = PostgresDatabaseManager(app_config)
+
+    is_valid_db = check_db_connection(db_manager=db_manager)
+    if not is_valid_db:
+        ctx.abort()
+    ctx.find_root().call_on_close(db_manager.close)
+
+    if not check_schema(db_manager=db_manager, schema_name=app_config.db_schema):
+        ctx.abort()
+
+    db_manager.create_log_table()
+    db_manager.create_file_ledger()
+
+    ctx.obj["DB_CONNECTION"] = db_manager
+    return db_manager
+
+
+def get_gcs_manager(ctx: click.Context) -> "GcsManager":
+    """The bucket of the run, with a client created the first time a command
+    needs it"""
+    if "GCS_MANAGER" in ctx.obj:
+        return ctx.obj["GCS_MANAGER"]
+
+    # imported here, the google cloud client is slow to import
+    from datawagon.bucket.gcs_manager import GcsManager
+
+    app_config: AppConfig = ctx.obj["CONFIG"]
+    gcs_manager = GcsManager(
+        app_config.gcs_project_id, app_config.gcs_bucket, app_config.cache_dir
+    )
+
+    ctx.obj["GCS_MANAGER"] = gcs_manager
+    return gcs_manager
+
+
+def check_db_connection(db_manager: "PostgresDatabaseManager") -> bool:
+    """Test the connection to the database."""
+
+    if db_manager.is_valid_connection:
+        click.secho("Successfully connected to the database.", fg="green")
+        click.echo(nl=True)
+        return True
+    else:
+        click.secho("Failed to connect to the database.", fg="red")
+        click.echo(nl=True)
+        return False
+
+
+def check_schema(db_manager: "PostgresDatabaseManager", schema_name: str) -> bool:
+    """Check if the schema exists and prompt to create if it does not."""
+
+    # This will try to create schema if it does not exist
+    if not ensure_schema_exists(db_manager, schema_name):
+        click.secho(f"Schema '{schema_name}' must exist. Exiting.", fg="red")
+        click.echo(nl=True)
+        return False
+
+    click.echo(nl=True)
+    click.secho(f"'{schema_name}' is valid schema.", fg="green")
+    click.echo(nl=True)
+    return True
+
+
+def ensure_schema_exists(
+    db_manager: "PostgresDatabaseManager", schema_name: str
+) -> bool:
+    if not db_manager.check_schema():
+        click.secho(f"Schema '{schema_name}' does not exist in the database.", fg="red")
+        if click.confirm("Create the schema?"):
+            db_manager.ensure_schema_exists()
+            if db_manager.check_schema():
+                click.secho(f"Schema '{schema_name}' created.", fg="green")
+                return True
+            else:
+                click.secho("Schema creation failed.", fg="red")
+                return False
+        else:
+            return False
+    else:
+        return True
@@ -0,0 +1,81 @@
+import csv
+from io import StringIO
+from typing import Any, List, TextIO
+
+
+class CSVCopyStream(object):
+    """Read only file-like object which feeds the records of an open csv file
+    to COPY ... FROM STDIN, appending the same values to the end of every record.
+
+    Records are never parsed. A record only continues on the next line when
+    a line leaves a quoted field open, ie. it contains an odd number of quotes.
+    Blocks without any quotes or blank lines are rewritten in a single replace."""
+
+    BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, csv_file: TextIO, appended_values: List[Any]) -> None:
+        self.csv_file = csv_file
+
+        # quote the appended values the same way the records are quoted
+        values_buffer = StringIO()
+        csv.writer(values_buffer, lineterminator="\n").writerow(appended_values)
+        self.record_suffix = "," + values_buffer.getvalue()
+
+        self._buffer = ""
+        self._is_in_quoted_field = False
+        self._is_exhausted = False
+
+    def read(self, size: int = -1) -> str:
+        while not self._is_exhausted and (size < 0 or len(self._buffer) < size):
+            self._fill_buffer()
+
+        if size < 0 or size >= len(self._buffer):
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+
+        return data
+
+    def _fill_buffer(self) -> None:
+        block = self.csv_file.read(self.BLOCK_SIZE)
+        if not block:
+            self._is_exhausted = True
+            return
+
+        # always end a block on a line boundary
+        if not block.endswith("\n"):
+            block += self.csv_file.readline()
+
+        if (
+            not self._is_in_quoted_field
+            and '"' not in block
+            and "\r" not in block
+            and "\n\n" not in block
+            and not block.startswith("\n")
+        ):
+            if not block.endswith("\n"):
+                block += "\n"
+            self._buffer += block.replace("\n", self.record_suffix)
+        else:
+            self._buffer += "".join(self._rewrite_lines(block))
+
+    def _rewrite_lines(self, block: str) -> List[str]:
+        lines = block.split("\n")
+        if block.endswith("\n"):
+            lines.pop()
+
+        rewritten_lines = []
+        for line in lines:
+            if not self._is_in_quoted_field and not line.strip("\r"):
+                # skip blank lines between records
+                continue
+
+            if line.count('"') % 2 == 1:
+                self._is_in_quoted_field = not self._is_in_quoted_field
+
+            if self._is_in_quoted_field:
+                rewritten_lines.append(line + "\n")
+            else:
+                rewritten_lines.append(line.rstrip("\r") + self.record_suffix)
+
+        return rewritten_lines
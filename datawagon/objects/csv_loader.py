@@ -1,73 +1,221 @@
 import csv
 import gzip
 import zipfile
+from contextlib import ExitStack, contextmanager
 from datetime import datetime, timezone
+from functools import lru_cache
 from io import TextIOWrapper
-from typing import Any, List, Tuple
-
-import pandas as pd
+from itertools import islice
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    TextIO,
+    Tuple,
+)
 
+from datawagon.objects.csv_copy_stream import CSVCopyStream
 from datawagon.objects.managed_file_metadata import ManagedFileMetadata
+from datawagon.objects.profiler import profiler
+from datawagon.objects.source_config import ColumnType
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+ColumnConverter = Callable[["pd.Series"], Any]
+ColumnTypesKey = Optional[Tuple[Tuple[str, ColumnType], ...]]
+
+CSVEngine = Literal["python", "pyarrow"]
+
+
+def _to_datetime(series: "pd.Series") -> Any:
+    import pandas as pd
+
+    try:
+        return pd.to_datetime(series, format="ISO8601")
+    except ValueError:
+        # slower, but parses any format the date parser recognises
+        return series.astype("datetime64[ns]")
+
+
+def _import_pyarrow() -> Any:
+    # pyarrow is optional, only the pyarrow csv engine needs it
+    try:
+        import pyarrow
+        import pyarrow.csv
+    except ImportError:
+        raise ImportError(
+            "The pyarrow csv engine requires pyarrow, install it with: "
+            'pip install "datawagon[arrow]"'
+        )
+
+    return pyarrow
 
 
 class CSVLoader(object):
-    def __init__(self, input_file: ManagedFileMetadata) -> None:
+    # Number of rows held in memory at once when streaming a file in chunks
+    DEFAULT_CHUNK_SIZE = 250_000
+
+    # python parses with the standard library csv module, pyarrow parses
+    # with multiple threads into typed columns
+    CSV_ENGINES: List[CSVEngine] = ["python", "pyarrow"]
+    DEFAULT_CSV_ENGINE: CSVEngine = "python"
+
+    SUPPORTED_EXTENSIONS = [".csv", ".gz", ".zip"]
+
+    # text columns are left as read, without a conversion
+    COLUMN_CONVERTERS: Dict[str, ColumnConverter] = {
+        # floats will be changed to numeric on load (pandas doesn't support the type)
+        "float": lambda series: series.astype("float64"),
+        "int": lambda series: series.astype("int64"),
+        "datetime": _to_datetime,
+    }
+
+    def __init__(
+        self,
+        input_file: ManagedFileMetadata,
+        csv_engine: CSVEngine = DEFAULT_CSV_ENGINE,
+    ) -> None:
         self.input_file = input_file
+        self.csv_engine = csv_engine
+        # every chunk of a file shares a single load date
+        self.file_load_date = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        column_types = input_file.column_types
+        # hashable form of the source column types, to look up compiled converters
+        self.column_types_key: ColumnTypesKey = (
+            tuple(sorted(column_types.items())) if column_types is not None else None
+        )
+
+    def load_data(self) -> "pd.DataFrame":
+        if self.csv_engine == "pyarrow":
+            return self._load_arrow_data()
+
+        with self._open_csv_reader() as (header, csv_reader):
+            with profiler.stage("csv_loader.parse"):
+                data = [row for row in csv_reader]
 
-    def load_data(self) -> pd.DataFrame:
+        return self._create_dataframe(data, header)
+
+    def load_data_chunks(
+        self, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> "Iterator[pd.DataFrame]":
+        """Stream the file as typed DataFrames of at most chunk_size rows.
+        At least one (possibly empty) DataFrame is always yielded so the
+        destination table can be created for files without data rows."""
+        if self.csv_engine == "pyarrow":
+            yield from self._load_arrow_data_chunks(chunk_size)
+            return
+
+        with self._open_csv_reader() as (header, csv_reader):
+            is_empty = True
+            while True:
+                with profiler.stage("csv_loader.parse"):
+                    data = list(islice(csv_reader, chunk_size))
+                # the rows ended with the previous chunk
+                if not data and not is_empty:
+                    break
+                yield self._create_dataframe(data, header)
+                is_empty = False
+                if len(data) < chunk_size:
+                    break
+
+    @contextmanager
+    def open_copy_stream(self) -> Iterator[Tuple[List[str], CSVCopyStream]]:
+        """Open the file as a stream of csv records for COPY ... FROM STDIN,
+        without parsing or type casting any of the data.
+
+        Yields the formatted column names, including the appended columns,
+        in the order they appear in each record of the stream."""
+        with self._open_csv_file() as csv_file:
+            header = self._read_header(csv.reader(csv_file))
+            appended_values = self._appended_values()
+
+            columns = self._format_columns(header) + list(appended_values.keys())
+
+            yield columns, CSVCopyStream(csv_file, list(appended_values.values()))
+
+    @contextmanager
+    def _open_csv_reader(self) -> Iterator[Tuple[List[str], Iterator[List[str]]]]:
+        with self._open_csv_file() as csv_file:
+            csv_reader = csv.reader(csv_file)
+            header = self._read_header(csv_reader)
+
+            yield header, csv_reader
+
+    def _file_extension(self) -> str:
         file_extension = self.input_file.file_path.suffix.lower()
 
-        if file_extension == ".gz":
-            data, header = self._load_gzipped_csv()
-        elif file_extension == ".zip":
-            data, header = self._load_zipped_csv()
-        elif file_extension == ".csv":
-            data, header = self._load_csv()
-        else:
+        if file_extension not in self.SUPPORTED_EXTENSIONS:
             raise ValueError(
                 f"Unsupported file extension: {file_extension}."
                 + "Supported extensions are .csv, .csv.gz and .csv.zip"
             )
 
-        return self._create_dataframe(data, header)
+        return file_extension
 
-    def _load_csv(self) -> Tuple[List[Any], List[str]]:
-        with open(self.input_file.file_path, mode="rt", encoding="utf-8") as csv_file:
-            csv_reader = csv.reader(csv_file)
-            # Some files contain an invalid row above the header row
-            # it can be identified if it contains only one column
+    @contextmanager
+    def _open_csv_file(self) -> Iterator[TextIO]:
+        file_extension = self._file_extension()
+
+        with ExitStack() as stack:
+            if file_extension == ".gz":
+                csv_file = stack.enter_context(self._open_gzipped_csv())
+            elif file_extension == ".zip":
+                csv_file = stack.enter_context(self._open_zipped_csv())
+            else:
+                csv_file = stack.enter_context(self._open_csv())
+
+            yield csv_file
+
+    def _read_header(self, csv_reader: Iterator[List[str]]) -> List[str]:
+        # Some files contain an invalid row above the header row
+        # it can be identified if it contains only one column
+        header = next(csv_reader)
+        if len(header) == 1:
             header = next(csv_reader)
-            if len(header) == 1:
-                header = next(csv_reader)
-            data = [row for row in csv_reader]
 
-        return data, header
+        return header
 
-    def _load_gzipped_csv(self) -> Tuple[List[Any], List[str]]:
-        with gzip.open(
-            self.input_file.file_path, mode="rt", encoding="utf-8"
-        ) as csv_file:
+    def _read_header_rows(self) -> Tuple[List[str], int]:
+        """Read the header, and the number of rows up to and including it"""
+        with self._open_csv_file() as csv_file:
             csv_reader = csv.reader(csv_file)
+            header = self._read_header(csv_reader)
 
-            header = next(csv_reader)
-            if len(header) == 1:
-                header = next(csv_reader)
-            data = [row for row in csv_reader]
+            return header, csv_reader.line_num
 
-            return data, header
+    def _open_csv(self) -> TextIO:
+        if profiler.is_enabled:
+            return TextIOWrapper(
+                profiler.profiled_reader(
+                    open(self.input_file.file_path, mode="rb"), "read_file"
+                ),
+                encoding="utf-8",
+            )
+        return open(self.input_file.file_path, mode="rt", encoding="utf-8")
 
-    def _load_zipped_csv(self) -> Tuple[List[Any], List[str]]:
+    def _open_gzipped_csv(self) -> TextIO:
+        if profiler.is_enabled:
+            return TextIOWrapper(
+                profiler.profiled_reader(
+                    gzip.open(self.input_file.file_path, mode="rb"), "decompress"
+                ),
+                encoding="utf-8",
+            )
+        return gzip.open(self.input_file.file_path, mode="rt", encoding="utf-8")
+
+    @contextmanager
+    def _open_zipped_csv(self) -> Iterator[TextIO]:
         with zipfile.ZipFile(self.input_file.file_path, "r") as zipped_file:
             with zipped_file.open(zipped_file.namelist()[0], "r") as csv_file:
                 # convert bytes to strings
-                csv_reader = csv.reader(TextIOWrapper(csv_file))
-
-                header = next(csv_reader)
-                if len(header) == 1:
-                    header = next(csv_reader)
-                data = [row for row in csv_reader]
-
-        return data, header
+                yield TextIOWrapper(profiler.profiled_reader(csv_file, "decompress"))
 
     def _format_columns(self, columns: List[str]) -> List[str]:
         # Column headers are inconsistent do not make good names in the database,
@@ -85,44 +233,181 @@ class CSVLoader(object):
             for col in columns
         ]
 
-    def _append_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+    def _appended_values(self) -> Dict[str, Any]:
         # These columns are not present in the csv files and will be added to all tables
-        # if isinstance(self.input_file, CsvFileInfo):
-        df["_file_name"] = self.input_file.file_name
+        appended_values: Dict[str, Any] = {"_file_name": self.input_file.file_name}
         if self.input_file.content_owner:
-            df["_content_owner"] = self.input_file.content_owner
+            appended_values["_content_owner"] = self.input_file.content_owner
         if self.input_file.report_date_key:
-            df["_report_date_key"] = self.input_file.report_date_key
+            appended_values["_report_date_key"] = self.input_file.report_date_key
+
+        appended_values["_file_load_date"] = self.file_load_date
+
+        return appended_values
 
-        df["_file_load_date"] = datetime.now(timezone.utc).replace(tzinfo=None)
+    def _append_columns(self, df: "pd.DataFrame") -> "pd.DataFrame":
+        for column_name, value in self._appended_values().items():
+            df[column_name] = value
 
         return df
 
-    def _create_dataframe(self, data: List[Any], header: List[str]) -> pd.DataFrame:
+    def _create_dataframe(self, data: List[Any], header: List[str]) -> "pd.DataFrame":
+        # imported on the first load, pandas is slow to import
+        import pandas as pd
+
         columns = self._format_columns(header)
 
-        df_raw = pd.DataFrame(data, columns=columns)
+        with profiler.stage("csv_loader.dataframe"):
+            df = pd.DataFrame(data, columns=columns)
+
+        with profiler.stage("csv_loader.convert_types"):
+            for column, converter in self._column_converters(
+                tuple(columns), self.column_types_key
+            ):
+                df[column] = converter(df[column])
+
+        # appended columns are created with their final type
+        return self._append_columns(df)
 
-        df_with_appended = self._append_columns(df_raw)
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _column_converters(
+        columns: Tuple[str, ...], column_types_key: ColumnTypesKey
+    ) -> List[Tuple[str, ColumnConverter]]:
+        """Compile the converters for the typed columns of a header once,
+        they are reused for every chunk of every file with the same header."""
+        column_types = CSVLoader._column_types(columns, column_types_key)
 
-        datatype_dict = {}
+        return [
+            (column, CSVLoader.COLUMN_CONVERTERS[column_types[column]])
+            for column in columns
+            if column_types[column] != "text"
+        ]
 
-        # TODO: move column overrides to source_config
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _column_types(
+        columns: Tuple[str, ...], column_types_key: ColumnTypesKey
+    ) -> Dict[str, ColumnType]:
+        """Type of every column of a header. Without column types in the
+        source config, types are guessed from the column names."""
+        if column_types_key is None:
+            return CSVLoader._guess_column_types(columns)
 
+        column_types = dict(column_types_key)
+        return {column: column_types.get(column, "text") for column in columns}
+
+    @staticmethod
+    def _guess_column_types(columns: Tuple[str, ...]) -> Dict[str, ColumnType]:
         float_cols = ["revenue"]
         int_cols = ["view", "day", "date_key", "sec"]
         date_cols = ["date"]
 
-        for col in df_with_appended.columns:
+        column_types: Dict[str, ColumnType] = {}
+        for col in columns:
             if any(name in col for name in float_cols):
-                # floats will be changed to numeric on load (pandas doesn't support the type)
-                datatype_dict[col] = "float64"
+                column_types[col] = "float"
             elif any(name in col for name in int_cols):
-                datatype_dict[col] = "int"
+                column_types[col] = "int"
             elif any(name in col for name in date_cols):
-                datatype_dict[col] = "datetime64[ns]"
+                column_types[col] = "datetime"
             else:
-                datatype_dict[col] = "object"
-        df = df_with_appended.astype(datatype_dict)
+                column_types[col] = "text"
 
-        return df
+        return column_types
+
+    def _load_arrow_data(self) -> "pd.DataFrame":
+        pyarrow = _import_pyarrow()
+
+        with self._open_arrow_input() as csv_input:
+            with profiler.stage("csv_loader.arrow_read"):
+                table = pyarrow.csv.read_csv(csv_input, **self._arrow_csv_options())
+
+        return self._create_arrow_dataframe(table)
+
+    def _load_arrow_data_chunks(self, chunk_size: int) -> "Iterator[pd.DataFrame]":
+        pyarrow = _import_pyarrow()
+
+        with self._open_arrow_input() as csv_input:
+            reader = pyarrow.csv.open_csv(csv_input, **self._arrow_csv_options())
+
+            # batches are sized by bytes read, regroup them into chunks of rows
+            pending = pyarrow.Table.from_batches([], schema=reader.schema)
+            is_empty = True
+            for batch in reader:
+                pending = pyarrow.concat_tables(
+                    [pending, pyarrow.Table.from_batches([batch])]
+                )
+                while pending.num_rows >= chunk_size:
+                    yield self._create_arrow_dataframe(pending.slice(0, chunk_size))
+                    pending = pending.slice(chunk_size)
+                    is_empty = False
+
+            if pending.num_rows > 0 or is_empty:
+                yield self._create_arrow_dataframe(pending)
+
+    @contextmanager
+    def _open_arrow_input(self) -> Iterator[Any]:
+        file_extension = self._file_extension()
+
+        if file_extension == ".zip":
+            with zipfile.ZipFile(self.input_file.file_path, "r") as zipped_file:
+                with zipped_file.open(zipped_file.namelist()[0], "r") as csv_file:
+                    yield csv_file
+        else:
+            # arrow decompresses .gz files itself, by file extension
+            yield str(self.input_file.file_path)
+
+    def _arrow_csv_options(self) -> Dict[str, Any]:
+        pyarrow = _import_pyarrow()
+
+        # the junk row above the header is skipped with the header itself
+        header, header_rows = self._read_header_rows()
+        columns = self._format_columns(header)
+        column_types = self._column_types(tuple(columns), self.column_types_key)
+
+        arrow_types = {
+            "text": pyarrow.string(),
+            "int": pyarrow.int64(),
+            "float": pyarrow.float64(),
+            # arrow only parses ISO 8601, dates are converted like the python engine
+            "datetime": pyarrow.string(),
+        }
+
+        return {
+            "read_options": pyarrow.csv.ReadOptions(
+                column_names=columns, skip_rows=header_rows, use_threads=True
+            ),
+            "convert_options": pyarrow.csv.ConvertOptions(
+                column_types={
+                    column: arrow_types[column_types[column]] for column in columns
+                },
+                # only empty values are missing, text columns are never null
+                null_values=[""],
+                strings_can_be_null=False,
+            ),
+        }
+
+    def _create_arrow_dataframe(self, table: Any) -> "pd.DataFrame":
+        pyarrow = _import_pyarrow()
+
+        number_types = {pyarrow.int64(): "int", pyarrow.float64(): "float"}
+        for field in table.schema:
+            # the python engine does not load empty numbers, and pandas would
+            # convert an int column with missing values to float
+            if field.type in number_types and table.column(field.name).null_count:
+                raise ValueError(
+                    f"Missing values in {number_types[field.type]} column: {field.name}"
+                )
+
+        with profiler.stage("csv_loader.dataframe"):
+            df = table.to_pandas()
+
+        column_types = self._column_types(tuple(df.columns), self.column_types_key)
+        with profiler.stage("csv_loader.convert_types"):
+            for column, column_type in column_types.items():
+                if column_type == "datetime":
+                    df[column] = _to_datetime(df[column])
+
+        # appended columns are created with their final type
+        return self._append_columns(df)
@@ -1,14 +1,18 @@
-import gzip
+import base64
+import io
 import os
-import shutil
 import zipfile
 from pathlib import Path
-from typing import Dict, List
+from typing import IO, Dict, Iterator, List, Optional
 
 from datawagon.objects.managed_file_metadata import ManagedFileMetadata
+from datawagon.objects.parallel_gzip_writer import ParallelGzipWriter
 
 
 class FileUtils(object):
+    # gzip's own default, lower levels compress faster into larger files
+    DEFAULT_COMPRESSION_LEVEL = 9
+
     def group_by_base_name(
         self,
         file_info_list: List[ManagedFileMetadata],
@@ -47,18 +51,23 @@ class FileUtils(object):
         return different_file_versions
 
     def csv_gzipped(
-        self, input_csv_file: Path, remove_original_zip: bool = False
+        self,
+        input_csv_file: Path,
+        remove_original_zip: bool = False,
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+        threads: Optional[int] = None,
     ) -> Path:
         is_successful = False
         output_gzip_path = f"{input_csv_file}.gz"
 
         with open(input_csv_file, "rb") as f_in:
-            with gzip.open(output_gzip_path, "wb") as f_out:
-                try:
-                    shutil.copyfileobj(f_in, f_out)
-                    is_successful = True
-                except Exception as e:
-                    print("Failed to gzip file: ", e)
+            try:
+                self._write_gzip(
+                    f_in, Path(output_gzip_path), compression_level, threads
+                )
+                is_successful = True
+            except Exception as e:
+                print("Failed to gzip file: ", e)
 
         if remove_original_zip and is_successful:
             os.remove(input_csv_file)
@@ -66,10 +75,18 @@ class FileUtils(object):
         return Path(output_gzip_path)
 
     def csv_zip_to_gzip(
-        self, input_zip_path: Path, remove_original_zip: bool = False
+        self,
+        input_zip_path: Path,
+        remove_original_zip: bool = False,
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+        threads: Optional[int] = None,
     ) -> Path:
         """Convert a ZIP file containing CSV files to a GZIP file containing GZIP compressed CSV files
-        Remove any directory structure from the ZIP file"""
+        Remove any directory structure from the ZIP file
+
+        Each file is written to a temporary file and renamed when complete,
+        so an interrupted conversion never leaves a partial .gz file, and
+        the zip is only removed once every .gz file is in place."""
         current_dir = os.path.dirname(input_zip_path)
         output_gzip_path = Path()
         is_successful = False
@@ -80,14 +97,102 @@ class FileUtils(object):
                     output_gzip_path = Path(f"{current_dir}/{filename}.gz")
                     with input_zip.open(file_info.filename) as input_file:
                         if file_info.filename.lower().endswith(".csv"):
-                            with gzip.open(output_gzip_path, "wb") as gzip_file:
-                                for chunk in iter(
-                                    lambda: input_file.read(1024 * 1024), b""
-                                ):  # 1MB chunks
-                                    gzip_file.write(chunk)
-                                is_successful = True
+                            self._write_gzip(
+                                input_file,
+                                output_gzip_path,
+                                compression_level,
+                                threads,
+                            )
+                            is_successful = True
 
         if remove_original_zip and is_successful:
             os.remove(input_zip_path)
 
         return Path(output_gzip_path)
+
+    def zip_csv_size(self, input_zip_path: Path) -> int:
+        """Uncompressed size of the CSV files in a ZIP file"""
+        with zipfile.ZipFile(input_zip_path, "r") as input_zip:
+            return sum(
+                file_info.file_size
+                for file_info in input_zip.infolist()
+                if "__MACOSX" not in file_info.filename
+                and file_info.filename.lower().endswith(".csv")
+            )
+
+    def zip_csv_gzip_blocks(
+        self,
+        input_zip_path: Path,
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+        threads: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """Gzip compressed bytes of the CSV file in a ZIP file, in order,
+        without writing a gzip file. The bytes are the same on every call
+        with the same compression level, see ParallelGzipWriter."""
+        with zipfile.ZipFile(input_zip_path, "r") as input_zip:
+            csv_file_infos = [
+                file_info
+                for file_info in input_zip.infolist()
+                if "__MACOSX" not in file_info.filename
+                and file_info.filename.lower().endswith(".csv")
+            ]
+            if len(csv_file_infos) != 1:
+                raise ValueError(
+                    f"Expected one CSV file in {input_zip_path}, found {len(csv_file_infos)}"
+                )
+
+            output = io.BytesIO()
+            with input_zip.open(csv_file_infos[0]) as input_file:
+                with ParallelGzipWriter(
+                    output, compression_level, threads
+                ) as gzip_file:
+                    for chunk in iter(lambda: input_file.read(1024 * 1024), b""):
+                        gzip_file.write(chunk)
+                        if output.tell():
+                            yield output.getvalue()
+                            output.seek(0)
+                            output.truncate()
+
+            yield output.getvalue()
+
+    def gzip_file_name(self, file_name: str) -> str:
+        """Name of the gzip file a CSV ZIP file converts to"""
+        if file_name.lower().endswith(".zip"):
+            return file_name[: -len(".zip")] + ".gz"
+        return file_name
+
+    def _write_gzip(
+        self,
+        input_file: IO[bytes],
+        output_gzip_path: Path,
+        compression_level: int,
+        threads: Optional[int] = None,
+    ) -> None:
+        """Compress blocks of the file on multiple threads, see ParallelGzipWriter"""
+        temp_gzip_path = output_gzip_path.with_name(f"{output_gzip_path.name}.tmp")
+        try:
+            with open(temp_gzip_path, "wb") as output_file:
+                with ParallelGzipWriter(
+                    output_file, compression_level, threads
+                ) as gzip_file:
+                    for chunk in iter(
+                        lambda: input_file.read(1024 * 1024), b""
+                    ):  # 1MB chunks
+                        gzip_file.write(chunk)
+
+            os.replace(temp_gzip_path, output_gzip_path)
+        except BaseException:
+            temp_gzip_path.unlink(missing_ok=True)
+            raise
+
+    def file_crc32c(self, file_path: Path) -> str:
+        """CRC32C of a file, base64 encoded as cloud storage reports it"""
+        # imported here, it is slow to import and only uploads need it
+        import google_crc32c
+
+        checksum = google_crc32c.Checksum()
+        with open(file_path, "rb") as input_file:
+            for chunk in iter(lambda: input_file.read(1024 * 1024), b""):
+                checksum.update(chunk)
+
+        return base64.b64encode(checksum.digest()).decode("utf-8")
@@ -2,10 +2,12 @@ import calendar
 import re
 from datetime import date
 from pathlib import Path
-from typing import Literal, Optional
+from typing import Dict, Literal, Optional
 
 from pydantic import BaseModel
 
+from datawagon.objects.source_config import ColumnType
+
 
 class ManagedFileInput(BaseModel):
     # TODO: merge with SourceFileMetadata
@@ -15,6 +17,7 @@ class ManagedFileInput(BaseModel):
     table_name: str
     table_append_or_replace: Literal["append", "replace"]
     storage_folder_name: str
+    column_types: Optional[Dict[str, ColumnType]] = None
 
     # allows for additional fields defined at runtime by regex_group_names
     class Config:
@@ -37,10 +40,13 @@ class ManagedFileMetadata(ManagedFileInput):
         extra = "allow"
 
     @classmethod
-    def build_data_item(cls, source_file: ManagedFileInput) -> "ManagedFileMetadata":
+    def build_data_item(
+        cls, source_file: ManagedFileInput, file_size_in_bytes: Optional[int] = None
+    ) -> "ManagedFileMetadata":
         file_path = source_file.file_path
 
-        file_size_in_bytes = file_path.stat().st_size
+        if file_size_in_bytes is None:
+            file_size_in_bytes = file_path.stat().st_size
         file_size = cls.human_readable_size(file_size_in_bytes)
 
         file_dir = str(file_path.parent)
@@ -98,6 +104,7 @@ class ManagedFileMetadata(ManagedFileInput):
             content_owner=content_owner,
             storage_folder_name=source_file.storage_folder_name
             or source_file.base_name,
+            column_types=source_file.column_types,
         )
 
         return data_item
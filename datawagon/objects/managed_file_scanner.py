@@ -2,15 +2,16 @@ import fnmatch
 import os
 import re
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
-import toml
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, Field
 
 from datawagon.objects.managed_file_metadata import (
     ManagedFileInput,
     ManagedFileMetadata,
 )
+from datawagon.objects.profiler import profiler
+from datawagon.objects.scan_manifest import FileStat, ScanManifest, walk_files
 from datawagon.objects.source_config import SourceConfig, SourceFromLocalFS
 
 
@@ -24,59 +25,86 @@ class ManagedFilesToDatabase(ManagedFiles):
     table_append_or_replace: str
 
 
-class ManagedFileScanner(object):
-    def __init__(self, csv_source_config: Path, csv_source_dir: Path) -> None:
-        self.csv_source_dir = csv_source_dir
+class SourceFileMatcher(object):
+    """Match file names against the select and exclude patterns of all
+    sources at once. Patterns are compiled once, and a single combined pattern
+    rejects files which match no source without checking each source."""
 
-        try:
-            source_config_file = toml.load(csv_source_config)
-            self.valid_config = SourceConfig(**source_config_file)
+    def __init__(
+        self,
+        file_sources: Dict[str, SourceFromLocalFS],
+        file_extension: Optional[str] = None,
+    ) -> None:
+        self.source_patterns: List[Tuple[str, re.Pattern, Optional[re.Pattern]]] = []
+
+        for file_id, file_source in file_sources.items():
+            select_pattern = f"*{file_source.select_file_name_base.lower()}*"
+            if file_extension is not None:
+                select_pattern += file_extension
+
+            exclude_pattern = None
+            if file_source.exclude_file_name_base is not None:
+                exclude_pattern = re.compile(
+                    fnmatch.translate(f"*{file_source.exclude_file_name_base.lower()}*")
+                )
 
-        except ValidationError as e:
-            raise ValueError(f"Validation Failed for source_config.toml\n{e}")
+            self.source_patterns.append(
+                (
+                    file_id,
+                    re.compile(fnmatch.translate(select_pattern)),
+                    exclude_pattern,
+                )
+            )
 
-    def scan_for_csv_files_with_name(
-        self,
-        source_path: Path,
-        glob_pat: str,
-        exclude_pattern: str | None,
-        file_extension: str | None = None,
-    ) -> List[Path]:
-        all_csv_files = self.find_files(
-            source_path, glob_pat, exclude_pattern, file_extension
+        self.any_source_pattern = re.compile(
+            "|".join(pattern.pattern for _, pattern, _ in self.source_patterns)
+            or "(?!)"
         )
 
-        file_names = [str(file) for file in all_csv_files]
+    def matched_sources(self, file_name: str) -> List[str]:
+        """Ids of the sources which select the file"""
+        # skip lock files of open spreadsheets
+        if file_name.startswith(".~lock"):
+            return []
+
+        file_name = file_name.lower()
+        if not self.any_source_pattern.match(file_name):
+            return []
+
+        return [
+            file_id
+            for file_id, select_pattern, exclude_pattern in self.source_patterns
+            if select_pattern.match(file_name)
+            and not (exclude_pattern and exclude_pattern.match(file_name))
+        ]
 
-        return [Path(file) for file in file_names]
 
-    def find_files(
+class ManagedFileScanner(object):
+    def __init__(
         self,
-        base_path: Path,
-        match_pattern: str,
-        exclude_pattern: str | None,
-        file_extension: str | None = None,
-    ) -> List[Path]:
-        matches = []
-
-        if file_extension is not None:
-            match_pattern = f"*{match_pattern.lower()}*{file_extension}"
-        else:
-            match_pattern = f"*{match_pattern.lower()}*"
-
-        if exclude_pattern is not None:
-            exclude_pattern = exclude_pattern.lower()
-
-        for root, dirnames, filenames in os.walk(base_path):
-            for filename in filenames:
-                if fnmatch.fnmatch(filename.lower(), match_pattern):
-                    if not fnmatch.fnmatch(filename.lower(), f"*{exclude_pattern}*"):
-                        if not filename.startswith(".~lock"):
-                            matches.append(
-                                os.path.abspath(os.path.join(root, filename))
-                            )
-
-        return [Path(match) for match in matches]
+        valid_config: SourceConfig,
+        csv_source_dir: Path,
+        cache_dir: Optional[Path] = None,
+    ) -> None:
+        """With a cache_dir, the results of the previous scan of csv_source_dir
+        are reused for unchanged directories and files."""
+        self.csv_source_dir = csv_source_dir
+        self.valid_config = valid_config
+
+        self.manifest: Optional[ScanManifest] = None
+        if cache_dir is not None:
+            self.manifest = ScanManifest.in_cache_dir(
+                cache_dir, csv_source_dir, self.valid_config.model_dump_json()
+            )
+
+        self._manifest_files: Optional[Dict[str, FileStat]] = None
+
+    def _list_source_files(self) -> Dict[str, FileStat]:
+        """Absolute path, size and mtime of every file in the source directory"""
+        if self.manifest is not None:
+            return self.manifest.list_files()
+
+        return walk_files(str(self.csv_source_dir))
 
     def source_file_attrs(
         self,
@@ -95,6 +123,7 @@ class ManagedFileScanner(object):
             "table_name": file_source.table_name,
             "table_append_or_replace": table_append_or_replace,
             "storage_folder_name": file_source.storage_folder_name,
+            "column_types": file_source.column_types,
         }
 
         if file_source.regex_pattern and file_source.regex_group_names:
@@ -119,44 +148,74 @@ class ManagedFileScanner(object):
         return ManagedFileInput(**file_dict)
 
     def matched_files(
-        self, file_extension: str | None = None
+        self, file_extension: Optional[str] = None
     ) -> List[ManagedFilesToDatabase]:
-        all_available_files: List[ManagedFilesToDatabase] = []
+        enabled_sources = {
+            file_id: file_source
+            for file_id, file_source in self.valid_config.file.items()
+            if file_source.is_enabled
+        }
 
-        valid_config = self.valid_config
+        table_mappers = {
+            file_id: ManagedFilesToDatabase(
+                table_name=file_source.table_name or file_source.select_file_name_base,
+                table_append_or_replace=file_source.table_append_or_replace,
+                file_selector_base_name=file_source.select_file_name_base,
+            )
+            for file_id, file_source in enabled_sources.items()
+        }
 
-        for file_id in valid_config.file:
-            file_source = valid_config.file[file_id]
-            if file_source.is_enabled:
-                file_list = self.scan_for_csv_files_with_name(
-                    self.csv_source_dir,
-                    file_source.select_file_name_base,
-                    file_source.exclude_file_name_base,
-                    file_extension,
-                )
+        # the source directory is walked once for all sources
+        matcher = SourceFileMatcher(enabled_sources, file_extension)
+        with profiler.stage("scanner.list_files"):
+            source_files = self._list_source_files()
 
-                table_mapper = ManagedFilesToDatabase(
-                    table_name=file_source.table_name
-                    or file_source.select_file_name_base,
-                    table_append_or_replace=file_source.table_append_or_replace,
-                    file_selector_base_name=file_source.select_file_name_base,
+        with profiler.stage("scanner.match"):
+            for file_path, (file_size, _) in source_files.items():
+                for file_id in matcher.matched_sources(os.path.basename(file_path)):
+                    source_file_info = self._file_metadata(
+                        file_id, file_path, file_size, enabled_sources[file_id]
+                    )
+                    table_mappers[file_id].files.append(source_file_info)
+
+        if self.manifest is not None:
+            with profiler.stage("scanner.save_manifest"):
+                self.manifest.save()
+
+        return list(table_mappers.values())
+
+    def _file_metadata(
+        self,
+        source_id: str,
+        file_path: str,
+        file_size: int,
+        file_source: SourceFromLocalFS,
+    ) -> ManagedFileMetadata:
+        if self.manifest is not None:
+            cached_metadata = self.manifest.cached_metadata(file_path, source_id)
+            if cached_metadata is not None:
+                # built from the same file name and config, skip validation
+                return ManagedFileMetadata.model_construct(
+                    **{**cached_metadata, "file_path": Path(file_path)}
                 )
 
-                for file_path in file_list:
-                    source_file = self.source_file_attrs(file_path, file_source)
-                    source_file_info = ManagedFileMetadata.build_data_item(source_file)
-                    table_mapper.files.append(source_file_info)
+        source_file = self.source_file_attrs(Path(file_path), file_source)
+        # the size comes from the directory listing, the file is not stat-ed again
+        source_file_info = ManagedFileMetadata.build_data_item(source_file, file_size)
 
-                all_available_files.append(table_mapper)
+        if self.manifest is not None:
+            self.manifest.store_metadata(
+                file_path, source_id, source_file_info.model_dump(mode="json")
+            )
 
-        return all_available_files
+        return source_file_info
 
     def matched_file(
         self,
         source_file_path: Path,
         input_file_base_name: str,
         is_replace_override: bool,
-    ) -> ManagedFilesToDatabase | None:
+    ) -> Optional[ManagedFilesToDatabase]:
         valid_config = self.valid_config
 
         for file_id in valid_config.file:
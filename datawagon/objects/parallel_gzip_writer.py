@@ -0,0 +1,78 @@
+import gzip
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import TracebackType
+from typing import BinaryIO, Deque, Optional, Type
+
+
+class ParallelGzipWriter(object):
+    """Write a gzip file with blocks compressed in a thread pool, like pigz.
+
+    Each block is compressed into a gzip member of its own, and the members
+    are written in order. A gzip file may hold any number of members, which
+    are read back as one stream by gzip, zcat, pyarrow and BigQuery.
+    zlib releases the GIL while compressing, so the blocks are compressed
+    on every core at the same time."""
+
+    # large enough that splitting the deflate stream costs very little in size
+    BLOCK_SIZE = 4 * 1024 * 1024
+
+    def __init__(
+        self,
+        output_file: BinaryIO,
+        compression_level: int = 9,
+        threads: Optional[int] = None,
+    ) -> None:
+        self.output_file = output_file
+        self.compression_level = compression_level
+        self.threads = threads or os.cpu_count() or 1
+
+        self._executor = ThreadPoolExecutor(max_workers=self.threads)
+        self._pending: Deque[Future[bytes]] = deque()
+        self._buffer = bytearray()
+        self._member_count = 0
+
+    def __enter__(self) -> "ParallelGzipWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self.BLOCK_SIZE:
+            block = bytes(self._buffer[: self.BLOCK_SIZE])
+            del self._buffer[: self.BLOCK_SIZE]
+            self._compress(block)
+
+        return len(data)
+
+    def close(self) -> None:
+        # an empty file is still written as one (empty) member
+        if self._buffer or self._member_count == 0:
+            self._compress(bytes(self._buffer))
+            self._buffer.clear()
+
+        while self._pending:
+            self.output_file.write(self._pending.popleft().result())
+
+        self._executor.shutdown()
+
+    def _compress(self, block: bytes) -> None:
+        self._pending.append(
+            self._executor.submit(gzip.compress, block, self.compression_level, mtime=0)
+        )
+        self._member_count += 1
+
+        # keep every thread busy, but hold at most two blocks per thread
+        while len(self._pending) > 2 * self.threads:
+            self.output_file.write(self._pending.popleft().result())
@@ -0,0 +1,297 @@
+import cProfile
+import io
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+
+class StageStats(BaseModel):
+    calls: int = 0
+    wall_seconds: float = 0
+    # cpu time of the thread running the stage
+    cpu_seconds: float = 0
+    bytes: int = 0
+    # peak traced memory while the stage ran, only with memory tracing
+    peak_memory_bytes: Optional[int] = None
+
+    def merge(self, other: "StageStats") -> None:
+        self.calls += other.calls
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        self.bytes += other.bytes
+        if other.peak_memory_bytes is not None:
+            self.peak_memory_bytes = max(
+                self.peak_memory_bytes or 0, other.peak_memory_bytes
+            )
+
+
+class ProfileRecords(BaseModel):
+    """Stats by stage, and by file and stage, of one process.
+
+    A stage is keyed by its path, the names of the stages it runs in and
+    its own name joined by "/", and its times include the stages in it."""
+
+    stages: Dict[str, StageStats] = {}
+    files: Dict[str, Dict[str, StageStats]] = {}
+
+    def merge(self, other: "ProfileRecords") -> None:
+        for path, stats in other.stages.items():
+            self.stages.setdefault(path, StageStats()).merge(stats)
+        for file_name, file_stages in other.files.items():
+            for path, stats in file_stages.items():
+                self.files.setdefault(file_name, {}).setdefault(
+                    path, StageStats()
+                ).merge(stats)
+
+
+class ProfileOptions(BaseModel):
+    """Passed to worker processes, so they profile the same way"""
+
+    is_enabled: bool = False
+    is_memory_traced: bool = False
+
+
+class ProfileReport(ProfileRecords):
+    command: List[str]
+    started_at: datetime
+    wall_seconds: float
+    cpu_seconds: float
+    # worker processes which have exited
+    worker_cpu_seconds: float
+    peak_rss_bytes: int
+    cprofile_path: Optional[str] = None
+    top_allocations: List[str] = []
+
+
+class Stage(object):
+    """Bytes processed by a running stage, known as it runs"""
+
+    def __init__(self) -> None:
+        self.bytes = 0
+
+
+class _RunningStage(Stage):
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+        self.peak_memory_bytes = 0
+
+
+class Profiler(object):
+    """Wall time, cpu time, bytes and peak memory of named stages.
+
+    Disabled, a stage costs one attribute check. Stages may run in any
+    thread, each thread has its own stack of stages and current file."""
+
+    # allocations listed in the report with memory tracing
+    TOP_ALLOCATIONS = 25
+
+    def __init__(self) -> None:
+        self.options = ProfileOptions()
+        self.records = ProfileRecords()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_at = datetime.now()
+        self._start_time = time.perf_counter()
+        self._cprofile: Optional[cProfile.Profile] = None
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.options.is_enabled
+
+    def start(self, options: ProfileOptions, is_cprofile_enabled: bool = False) -> None:
+        self.options = options
+        self._started_at = datetime.now()
+        self._start_time = time.perf_counter()
+
+        if options.is_memory_traced and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if is_cprofile_enabled:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Stage]:
+        if not self.options.is_enabled:
+            yield Stage()
+            return
+
+        stack = self._stack()
+        stage = _RunningStage(f"{stack[-1].path}/{name}" if stack else name)
+
+        if self.options.is_memory_traced:
+            self._fold_traced_peak(stack)
+            tracemalloc.reset_peak()
+
+        stack.append(stage)
+        start_time = time.perf_counter()
+        start_cpu_time = time.thread_time()
+        try:
+            yield stage
+        finally:
+            stats = StageStats(
+                calls=1,
+                wall_seconds=time.perf_counter() - start_time,
+                cpu_seconds=time.thread_time() - start_cpu_time,
+                bytes=stage.bytes,
+            )
+            stack.pop()
+
+            if self.options.is_memory_traced:
+                # the enclosing stages keep measuring from the same peak
+                self._fold_traced_peak([stage])
+                stats.peak_memory_bytes = stage.peak_memory_bytes
+
+            self._record(stage.path, stats)
+
+    @contextmanager
+    def file(self, file_name: str) -> Iterator[None]:
+        """Stages run in the block are also recorded for the file"""
+        previous_file_name = getattr(self._local, "file_name", None)
+        self._local.file_name = file_name
+        try:
+            yield
+        finally:
+            self._local.file_name = previous_file_name
+
+    def profiled_reader(self, raw_file: Any, name: str) -> Any:
+        """Read a binary file in a stage of its own, to tell the time spent
+        reading and decompressing it from the time spent parsing it"""
+        if not self.options.is_enabled:
+            return raw_file
+        return io.BufferedReader(_ProfiledReader(self, raw_file, name))
+
+    def count_bytes(self, stream: Any, stage: Stage) -> Any:
+        """Add the bytes read from a file-like stream to the stage"""
+        if not self.options.is_enabled:
+            return stream
+        return _CountingReader(stream, stage)
+
+    def take_records(self) -> ProfileRecords:
+        """Records since the last call, for a worker process to return"""
+        with self._lock:
+            records, self.records = self.records, ProfileRecords()
+        return records
+
+    def merge(self, records: Optional[ProfileRecords]) -> None:
+        """Add the records of a worker process"""
+        if records is not None:
+            with self._lock:
+                self.records.merge(records)
+
+    def report(self, report_path: Path) -> ProfileReport:
+        """Stop profiling and write the report, with cProfile stats next to it"""
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+
+        cprofile_path = None
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            cprofile_path = report_path.with_suffix(".prof")
+            self._cprofile.dump_stats(cprofile_path)
+
+        top_allocations = []
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            top_allocations = [
+                str(statistic)
+                for statistic in snapshot.statistics("lineno")[: self.TOP_ALLOCATIONS]
+            ]
+
+        peak_rss_bytes, worker_cpu_seconds = _process_usage()
+
+        with self._lock:
+            report = ProfileReport(
+                command=sys.argv,
+                started_at=self._started_at,
+                wall_seconds=time.perf_counter() - self._start_time,
+                cpu_seconds=time.process_time(),
+                worker_cpu_seconds=worker_cpu_seconds,
+                peak_rss_bytes=peak_rss_bytes,
+                cprofile_path=str(cprofile_path) if cprofile_path else None,
+                top_allocations=top_allocations,
+                stages=self.records.stages,
+                files=self.records.files,
+            )
+
+        report_path.write_text(report.model_dump_json(indent=2))
+        return report
+
+    def _stack(self) -> List[_RunningStage]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _fold_traced_peak(self, stages: List[_RunningStage]) -> None:
+        _, peak = tracemalloc.get_traced_memory()
+        for stage in stages:
+            stage.peak_memory_bytes = max(stage.peak_memory_bytes, peak)
+
+    def _record(self, path: str, stats: StageStats) -> None:
+        file_name = getattr(self._local, "file_name", None)
+        with self._lock:
+            self.records.stages.setdefault(path, StageStats()).merge(stats)
+            if file_name is not None:
+                self.records.files.setdefault(file_name, {}).setdefault(
+                    path, StageStats()
+                ).merge(stats)
+
+
+def _process_usage() -> Tuple[int, float]:
+    """Peak memory in bytes of the process or its workers, and the cpu time
+    of the workers. Both are 0 on windows, which has no resource module."""
+    try:
+        import resource
+    except ImportError:
+        return 0, 0.0
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    peak_rss = max(self_usage.ru_maxrss, children_usage.ru_maxrss)
+    # kilobytes on linux, bytes on macos
+    peak_rss_bytes = peak_rss if sys.platform == "darwin" else peak_rss * 1024
+    return peak_rss_bytes, children_usage.ru_utime + children_usage.ru_stime
+
+
+class _CountingReader(object):
+    def __init__(self, stream: Any, stage: Stage) -> None:
+        self.stream = stream
+        self.stage = stage
+
+    def read(self, size: int = -1) -> Any:
+        data = self.stream.read(size)
+        self.stage.bytes += len(data)
+        return data
+
+
+class _ProfiledReader(io.RawIOBase):
+    def __init__(self, profiler: Profiler, raw_file: Any, name: str) -> None:
+        self.profiler = profiler
+        self.raw_file = raw_file
+        self.name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        with self.profiler.stage(self.name) as stage:
+            data = self.raw_file.read(len(buffer))
+            stage.bytes += len(data)
+
+        size = len(data)
+        buffer[:size] = data
+        return size
+
+    def close(self) -> None:
+        self.raw_file.close()
+        super().close()
+
+
+# stages of every module are recorded by this profiler, started by --profile
+profiler = Profiler()
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# size in bytes and modification time in nanoseconds of a file
+FileStat = Tuple[int, int]
+
+
+def list_directory(dir_path: str) -> Tuple[Dict[str, List[int]], List[str]]:
+    """Size and mtime of the files in a directory, and its subdirectories.
+    The stat results come with the directory entries, so files are not opened."""
+    files: Dict[str, List[int]] = {}
+    dirs: List[str] = []
+
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            try:
+                # like os.walk, symlinked directories are not followed
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = [stat.st_size, stat.st_mtime_ns]
+            except OSError:
+                continue
+
+    return files, dirs
+
+
+def walk_files(base_path: str) -> Dict[str, FileStat]:
+    """Absolute path, size and mtime of every file below base_path, top down"""
+    walked_files: Dict[str, FileStat] = {}
+
+    pending = [os.path.abspath(base_path)]
+    while pending:
+        dir_path = pending.pop()
+        try:
+            files, dirs = list_directory(dir_path)
+        except OSError:
+            continue
+
+        for file_name, (size, mtime_ns) in files.items():
+            walked_files[os.path.join(dir_path, file_name)] = (size, mtime_ns)
+
+        pending.extend(os.path.join(dir_path, dir_name) for dir_name in reversed(dirs))
+
+    return walked_files
+
+
+class ScanManifest(object):
+    """On disk record of the last scan of a source directory.
+
+    A directory whose mtime has not changed still contains the same files and
+    subdirectories, so its listing is reused without reading the directory or
+    stat-ing its files. Subdirectories are still checked, as their changes do
+    not change the mtime of the parent.
+
+    The metadata built for each file is kept with the size and mtime of the
+    file, and reused until either changes or the source config changes."""
+
+    VERSION = 1
+
+    # A directory changed this close to the scan which listed it may have
+    # changed again within the same mtime tick, list it again next time.
+    MTIME_GRANULARITY_NS = 2_000_000_000
+
+    def __init__(self, manifest_path: Path, source_dir: Path, config_key: str) -> None:
+        self.manifest_path = manifest_path
+        self.source_dir = os.path.abspath(source_dir)
+        self.config_key = config_key
+
+        self.directories: Dict[str, Dict[str, Any]] = {}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.listed_files: Dict[str, FileStat] = {}
+
+        self._is_modified = False
+        self._load()
+
+    @classmethod
+    def in_cache_dir(
+        cls, cache_dir: Path, source_dir: Path, source_config: str
+    ) -> "ScanManifest":
+        source_key = hashlib.sha1(os.path.abspath(source_dir).encode()).hexdigest()
+        config_key = hashlib.sha1(source_config.encode()).hexdigest()
+
+        return cls(
+            cache_dir / f"scan_manifest_{source_key[:16]}.json", source_dir, config_key
+        )
+
+    def _load(self) -> None:
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return
+
+        if (
+            manifest.get("version") != self.VERSION
+            or manifest.get("source_dir") != self.source_dir
+        ):
+            return
+
+        self.directories = manifest["directories"]
+        # file metadata depends on the source config it was built with
+        if manifest.get("config_key") == self.config_key:
+            self.files = manifest["files"]
+
+    def list_files(self) -> Dict[str, FileStat]:
+        """Absolute path, size and mtime of every file below the source directory"""
+        scan_time_ns = time.time_ns()
+
+        directories: Dict[str, Dict[str, Any]] = {}
+        listed_files: Dict[str, FileStat] = {}
+
+        pending = [self.source_dir]
+        while pending:
+            dir_path = pending.pop()
+            try:
+                dir_mtime_ns = os.stat(dir_path).st_mtime_ns
+
+                listing = self.directories.get(dir_path)
+                if (
+                    listing is None
+                    or listing["mtime_ns"] != dir_mtime_ns
+                    or listing["scanned_at_ns"] - dir_mtime_ns
+                    < self.MTIME_GRANULARITY_NS
+                ):
+                    listing = self._list_directory(dir_path, dir_mtime_ns, scan_time_ns)
+                    self._is_modified = True
+            except OSError:
+                continue
+
+            directories[dir_path] = listing
+            for file_name, (size, mtime_ns) in listing["files"].items():
+                listed_files[os.path.join(dir_path, file_name)] = (size, mtime_ns)
+
+            # top down, in the order of the listing
+            pending.extend(
+                os.path.join(dir_path, dir_name)
+                for dir_name in reversed(listing["dirs"])
+            )
+
+        if directories.keys() != self.directories.keys():
+            self._is_modified = True
+
+        self.directories = directories
+        self.listed_files = listed_files
+
+        return listed_files
+
+    def _list_directory(
+        self, dir_path: str, dir_mtime_ns: int, scan_time_ns: int
+    ) -> Dict[str, Any]:
+        files, dirs = list_directory(dir_path)
+
+        return {
+            "mtime_ns": dir_mtime_ns,
+            "scanned_at_ns": scan_time_ns,
+            "files": files,
+            "dirs": dirs,
+        }
+
+    def cached_metadata(self, file_path: str, source_id: str) -> Optional[Dict]:
+        file_stat = self.listed_files.get(file_path)
+        entry = self.files.get(file_path)
+
+        if (
+            file_stat is None
+            or entry is None
+            or entry["source_id"] != source_id
+            or (entry["size"], entry["mtime_ns"]) != file_stat
+        ):
+            return None
+
+        return entry["metadata"]
+
+    def store_metadata(self, file_path: str, source_id: str, metadata: Dict) -> None:
+        file_stat = self.listed_files.get(file_path)
+        if file_stat is None:
+            return
+
+        self.files[file_path] = {
+            "size": file_stat[0],
+            "mtime_ns": file_stat[1],
+            "source_id": source_id,
+            "metadata": metadata,
+        }
+        self._is_modified = True
+
+    def save(self) -> None:
+        # files which are no longer in the source directory are dropped
+        files = {
+            file_path: entry
+            for file_path, entry in self.files.items()
+            if file_path in self.listed_files
+        }
+
+        if not self._is_modified and len(files) == len(self.files):
+            return
+
+        manifest = {
+            "version": self.VERSION,
+            "source_dir": self.source_dir,
+            "config_key": self.config_key,
+            "directories": self.directories,
+            "files": files,
+        }
+
+        try:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+
+            # replace the manifest in one step, so it is never partly written
+            temp_path = self.manifest_path.with_suffix(".tmp")
+            temp_path.write_text(json.dumps(manifest))
+            os.replace(temp_path, self.manifest_path)
+        except OSError as e:
+            # the manifest is only a cache, the next scan will start over
+            print(f"Unable to save scan manifest: {e}")
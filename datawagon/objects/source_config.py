@@ -1,7 +1,12 @@
 import re
+from pathlib import Path
 from typing import List, Literal, Optional
 
-from pydantic import BaseModel
+import toml
+from pydantic import BaseModel, ValidationError
+
+# types a csv column can be loaded as, see CSVLoader.COLUMN_CONVERTERS
+ColumnType = Literal["text", "int", "float", "datetime"]
 
 
 class SourceFromLocalFS(BaseModel):
@@ -13,6 +18,8 @@ class SourceFromLocalFS(BaseModel):
     regex_pattern: Optional[re.Pattern] = None
     regex_group_names: Optional[List[str]] = None
     table_append_or_replace: Literal["append", "replace"]
+    # snake_case column name to type, columns not listed are loaded as text
+    column_types: Optional[dict[str, ColumnType]] = None
 
 
 class Destination(BaseModel):
@@ -31,3 +38,11 @@ class DestinationAsTable(BaseModel):
 
 class SourceConfig(BaseModel):
     file: dict[str, SourceFromLocalFS]
+
+    @classmethod
+    def from_toml(cls, csv_source_config: Path) -> "SourceConfig":
+        """Raises ValueError when the file is not a valid source config"""
+        try:
+            return cls(**toml.load(csv_source_config))
+        except ValidationError as e:
+            raise ValueError(f"Validation Failed for source_config.toml\n{e}")
@@ -0,0 +1,34 @@
+from typing import Iterator
+from unittest import TestCase
+
+from datawagon.database.copy_block_stream import CopyBlockStream
+
+
+class CopyBlockStreamTestCase(TestCase):
+    def test_read_splits_and_joins_blocks(self) -> None:
+        stream = CopyBlockStream(iter(["abc", "", "defgh", "i"]))
+
+        assert stream.read(2) == "ab"
+        assert stream.read(4) == "cdef"
+        assert stream.read(10) == "ghi"
+        assert stream.read(10) == ""
+
+    def test_read_all_bytes(self) -> None:
+        stream = CopyBlockStream(iter([b"PG", b"COPY"]))
+
+        assert stream.read() == b"PGCOPY"
+        assert stream.read() == b""
+
+    def test_blocks_are_pulled_as_they_are_read(self) -> None:
+        pulled = []
+
+        def blocks() -> Iterator[str]:
+            for block in ["one", "two"]:
+                pulled.append(block)
+                yield block
+
+        stream = CopyBlockStream(blocks())
+        assert pulled == []
+
+        assert stream.read(3) == "one"
+        assert pulled == ["one"]
@@ -0,0 +1,55 @@
+import csv
+from io import StringIO
+from unittest import TestCase
+
+from datawagon.objects.csv_copy_stream import CSVCopyStream
+
+APPENDED_VALUES = ["file, name.csv", "SomeBrand", 20230630]
+
+
+class SmallBlockCSVCopyStream(CSVCopyStream):
+    BLOCK_SIZE = 16
+
+
+class CSVCopyStreamTestCase(TestCase):
+    def read_records(self, csv_text: str, read_size: int = 7) -> list:
+        stream = SmallBlockCSVCopyStream(StringIO(csv_text), APPENDED_VALUES)
+
+        blocks = []
+        while block := stream.read(read_size):
+            assert len(block) <= read_size
+            blocks.append(block)
+
+        return list(csv.reader(StringIO("".join(blocks))))
+
+    def test_appends_values_to_every_record(self) -> None:
+        records = self.read_records("a,1\nb,2\nc,3\n")
+
+        assert records == [
+            ["a", "1", "file, name.csv", "SomeBrand", "20230630"],
+            ["b", "2", "file, name.csv", "SomeBrand", "20230630"],
+            ["c", "3", "file, name.csv", "SomeBrand", "20230630"],
+        ]
+
+    def test_keeps_quoted_fields_spanning_lines_in_one_record(self) -> None:
+        records = self.read_records('a,"one\ntwo, ""three""\n\nfour"\nb,2')
+
+        assert [record[:2] for record in records] == [
+            ["a", 'one\ntwo, "three"\n\nfour'],
+            ["b", "2"],
+        ]
+        assert all(
+            record[2:] == ["file, name.csv", "SomeBrand", "20230630"]
+            for record in records
+        )
+
+    def test_skips_blank_lines(self) -> None:
+        records = self.read_records("a,1\n\nb,2\n\n")
+
+        assert [record[:2] for record in records] == [["a", "1"], ["b", "2"]]
+
+    def test_read_all(self) -> None:
+        stream = CSVCopyStream(StringIO("a,1\n"), ["x"])
+
+        assert stream.read() == "a,1,x\n"
+        assert stream.read() == ""
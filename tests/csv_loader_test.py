@@ -0,0 +1,153 @@
+import gzip
+import importlib.util
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+from unittest import TestCase, skipIf
+
+from datawagon.objects.csv_loader import CSVLoader
+from datawagon.objects.managed_file_metadata import (
+    ManagedFileInput,
+    ManagedFileMetadata,
+)
+from datawagon.objects.source_config import ColumnType
+
+HEADER = "Video ID,Day,Partner Revenue,Claim Date\n"
+
+
+def build_file_info(
+    file_path: Path, column_types: Optional[Dict[str, ColumnType]] = None
+) -> ManagedFileMetadata:
+    return ManagedFileMetadata.build_data_item(
+        ManagedFileInput(
+            file_name=file_path.name,
+            file_path=file_path,
+            base_name="claim_raw",
+            table_name="claim_raw",
+            table_append_or_replace="append",
+            storage_folder_name="claim_raw",
+            content_owner="SomeBrand",
+            file_date_key="20230601",
+            column_types=column_types,
+        )  # type: ignore
+    )
+
+
+class CSVLoaderTestCase(TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_dir = Path(self.temp_dir.name)
+
+        rows = "".join(f"v{i},{i % 28},{i}.25,2023-06-01\n" for i in range(10))
+        self.csv_path = (
+            self.source_dir / "YouTube_SomeBrand_M_20230601_claim_raw_v1-1.csv"
+        )
+        self.csv_path.write_text("junk row\n" + HEADER + rows)
+
+        self.gz_path = (
+            self.source_dir / "YouTube_SomeBrand_M_20230601_claim_raw_v1-1.csv.gz"
+        )
+        with gzip.open(self.gz_path, "wt") as f:
+            f.write(HEADER + rows)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_load_data_skips_invalid_row_above_header(self) -> None:
+        df = CSVLoader(build_file_info(self.csv_path)).load_data()
+
+        assert len(df) == 10
+        assert list(df.columns) == [
+            "video_id",
+            "day",
+            "partner_revenue",
+            "claim_date",
+            "_file_name",
+            "_content_owner",
+            "_report_date_key",
+            "_file_load_date",
+        ]
+        assert df["_report_date_key"].iloc[0] == 20230630
+
+    def test_load_data_chunks_matches_load_data(self) -> None:
+        loader = CSVLoader(build_file_info(self.gz_path))
+        chunks = list(loader.load_data_chunks(chunk_size=4))
+
+        assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+        assert all((chunk.dtypes == chunks[0].dtypes).all() for chunk in chunks)
+        assert (
+            chunks[0]["_file_load_date"].iloc[0]
+            == chunks[-1]["_file_load_date"].iloc[0]
+        )
+
+        df = loader.load_data()
+        assert df["video_id"].tolist() == [
+            value for chunk in chunks for value in chunk["video_id"].tolist()
+        ]
+
+    def test_load_data_chunks_of_whole_chunks(self) -> None:
+        for csv_engine in CSVLoader.CSV_ENGINES:
+            if csv_engine == "pyarrow" and importlib.util.find_spec("pyarrow") is None:
+                continue
+            loader = CSVLoader(build_file_info(self.gz_path), csv_engine)
+            chunks = list(loader.load_data_chunks(chunk_size=5))
+
+            assert [len(chunk) for chunk in chunks] == [5, 5]
+
+    def test_load_data_chunks_yields_empty_frame_for_header_only_file(self) -> None:
+        self.csv_path.write_text(HEADER)
+
+        chunks = list(CSVLoader(build_file_info(self.csv_path)).load_data_chunks(5))
+
+        assert len(chunks) == 1
+        assert len(chunks[0]) == 0
+        assert "_file_name" in chunks[0].columns
+
+    def test_load_data_uses_source_column_types(self) -> None:
+        self.csv_path.write_text(
+            "Video ID,Day,Views In Day Share\n" + "v1,3,0.5\n" + "v2,4,0.25\n"
+        )
+        column_types: Dict[str, ColumnType] = {
+            "views_in_day_share": "float",
+            "missing_column": "int",
+        }
+
+        df = CSVLoader(build_file_info(self.csv_path, column_types)).load_data()
+
+        assert df["views_in_day_share"].tolist() == [0.5, 0.25]
+        # columns not in the source config are loaded as text
+        assert df["day"].tolist() == ["3", "4"]
+        assert df["_report_date_key"].dtype == "int64"
+
+    @skipIf(importlib.util.find_spec("pyarrow") is None, "pyarrow is not installed")
+    def test_pyarrow_engine_matches_python_engine(self) -> None:
+        python_loader = CSVLoader(build_file_info(self.csv_path))
+        arrow_loader = CSVLoader(build_file_info(self.csv_path), "pyarrow")
+        arrow_loader.file_load_date = python_loader.file_load_date
+
+        chunks = list(arrow_loader.load_data_chunks(chunk_size=4))
+
+        assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+        assert arrow_loader.load_data().equals(python_loader.load_data())
+
+    @skipIf(importlib.util.find_spec("pyarrow") is None, "pyarrow is not installed")
+    def test_pyarrow_engine_parses_dates_like_python_engine(self) -> None:
+        self.csv_path.write_text(
+            "Created Date,Revenue\n" + "2023/06/01,1.5\n" + "2023/06/02,2.5\n"
+        )
+        python_loader = CSVLoader(build_file_info(self.csv_path))
+        arrow_loader = CSVLoader(build_file_info(self.csv_path), "pyarrow")
+        arrow_loader.file_load_date = python_loader.file_load_date
+
+        df = arrow_loader.load_data()
+
+        assert df["created_date"].dt.day.tolist() == [1, 2]
+        assert df.equals(python_loader.load_data())
+
+    @skipIf(importlib.util.find_spec("pyarrow") is None, "pyarrow is not installed")
+    def test_engines_reject_empty_float(self) -> None:
+        self.csv_path.write_text("Video ID,Revenue\n" + "v1,1.5\n" + "v2,\n")
+
+        for csv_engine in CSVLoader.CSV_ENGINES:
+            with self.assertRaises(ValueError):
+                CSVLoader(build_file_info(self.csv_path), csv_engine).load_data()
@@ -1,4 +1,10 @@
+import gzip
+import os
+import tempfile
+import zipfile
+from pathlib import Path
 from unittest import TestCase
+from unittest.mock import patch
 
 import pytest
 
@@ -46,3 +52,49 @@ class FileUtilsTestCase(TestCase):
             )
             == 1
         )
+
+    def test_csv_zip_to_gzip(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            zip_path = Path(temp_dir) / "report.csv.zip"
+            with zipfile.ZipFile(zip_path, "w") as zip_file:
+                zip_file.writestr("nested/report.csv", "a,b\n1,2\n")
+
+            assert self.file_utils.zip_csv_size(zip_path) == 8
+
+            gzip_path = self.file_utils.csv_zip_to_gzip(
+                zip_path, remove_original_zip=True, compression_level=1
+            )
+
+            assert gzip_path == Path(temp_dir) / "report.csv.gz"
+            assert gzip.decompress(gzip_path.read_bytes()) == b"a,b\n1,2\n"
+            assert os.listdir(temp_dir) == ["report.csv.gz"]
+
+    def test_csv_zip_to_gzip_failure_keeps_zip(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            zip_path = Path(temp_dir) / "report.csv.zip"
+            with zipfile.ZipFile(zip_path, "w") as zip_file:
+                zip_file.writestr("report.csv", "a,b\n1,2\n")
+
+            with patch("gzip.compress", side_effect=OSError("disk full")):
+                with pytest.raises(OSError):
+                    self.file_utils.csv_zip_to_gzip(zip_path, remove_original_zip=True)
+
+            # no partial .gz file is left next to the zip
+            assert os.listdir(temp_dir) == ["report.csv.zip"]
+
+    def test_zip_csv_gzip_blocks(self) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            zip_path = Path(temp_dir) / "report.csv.zip"
+            with zipfile.ZipFile(zip_path, "w") as zip_file:
+                zip_file.writestr("report.csv", "a,b\n1,2\n" * 1_000_000)
+
+            gzip_bytes = b"".join(self.file_utils.zip_csv_gzip_blocks(zip_path, 1))
+
+            # the same bytes on every call, and as the converted file
+            assert gzip_bytes == b"".join(
+                self.file_utils.zip_csv_gzip_blocks(zip_path, 1)
+            )
+            gzip_path = self.file_utils.csv_zip_to_gzip(zip_path, compression_level=1)
+            assert gzip_path.read_bytes() == gzip_bytes
+
+            assert self.file_utils.gzip_file_name(zip_path.name) == gzip_path.name
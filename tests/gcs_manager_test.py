@@ -0,0 +1,393 @@
+import base64
+import fnmatch
+import gzip
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import google_crc32c
+import toml
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from datawagon.bucket.gcs_manager import GcsManager
+from datawagon.bucket.storage_manifest import StorageManifestFile
+from datawagon.objects.source_config import SourceConfig
+from tests.resumable_upload_test import CHUNK_SIZE, FakeResponse, FakeUploadSession
+
+SOURCE_CONFIG = """
+[file.claim_raw]
+is_enabled = true
+storage_folder_name = "caravan/claim_raw"
+table_name = "claim_raw"
+select_file_name_base = "claim_raw"
+regex_pattern = 'YouTube_(.+)_M_(\\d{8}|\\d{6})'
+regex_group_names = ["content_owner", "file_date_key"]
+table_append_or_replace = "append"
+
+[file.asset_raw]
+is_enabled = true
+storage_folder_name = "caravan/asset_raw"
+table_name = "asset_raw"
+select_file_name_base = "asset_raw"
+regex_pattern = 'YouTube_(.+)_M_(\\d{8}|\\d{6})'
+regex_group_names = ["content_owner", "file_date_key"]
+table_append_or_replace = "append"
+
+[file.video_raw]
+is_enabled = false
+storage_folder_name = "caravan/video_raw"
+table_name = "video_raw"
+select_file_name_base = "video_raw"
+regex_pattern = 'YouTube_(.+)_M_(\\d{8}|\\d{6})'
+regex_group_names = ["content_owner", "file_date_key"]
+table_append_or_replace = "append"
+"""
+
+
+def crc32c(data: bytes) -> str:
+    return base64.b64encode(google_crc32c.Checksum(data).digest()).decode("utf-8")
+
+
+class FakeBlob(object):
+    def __init__(self, bucket: "FakeBucket", name: str) -> None:
+        self.bucket = bucket
+        self.name = name
+        self.generation = 0
+        self.md5_hash = None
+
+    @property
+    def size(self) -> int:
+        return len(self.bucket.objects[self.name][0])
+
+    @property
+    def crc32c(self) -> str:
+        return crc32c(self.bucket.objects[self.name][0])
+
+    def download_as_bytes(self) -> bytes:
+        if self.name not in self.bucket.objects:
+            raise NotFound(self.name)
+        data, self.generation = self.bucket.objects[self.name]
+        return data
+
+    def upload_from_string(
+        self, data: str, content_type: str, if_generation_match: int
+    ) -> None:
+        _, generation = self.bucket.objects.get(self.name, (b"", 0))
+        if generation != if_generation_match:
+            raise PreconditionFailed(self.name)
+        self.bucket.objects[self.name] = (data.encode(), generation + 1)
+        self.generation = generation + 1
+
+    def delete(self, if_generation_match: int) -> None:
+        if self.name not in self.bucket.objects:
+            raise NotFound(self.name)
+        if self.bucket.objects[self.name][1] != if_generation_match:
+            raise PreconditionFailed(self.name)
+        del self.bucket.objects[self.name]
+
+    def create_resumable_upload_session(
+        self, size: Optional[int], if_generation_match: int
+    ) -> str:
+        return f"https://upload/{self.name}"
+
+    def upload_from_filename(self, file_name: str, if_generation_match: int) -> None:
+        self.upload_from_string(
+            Path(file_name).read_text(), "text/csv", if_generation_match
+        )
+
+
+class FakeBucket(object):
+    """Objects by name, with their data and generation"""
+
+    def __init__(self) -> None:
+        self.objects: Dict[str, Tuple[bytes, int]] = {}
+        self.list_calls: List[Dict[str, Any]] = []
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[FakeBlob]:
+        return FakeBlob(self, name) if name in self.objects else None
+
+    def add_file(self, name: str) -> None:
+        self.objects[name] = (b"data", 1)
+
+    def list_blobs(
+        self,
+        bucket_name: str,
+        prefix: str,
+        match_glob: str,
+        fields: str,
+        start_offset: Optional[str] = None,
+    ) -> List[Any]:
+        self.list_calls.append({"prefix": prefix, "start_offset": start_offset})
+
+        blobs = []
+        for name, (data, _) in sorted(self.objects.items()):
+            if (
+                name.startswith(prefix)
+                and name >= (start_offset or "")
+                and fnmatch.fnmatchcase(name, match_glob.replace("**", "*"))
+            ):
+                blob = MagicMock(size=len(data), crc32c="crc", md5_hash="md5")
+                blob.name = name
+                blobs.append(blob)
+        return blobs
+
+
+class GcsManagerTestCase(TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.bucket = FakeBucket()
+        self.bucket.add_file(
+            "caravan/claim_raw/report_date=2023-05-01/YouTube_A_M_20230501_claim_raw.csv.gz"
+        )
+        self.bucket.add_file(
+            "caravan/asset_raw/report_date=2023-05-01/YouTube_A_M_20230501_asset_raw.csv.gz"
+        )
+
+        with patch("datawagon.bucket.gcs_manager.storage.Client") as client:
+            client.return_value.bucket.return_value = self.bucket
+            client.return_value.list_blobs.side_effect = self.bucket.list_blobs
+            self.gcs_manager = GcsManager("project", "bucket", Path(self.temp_dir.name))
+
+        self.source_config = SourceConfig(**toml.loads(SOURCE_CONFIG))
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_files_without_manifest_are_listed(self) -> None:
+        files_by_base_name, folders_without_manifest = self.gcs_manager.files_in_blobs(
+            self.source_config
+        )
+
+        assert files_by_base_name == {
+            "claim_raw": ["YouTube_A_M_20230501_claim_raw.csv.gz"],
+            "asset_raw": ["YouTube_A_M_20230501_asset_raw.csv.gz"],
+        }
+        assert folders_without_manifest == ["caravan/claim_raw", "caravan/asset_raw"]
+
+        # disabled sources are not listed
+        assert len(self.bucket.list_calls) == 2
+
+    def test_files_are_read_from_manifest(self) -> None:
+        self.gcs_manager.files_in_blobs(self.source_config, verify_manifest=True)
+        self.bucket.list_calls.clear()
+
+        new_blob_name = "caravan/claim_raw/report_date=2023-06-01/YouTube_A_M_20230601_claim_raw.csv.gz"
+        self.gcs_manager.update_manifest(
+            "caravan/claim_raw", {new_blob_name: StorageManifestFile(size=4)}
+        )
+
+        files_by_base_name, folders_without_manifest = self.gcs_manager.files_in_blobs(
+            self.source_config
+        )
+
+        assert files_by_base_name["claim_raw"] == [
+            "YouTube_A_M_20230501_claim_raw.csv.gz",
+            "YouTube_A_M_20230601_claim_raw.csv.gz",
+        ]
+        assert folders_without_manifest == []
+        assert self.bucket.list_calls == []
+
+    def test_update_manifest_without_manifest(self) -> None:
+        new_blob_name = "caravan/claim_raw/report_date=2023-06-01/new_claim_raw.csv.gz"
+        self.gcs_manager.update_manifest(
+            "caravan/claim_raw", {new_blob_name: StorageManifestFile(size=4)}
+        )
+
+        manifest, generation = self.gcs_manager.read_manifest("caravan/claim_raw")
+
+        # files uploaded before the manifest are listed into it
+        assert manifest is not None
+        assert len(manifest.files) == 2
+        assert manifest.files[new_blob_name].size == 4
+        assert generation == 1
+
+    def test_update_manifest_changed_by_another_upload(self) -> None:
+        self.gcs_manager.rebuild_manifest("caravan/claim_raw")
+        manifest, generation = self.gcs_manager.read_manifest("caravan/claim_raw")
+        assert manifest is not None
+
+        self.gcs_manager.update_manifest(
+            "caravan/claim_raw",
+            {"caravan/claim_raw/other.csv.gz": StorageManifestFile(size=1)},
+        )
+
+        # a manifest read before the other upload is not written over it
+        manifest.files["caravan/claim_raw/mine.csv.gz"] = StorageManifestFile(size=2)
+        assert not self.gcs_manager._write_manifest(
+            "caravan/claim_raw", manifest, generation
+        )
+
+        manifest, generation = self.gcs_manager.read_manifest("caravan/claim_raw")
+        assert manifest is not None
+        assert "caravan/claim_raw/other.csv.gz" in manifest.files
+        assert "caravan/claim_raw/mine.csv.gz" not in manifest.files
+        assert generation == 2
+
+    def test_incremental_listing_starts_at_newest_partition(self) -> None:
+        self.gcs_manager.list_manifest_files("caravan/claim_raw", is_incremental=True)
+
+        new_blob_name = "caravan/claim_raw/report_date=2023-06-01/YouTube_A_M_20230601_claim_raw.csv.gz"
+        self.bucket.add_file(new_blob_name)
+        self.bucket.list_calls.clear()
+
+        manifest = self.gcs_manager.list_manifest_files(
+            "caravan/claim_raw", is_incremental=True
+        )
+
+        assert len(manifest.files) == 2
+        assert self.bucket.list_calls == [
+            {
+                "prefix": "caravan/claim_raw/",
+                "start_offset": "caravan/claim_raw/report_date=2023-05-01/",
+            }
+        ]
+
+        # files added to older partitions are found by a full listing
+        assert self.gcs_manager.folder_listings is not None
+        with patch.object(
+            self.gcs_manager.folder_listings, "FULL_LISTING_INTERVAL_SECONDS", -1
+        ):
+            self.bucket.list_calls.clear()
+            self.gcs_manager.list_manifest_files(
+                "caravan/claim_raw", is_incremental=True
+            )
+
+        assert self.bucket.list_calls[0]["start_offset"] is None
+
+    def test_verify_manifest_lists_incrementally(self) -> None:
+        self.gcs_manager.files_in_blobs(self.source_config, verify_manifest=True)
+        self.bucket.list_calls.clear()
+
+        # uploaded to an older partition since the folder was listed
+        old_blob_name = "caravan/claim_raw/report_date=2023-04-01/YouTube_A_M_20230401_claim_raw.csv.gz"
+        self.bucket.add_file(old_blob_name)
+        self.gcs_manager.update_manifest(
+            "caravan/claim_raw", {old_blob_name: StorageManifestFile(size=4)}
+        )
+
+        files_by_base_name, _ = self.gcs_manager.files_in_blobs(
+            self.source_config, verify_manifest=True
+        )
+
+        assert all(call["start_offset"] for call in self.bucket.list_calls)
+        assert files_by_base_name["claim_raw"] == [
+            "YouTube_A_M_20230501_claim_raw.csv.gz",
+            "YouTube_A_M_20230401_claim_raw.csv.gz",
+        ]
+
+    def test_update_manifest_without_manifest_lists_incrementally(self) -> None:
+        self.gcs_manager.list_manifest_files("caravan/claim_raw", is_incremental=True)
+        self.bucket.list_calls.clear()
+
+        new_blob_name = "caravan/claim_raw/report_date=2023-06-01/new_claim_raw.csv.gz"
+        self.gcs_manager.update_manifest(
+            "caravan/claim_raw", {new_blob_name: StorageManifestFile(size=4)}
+        )
+
+        assert self.bucket.list_calls == [
+            {
+                "prefix": "caravan/claim_raw/",
+                "start_offset": "caravan/claim_raw/report_date=2023-05-01/",
+            }
+        ]
+
+    def test_upload_skips_identical_files(self) -> None:
+        source_file = Path(self.temp_dir.name) / "YouTube_A_M_20230501_claim_raw.csv.gz"
+        source_file.write_text("data")
+
+        folder = "caravan/claim_raw/report_date=2023-05-01"
+        existing_blob_name = f"{folder}/YouTube_A_M_20230501_claim_raw.csv.gz"
+        new_blob_name = f"{folder}/YouTube_B_M_20230501_claim_raw.csv.gz"
+
+        result = self.gcs_manager.upload_blob(str(source_file), existing_blob_name)
+        assert result.status == "skipped"
+
+        result = self.gcs_manager.upload_blob(str(source_file), new_blob_name)
+        assert result.status == "uploaded"
+        assert result.manifest_file is not None
+        assert result.manifest_file.crc32c == crc32c(b"data")
+        assert result.manifest_file.report_date == "2023-05-01"
+
+        # different content is not overwritten
+        source_file.write_text("changed data")
+        result = self.gcs_manager.upload_blob(str(source_file), new_blob_name)
+        assert result.status == "conflict"
+        assert self.bucket.objects[new_blob_name] == (b"data", 1)
+
+    def test_upload_deletes_object_with_different_crc32c(self) -> None:
+        source_file = Path(self.temp_dir.name) / "YouTube_B_M_20230501_claim_raw.csv.gz"
+        source_file.write_text("data")
+        blob_name = f"caravan/claim_raw/report_date=2023-05-01/{source_file.name}"
+
+        with patch(
+            "datawagon.bucket.gcs_manager.FileUtils.file_crc32c",
+            return_value=crc32c(b"other data"),
+        ):
+            result = self.gcs_manager.upload_blob(str(source_file), blob_name)
+
+        assert result.status == "failed"
+        assert blob_name not in self.bucket.objects
+
+        # the next upload is not a conflict with the deleted object
+        result = self.gcs_manager.upload_blob(str(source_file), blob_name)
+        assert result.status == "uploaded"
+
+    def test_resumable_upload_created_by_another_upload(self) -> None:
+        source_file = Path(self.temp_dir.name) / "YouTube_B_M_20230501_claim_raw.csv.gz"
+        data = bytes(range(256)) * (CHUNK_SIZE // 128)
+        source_file.write_bytes(data)
+        blob_name = f"caravan/claim_raw/report_date=2023-05-01/{source_file.name}"
+
+        session = FakeUploadSession()
+        session.is_object_created = True
+
+        def put(
+            url: str, data: bytes = b"", headers: Any = None, timeout: Any = None
+        ) -> FakeResponse:
+            # another upload of the same file creates the object meanwhile
+            self.bucket.objects[blob_name] = (source_file.read_bytes(), 1)
+            return session.put(url, data, headers, timeout)
+
+        with patch("datawagon.bucket.resumable_upload.requests.Session") as http:
+            http.return_value.put.side_effect = put
+            result = self.gcs_manager.upload_blob(
+                str(source_file), blob_name, CHUNK_SIZE
+            )
+
+        assert result.status == "skipped"
+        assert list((Path(self.temp_dir.name) / "upload_sessions").glob("*")) == []
+
+    def test_upload_zip_as_gzip(self) -> None:
+        zip_path = Path(self.temp_dir.name) / "YouTube_B_M_20230501_claim_raw.csv.zip"
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            zip_file.writestr("YouTube_B_M_20230501_claim_raw.csv", "a,b\n1,2\n")
+
+        blob_name = "caravan/claim_raw/report_date=2023-05-01/YouTube_B_M_20230501_claim_raw.csv.gz"
+        session = FakeUploadSession()
+
+        def put(
+            url: str, data: bytes = b"", headers: Any = None, timeout: Any = None
+        ) -> FakeResponse:
+            response = session.put(url, data, headers, timeout)
+            if session.is_complete:
+                self.bucket.objects[blob_name] = (session.received, 1)
+            return response
+
+        with patch("datawagon.bucket.resumable_upload.requests.Session") as http:
+            http.return_value.put.side_effect = put
+            result = self.gcs_manager.upload_zip_as_gzip(str(zip_path), blob_name)
+
+        assert result.status == "uploaded"
+        assert result.manifest_file is not None
+        assert result.manifest_file.crc32c == crc32c(session.received)
+        assert gzip.decompress(self.bucket.objects[blob_name][0]) == b"a,b\n1,2\n"
+
+        # compressed again to compare with the uploaded object
+        result = self.gcs_manager.upload_zip_as_gzip(str(zip_path), blob_name)
+        assert result.status == "skipped"
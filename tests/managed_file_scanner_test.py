@@ -0,0 +1,41 @@
+from typing import Optional
+from unittest import TestCase
+
+from datawagon.objects.managed_file_scanner import SourceFileMatcher
+from datawagon.objects.source_config import SourceFromLocalFS
+
+
+def build_source(select: str, exclude: Optional[str] = None) -> SourceFromLocalFS:
+    return SourceFromLocalFS(
+        is_enabled=True,
+        select_file_name_base=select,
+        exclude_file_name_base=exclude,
+        table_append_or_replace="append",
+    )
+
+
+class SourceFileMatcherTestCase(TestCase):
+    def setUp(self) -> None:
+        self.file_sources = {
+            "claim_raw": build_source("claim_raw", exclude="adj_claim_raw"),
+            "adj_claim_raw": build_source("adj_claim_raw"),
+            "asset_raw": build_source("asset_raw"),
+        }
+
+    def test_matched_sources(self) -> None:
+        matcher = SourceFileMatcher(self.file_sources)
+
+        assert matcher.matched_sources("YouTube_X_M_20230601_CLAIM_RAW_v1-1.csv") == [
+            "claim_raw"
+        ]
+        assert matcher.matched_sources("YouTube_X_M_20230601_adj_claim_raw.csv") == [
+            "adj_claim_raw"
+        ]
+        assert matcher.matched_sources("YouTube_X_M_20230601_video_raw.csv") == []
+        assert matcher.matched_sources(".~lock.YouTube_asset_raw.csv#") == []
+
+    def test_matched_sources_with_file_extension(self) -> None:
+        matcher = SourceFileMatcher(self.file_sources, ".gz")
+
+        assert matcher.matched_sources("YouTube_X_asset_raw.csv.gz") == ["asset_raw"]
+        assert matcher.matched_sources("YouTube_X_asset_raw.csv.zip") == []
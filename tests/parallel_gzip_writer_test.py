@@ -0,0 +1,33 @@
+import gzip
+import io
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+from datawagon.objects.parallel_gzip_writer import ParallelGzipWriter
+
+
+class ParallelGzipWriterTestCase(TestCase):
+    def write_gzip(self, data: bytes, write_size: int) -> bytes:
+        output_file = io.BytesIO()
+        with ParallelGzipWriter(output_file, compression_level=6, threads=2) as writer:
+            for start in range(0, len(data), write_size):
+                end = start + write_size
+                writer.write(data[start:end])
+
+        return output_file.getvalue()
+
+    @patch.object(ParallelGzipWriter, "BLOCK_SIZE", 1000)
+    def test_blocks_are_written_in_order(self) -> None:
+        data = os.urandom(250) * 37
+
+        compressed = self.write_gzip(data, 333)
+
+        assert gzip.decompress(compressed) == data
+        # one member per block, each starts with the gzip magic number
+        assert compressed.count(b"\x1f\x8b\x08") >= 10
+
+    def test_empty_file(self) -> None:
+        compressed = self.write_gzip(b"", 1)
+
+        assert gzip.decompress(compressed) == b""
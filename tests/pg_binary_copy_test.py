@@ -0,0 +1,62 @@
+import struct
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from datawagon.database.pg_binary_copy import PgBinaryCopyEncoder
+
+
+def numeric_digits(field: bytes) -> tuple:
+    size, ndigits, weight, sign, dscale = struct.unpack(">ihhHh", field[:12])
+    digits = struct.unpack(f">{ndigits}h", field[12:])
+    return sign, digits
+
+
+class PgBinaryCopyEncoderTestCase(TestCase):
+    def test_encode_wraps_rows_in_header_and_trailer(self) -> None:
+        data = PgBinaryCopyEncoder(pd.DataFrame({"a": [1, 2]})).encode()
+
+        assert data.startswith(PgBinaryCopyEncoder.HEADER)
+        assert data.endswith(PgBinaryCopyEncoder.TRAILER)
+
+        header_size = len(PgBinaryCopyEncoder.HEADER)
+        rows = data[header_size:-2]
+        assert rows == (struct.pack(">hiq", 1, 8, 1) + struct.pack(">hiq", 1, 8, 2))
+
+    def test_encode_numeric_rounds_half_up_at_numeric_scale(self) -> None:
+        encoder = PgBinaryCopyEncoder(pd.DataFrame())
+        fields = encoder._encode_numeric(
+            np.array([0.12345675, -98765.4321, 123456.7890124, -0.00000001])
+        )
+
+        assert numeric_digits(fields[0]) == (0, (0, 0, 0, 1234, 5680))
+        assert numeric_digits(fields[1]) == (0x4000, (0, 9, 8765, 4321, 0))
+        assert numeric_digits(fields[2]) == (0, (0, 12, 3456, 7890, 1240))
+        # rounds to zero, which is never negative
+        assert numeric_digits(fields[3]) == (0, (0, 0, 0, 0, 0))
+
+    def test_encode_missing_values_as_null(self) -> None:
+        df = pd.DataFrame(
+            {
+                "text": ["a", "", None],
+                "amount": [1.5, np.nan, 2.0],
+                "day": pd.to_datetime(["2023-06-01", None, "2000-01-01"]),
+            }
+        )
+        encoder = PgBinaryCopyEncoder(df)
+
+        assert encoder._encode_text(df["text"])[1:] == [encoder.NULL_FIELD] * 2
+        assert encoder._encode_numeric(df["amount"].to_numpy())[1] == (
+            encoder.NULL_FIELD
+        )
+
+        timestamps = encoder._encode_timestamp(df["day"])
+        assert timestamps[1] == encoder.NULL_FIELD
+        assert timestamps[2] == struct.pack(">iq", 8, 0)
+
+    def test_unsupported_dtype_raises(self) -> None:
+        df = pd.DataFrame({"a": pd.Series([1.5], dtype="float32")})
+
+        with self.assertRaises(ValueError):
+            PgBinaryCopyEncoder(df).encode()
@@ -0,0 +1,66 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from datawagon.objects.profiler import ProfileOptions, Profiler
+
+
+class ProfilerTestCase(TestCase):
+    def test_disabled_records_nothing(self) -> None:
+        profiler = Profiler()
+        raw_file = io.BytesIO(b"data")
+        with profiler.stage("load"):
+            assert profiler.profiled_reader(raw_file, "read_file") is raw_file
+
+        assert profiler.records.stages == {}
+
+    def test_nested_stages_by_file(self) -> None:
+        profiler = Profiler()
+        profiler.start(ProfileOptions(is_enabled=True))
+
+        with profiler.file("a.csv"):
+            with profiler.stage("load"):
+                reader = profiler.profiled_reader(io.BytesIO(b"x" * 100), "read_file")
+                assert reader.read() == b"x" * 100
+        with profiler.stage("load") as stage:
+            stage.bytes += 5
+
+        records = profiler.take_records()
+        assert records.stages["load"].calls == 2
+        assert records.stages["load"].bytes == 5
+        assert records.stages["load/read_file"].bytes == 100
+        assert set(records.files["a.csv"]) == {"load", "load/read_file"}
+        assert profiler.records.stages == {}
+
+        profiler.merge(records)
+        profiler.merge(records)
+        assert profiler.records.stages["load"].calls == 4
+
+    def test_report(self) -> None:
+        profiler = Profiler()
+        profiler.start(ProfileOptions(is_enabled=True), is_cprofile_enabled=True)
+        with profiler.stage("load"):
+            pass
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report_path = Path(temp_dir) / "profile.json"
+            profiler.report(report_path)
+
+            report = json.loads(report_path.read_text())
+            assert report["stages"]["load"]["calls"] == 1
+            assert Path(report["cprofile_path"]).exists()
+
+    def test_report_without_resource_module(self) -> None:
+        profiler = Profiler()
+        profiler.start(ProfileOptions(is_enabled=True))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # as on windows, where the module does not exist
+            with patch.dict("sys.modules", {"resource": None}):
+                report = profiler.report(Path(temp_dir) / "profile.json")
+
+        assert report.peak_rss_bytes == 0
+        assert report.worker_cpu_seconds == 0
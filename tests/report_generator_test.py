@@ -0,0 +1,36 @@
+import tempfile
+from pathlib import Path
+from typing import List
+from unittest import TestCase
+
+from benchmarks.report_generator import ReportFormat, write_file_tree, write_report
+from datawagon.objects.csv_loader import CSVLoader
+from tests.csv_loader_test import build_file_info
+
+
+class ReportGeneratorTestCase(TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self.temp_dir.name)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_reports_load_with_typed_columns(self) -> None:
+        formats: List[ReportFormat] = ["csv", "gz", "zip"]
+        for report_format in formats:
+            file_path = write_report(self.output_dir, "claim_raw", 100, report_format)
+            df = CSVLoader(build_file_info(file_path)).load_data()
+
+            assert len(df) == 100
+            assert df["owned_views"].dtype == "int64"
+            assert df["partner_revenue"].dtype == "float64"
+
+    def test_file_tree(self) -> None:
+        file_paths = write_file_tree(self.output_dir, 30, ["claim_raw", "asset_raw"])
+
+        assert len(file_paths) == 30
+        assert file_paths[0] == (
+            self.output_dir
+            / "Owner0000/201001/YouTube_Owner0000_M_20100101_claim_raw_v1-1.csv.gz"
+        )
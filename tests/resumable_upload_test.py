@@ -0,0 +1,284 @@
+import base64
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from unittest import TestCase
+from unittest.mock import patch
+
+import google_crc32c
+import requests  # type: ignore[import-untyped]
+from google.api_core.exceptions import PreconditionFailed
+
+from datawagon.bucket.resumable_upload import (
+    ResumableStreamUpload,
+    ResumableUpload,
+    SessionExpiredError,
+    UploadSessionStore,
+)
+
+CHUNK_SIZE = ResumableUpload.CHUNK_SIZE_MULTIPLE
+
+
+def crc32c(data: bytes) -> str:
+    return base64.b64encode(google_crc32c.Checksum(data).digest()).decode("utf-8")
+
+
+class FakeResponse(object):
+    def __init__(
+        self, status_code: int, headers: Dict[str, str], body: Any = None
+    ) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return self.body
+
+
+class FakeUploadSession(object):
+    """Resumable upload session of a storage server, which can fail
+    a number of chunk requests after receiving them"""
+
+    def __init__(
+        self, fail_after_chunks: Optional[int] = None, failing_status_queries: int = 0
+    ) -> None:
+        self.received = b""
+        self.is_complete = False
+        self.is_expired = False
+        self.fail_after_chunks = fail_after_chunks
+        self.chunk_count = 0
+        # status queries after a failed chunk which fail as well
+        self.failing_status_queries = failing_status_queries
+        self.timeouts: List[Any] = []
+        # the object was created by another upload before the last chunk
+        self.is_object_created = False
+
+    def put(
+        self, url: str, data: bytes = b"", headers: Any = None, timeout: Any = None
+    ) -> FakeResponse:
+        self.timeouts.append(timeout)
+        if self.is_expired:
+            return FakeResponse(410, {})
+
+        if (
+            not data
+            and self.failing_status_queries
+            and self.chunk_count == self.fail_after_chunks
+        ):
+            self.failing_status_queries -= 1
+            raise requests.Timeout("read timed out")
+
+        content_range = headers["Content-Range"]
+        # "*" until the last chunk of a stream
+        total = content_range.split("/")[1]
+
+        if data:
+            start = int(content_range.split(" ")[1].split("-")[0])
+            assert start == len(self.received)
+            self.received += data
+            self.chunk_count += 1
+
+            if self.chunk_count == self.fail_after_chunks:
+                raise requests.ConnectionError("connection reset")
+
+        if total != "*" and len(self.received) == int(total):
+            if self.is_object_created:
+                return FakeResponse(412, {})
+            self.is_complete = True
+            return FakeResponse(
+                200,
+                {},
+                {
+                    "name": "upload.csv.gz",
+                    "size": total,
+                    "crc32c": crc32c(self.received),
+                },
+            )
+
+        if not self.received:
+            return FakeResponse(308, {})
+        return FakeResponse(308, {"Range": f"bytes=0-{len(self.received) - 1}"})
+
+
+class ResumableUploadTestCase(TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_file = Path(self.temp_dir.name) / "upload.csv.gz"
+        self.data = bytes(range(256)) * (CHUNK_SIZE * 3 // 256 + 10)
+        self.source_file.write_bytes(self.data)
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_upload_in_chunks(self) -> None:
+        session = FakeUploadSession()
+        progress: List[int] = []
+
+        uploaded_object = ResumableUpload(
+            "https://upload", str(self.source_file), CHUNK_SIZE, session
+        ).upload(progress.append)
+
+        assert session.is_complete
+        assert uploaded_object["size"] == str(len(self.data))
+        assert session.received == self.data
+        assert session.chunk_count == 4
+        assert sum(progress) == len(self.data)
+
+    @patch("datawagon.bucket.resumable_upload.time.sleep")
+    def test_retry_resumes_from_received_bytes(self, sleep: Any) -> None:
+        session = FakeUploadSession(fail_after_chunks=2)
+        progress: List[int] = []
+
+        ResumableUpload(
+            "https://upload", str(self.source_file), CHUNK_SIZE, session
+        ).upload(progress.append)
+
+        assert session.received == self.data
+        assert sum(progress) == len(self.data)
+
+    @patch("datawagon.bucket.resumable_upload.time.sleep")
+    def test_retry_failing_status_query(self, sleep: Any) -> None:
+        session = FakeUploadSession(fail_after_chunks=2, failing_status_queries=2)
+
+        ResumableUpload(
+            "https://upload", str(self.source_file), CHUNK_SIZE, session
+        ).upload()
+
+        assert session.received == self.data
+        assert sleep.call_count == 3
+
+    @patch("datawagon.bucket.resumable_upload.time.sleep")
+    def test_failing_status_query_counts_against_retries(self, sleep: Any) -> None:
+        session = FakeUploadSession(fail_after_chunks=2, failing_status_queries=5)
+
+        upload = ResumableUpload(
+            "https://upload", str(self.source_file), CHUNK_SIZE, session
+        )
+        upload.MAX_RETRIES = 2
+        with self.assertRaises(requests.Timeout):
+            upload.upload()
+
+        assert sleep.call_count == 2
+
+    def test_requests_have_timeout(self) -> None:
+        session = FakeUploadSession()
+
+        ResumableUpload(
+            "https://upload", str(self.source_file), CHUNK_SIZE, session
+        ).upload()
+
+        assert session.timeouts
+        assert all(timeout == ResumableUpload.TIMEOUT for timeout in session.timeouts)
+
+    def test_object_created_by_another_upload(self) -> None:
+        session = FakeUploadSession()
+        session.is_object_created = True
+
+        with self.assertRaises(PreconditionFailed):
+            ResumableUpload(
+                "https://upload", str(self.source_file), CHUNK_SIZE, session
+            ).upload()
+
+    def test_interrupted_upload_continues(self) -> None:
+        session = FakeUploadSession(fail_after_chunks=2)
+
+        upload = ResumableUpload(
+            "https://upload", str(self.source_file), CHUNK_SIZE, session
+        )
+        upload.MAX_RETRIES = 0
+        with self.assertRaises(requests.ConnectionError):
+            upload.upload()
+
+        assert len(session.received) == 2 * CHUNK_SIZE
+
+        # a later run continues the same session
+        progress: List[int] = []
+        ResumableUpload(
+            "https://upload", str(self.source_file), CHUNK_SIZE, session
+        ).upload(progress.append)
+
+        assert session.received == self.data
+        assert session.chunk_count == 4
+        assert progress[0] == 2 * CHUNK_SIZE
+
+    def test_expired_session(self) -> None:
+        session = FakeUploadSession()
+        session.is_expired = True
+
+        with self.assertRaises(SessionExpiredError):
+            ResumableUpload(
+                "https://upload", str(self.source_file), CHUNK_SIZE, session
+            ).upload()
+
+    def test_session_store(self) -> None:
+        store = UploadSessionStore(Path(self.temp_dir.name) / "sessions")
+        destination = "gs://bucket/folder/upload.csv.gz"
+
+        assert store.load(str(self.source_file), destination) is None
+
+        store.save(str(self.source_file), destination, "https://upload/session")
+        assert (
+            store.load(str(self.source_file), destination) == "https://upload/session"
+        )
+        assert store.load(str(self.source_file), "gs://bucket/other") is None
+
+        # a changed file starts a new session
+        self.source_file.write_bytes(self.data + b"changed")
+        assert store.load(str(self.source_file), destination) is None
+
+
+class ResumableStreamUploadTestCase(TestCase):
+    def setUp(self) -> None:
+        self.data = bytes(range(256)) * (CHUNK_SIZE * 3 // 256 + 10)
+
+    def generate_blocks(self) -> Iterator[bytes]:
+        # blocks which do not line up with chunks
+        for start in range(0, len(self.data), 100_000):
+            end = start + 100_000
+            yield self.data[start:end]
+
+    def test_upload_stream_in_chunks(self) -> None:
+        session = FakeUploadSession()
+        progress: List[int] = []
+
+        upload = ResumableStreamUpload(
+            "https://upload", self.generate_blocks, CHUNK_SIZE, session
+        )
+        uploaded_object = upload.upload(progress.append)
+
+        assert session.received == self.data
+        assert session.chunk_count == 4
+        assert uploaded_object["size"] == str(len(self.data))
+        assert upload.stream_crc32c == crc32c(self.data)
+        assert sum(progress) == len(self.data)
+
+    def test_stream_of_whole_chunks(self) -> None:
+        self.data = self.data[: 2 * CHUNK_SIZE]
+        session = FakeUploadSession()
+
+        ResumableStreamUpload(
+            "https://upload", self.generate_blocks, CHUNK_SIZE, session
+        ).upload()
+
+        assert session.is_complete
+        assert session.received == self.data
+
+    def test_interrupted_stream_continues(self) -> None:
+        session = FakeUploadSession(fail_after_chunks=2)
+
+        upload = ResumableStreamUpload(
+            "https://upload", self.generate_blocks, CHUNK_SIZE, session
+        )
+        upload.MAX_RETRIES = 0
+        with self.assertRaises(requests.ConnectionError):
+            upload.upload()
+
+        # a later run generates the stream again and skips the received bytes
+        upload = ResumableStreamUpload(
+            "https://upload", self.generate_blocks, CHUNK_SIZE, session
+        )
+        upload.upload()
+
+        assert session.received == self.data
+        assert session.chunk_count == 4
+        assert upload.stream_crc32c == crc32c(self.data)
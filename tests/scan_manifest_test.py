@@ -0,0 +1,89 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from datawagon.objects.managed_file_metadata import ManagedFileMetadata
+from datawagon.objects.managed_file_scanner import ManagedFileScanner
+from datawagon.objects.source_config import SourceConfig
+
+SOURCE_CONFIG = """
+[file.claim_raw]
+is_enabled = true
+storage_folder_name = "caravan/claim_raw"
+table_name = "claim_raw"
+select_file_name_base = "claim_raw"
+regex_pattern = 'YouTube_(.+)_M_(\\d{8}|\\d{6})'
+regex_group_names = ["content_owner", "file_date_key"]
+table_append_or_replace = "append"
+"""
+
+
+class ScanManifestTestCase(TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        base_dir = Path(self.temp_dir.name)
+
+        self.config_path = base_dir / "source_config.toml"
+        self.config_path.write_text(SOURCE_CONFIG)
+
+        self.cache_dir = base_dir / "cache"
+        self.source_dir = base_dir / "source"
+        (self.source_dir / "2023").mkdir(parents=True)
+
+        for month in ["05", "06"]:
+            file_name = f"YouTube_SomeBrand_M_2023{month}01_claim_raw_v1-1.csv.gz"
+            (self.source_dir / "2023" / file_name).write_text("data")
+
+        # directories changed long before the scan can be skipped
+        self.set_old_mtime(self.source_dir / "2023")
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def set_old_mtime(self, path: Path) -> None:
+        os.utime(path, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+
+    def scan(self) -> list:
+        scanner = ManagedFileScanner(
+            SourceConfig.from_toml(self.config_path), self.source_dir, self.cache_dir
+        )
+        return [file_info for src in scanner.matched_files() for file_info in src.files]
+
+    def test_rescan_reuses_manifest_for_unchanged_files(self) -> None:
+        first_scan = self.scan()
+
+        with patch.object(
+            ManagedFileMetadata,
+            "build_data_item",
+            wraps=ManagedFileMetadata.build_data_item,
+        ) as build_data_item, patch("os.scandir", wraps=os.scandir) as scandir:
+            second_scan = self.scan()
+
+        assert build_data_item.call_count == 0
+        # only the recently changed source directory is listed again
+        assert [call.args[0] for call in scandir.call_args_list] == [
+            os.path.abspath(self.source_dir)
+        ]
+        assert sorted(second_scan, key=lambda f: f.file_name) == sorted(
+            first_scan, key=lambda f: f.file_name
+        )
+
+    def test_rescan_picks_up_new_and_changed_files(self) -> None:
+        self.scan()
+
+        month_dir = self.source_dir / "2023"
+        new_file = month_dir / "YouTube_SomeBrand_M_20230701_claim_raw_v1-1.csv.gz"
+        new_file.write_text("more data")
+        (month_dir / "YouTube_SomeBrand_M_20230601_claim_raw_v1-1.csv.gz").unlink()
+
+        file_infos = self.scan()
+
+        assert sorted(file_info.file_name for file_info in file_infos) == [
+            "YouTube_SomeBrand_M_20230501_claim_raw_v1-1.csv.gz",
+            "YouTube_SomeBrand_M_20230701_claim_raw_v1-1.csv.gz",
+        ]
+        new_info = [f for f in file_infos if f.file_name == new_file.name][0]
+        assert new_info.file_size_in_bytes == len("more data")
+        assert new_info.report_date_key == 20230731
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+# imported by the commands which use them, not when the cli starts
+HEAVY_MODULES = ["pandas", "sqlalchemy", "psycopg2", "google.cloud.storage", "hologram"]
+
+
+class StartupTestCase(TestCase):
+    def test_cli_imports_no_heavy_modules(self) -> None:
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, datawagon.main; "
+                + f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        assert result.stdout.strip() == "[]"